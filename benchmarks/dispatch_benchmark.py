@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+__description__ = \
+"""
+Micro-benchmark for RobotDevice.put: the cost of running a valid command and
+of turning away an unknown command or one with bad arguments, plus the mean
+lookup/check cost from the device's own dispatch counters.
+
+usage: dispatch_benchmark.py [--num N] [--repeat R]
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import sys, argparse, timeit
+
+from rpyBot.messages import RobotMessage
+from rpyBot.devices import RobotDevice
+
+class Target(RobotDevice):
+    """
+    Device with a couple of do-nothing commands.
+    """
+
+    def __init__(self,name="target"):
+
+        RobotDevice.__init__(self,name)
+        self._control_dict = {"forward":self._forward,
+                              "setspeed":self._set_speed}
+
+    def _forward(self,owner):
+
+        pass
+
+    def _set_speed(self,speed,owner=None):
+
+        pass
+
+def time_put(device,command,num,repeat):
+    """
+    Return the best time (in us) per put() of command over repeat runs of num
+    calls.  The device's messages are thrown away after every run.
+    """
+
+    message = RobotMessage(destination="robot",
+                           destination_device=device.name,
+                           message=command)
+
+    best = None
+    for i in range(repeat):
+        t = timeit.timeit(lambda: device.put(message),number=num)
+        device.get()
+        if best == None or t < best:
+            best = t
+
+    return 1e6*best/num
+
+def main(argv=None):
+
+    if argv == None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("--num",type=int,default=20000,
+                        help="number of calls per run")
+    parser.add_argument("--repeat",type=int,default=5,
+                        help="number of runs (the best is reported)")
+    args = parser.parse_args(argv)
+
+    device = Target()
+    device.compile_commands()
+
+    cases = [("simple","forward"),
+             ("kwargs",["setspeed",{"speed":2}]),
+             ("unknown","backflip"),
+             ("bad kwargs",["setspeed",{"sped":2}])]
+
+    print("{:12s} {:>10s}".format("command","us/put"))
+    for name, command in cases:
+        print("{:12s} {:10.2f}".format(name,time_put(device,command,args.num,
+                                                     args.repeat)))
+
+    counters = device.dispatch_counters()
+    print()
+    for k in ("dispatched","rejected_command","rejected_args"):
+        print("{:18s} {:10d}".format(k,counters[k]))
+    print("{:18s} {:10.2f}".format("mean check (us)",
+                                   1e-3*counters["dispatch_ns"]/counters["dispatched"]))
+
+if __name__ == "__main__":
+    main()
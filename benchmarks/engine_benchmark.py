@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+__description__ = \
+"""
+Compare the latency and CPU use of the DeviceManager (one process per device)
+and AsyncDeviceManager (one asyncio loop) engines.  A Pinger device sends
+timestamped commands to a Sink device at a fixed rate; the Sink records how
+long each command took to arrive.  CPU time includes device processes.
+
+usage: engine_benchmark.py [--rate HZ] [--seconds S]
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import sys, time, threading, argparse, resource, multiprocessing
+
+from rpyBot import manager, async_manager
+from rpyBot.devices import RobotDevice
+
+class Pinger(RobotDevice):
+    """
+    Sends ["ping",{"sent":monotonic time}] to the sink at a fixed rate.
+    """
+
+    def __init__(self,rate,name="pinger"):
+
+        RobotDevice.__init__(self,name)
+        self._period = 1.0/rate
+        self._running = False
+
+    def start(self):
+
+        self._running = True
+        while self._running:
+            self._queue_message(["ping",{"sent":time.monotonic()}],
+                                destination="robot",destination_device="sink")
+            time.sleep(self._period)
+
+    def stop(self,owner=None):
+
+        self._running = False
+
+
+class Sink(RobotDevice):
+    """
+    Records the latency of every ping and reports it on stop().
+    """
+
+    def __init__(self,results,name="sink"):
+
+        RobotDevice.__init__(self,name)
+        self._results = results
+        self._latencies = []
+        self._control_dict = {"ping":self._ping}
+
+    def _ping(self,sent,owner=None):
+
+        self._latencies.append(time.monotonic() - sent)
+
+    def stop(self,owner=None):
+
+        self._results.put(self._latencies)
+
+
+class Controller(RobotDevice):
+    """
+    Swallows the echoes every device sends to the controller.
+    """
+
+    def put(self,message):
+
+        pass
+
+
+def run_engine(engine,rate,seconds):
+    """
+    Run one engine for the given number of seconds and return its results.
+    """
+
+    results = multiprocessing.Queue()
+    device_list = [Controller(name="controller"),Pinger(rate),Sink(results)]
+    dm = engine(device_list)
+
+    threading.Timer(seconds,dm.stop).start()
+
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    dm.start()
+    dm.shutdown()
+    wall = time.perf_counter() - wall_start
+
+    latencies = sorted(results.get(timeout=5))
+
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + \
+          (cpu_end.ru_stime - cpu_start.ru_stime)
+
+    return {"engine":engine.__name__,
+            "messages":len(latencies),
+            "median_ms":1000*latencies[len(latencies)//2],
+            "p99_ms":1000*latencies[int(0.99*(len(latencies)-1))],
+            "cpu_pct":100*cpu/wall,
+            "children_cpu_s":children.ru_utime + children.ru_stime}
+
+def main(argv=None):
+
+    if argv == None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("--rate",type=float,default=100.0,
+                        help="pings per second")
+    parser.add_argument("--seconds",type=float,default=5.0,
+                        help="how long to run each engine")
+    args = parser.parse_args(argv)
+
+    print("{:20s} {:>8s} {:>10s} {:>10s} {:>8s} {:>14s}".format("engine",
+          "msgs","median(ms)","p99(ms)","cpu(%)","children cpu(s)"))
+    for engine in (manager.DeviceManager,async_manager.AsyncDeviceManager):
+        r = run_engine(engine,args.rate,args.seconds)
+        print("{:20s} {:8d} {:10.3f} {:10.3f} {:8.1f} {:14.2f}".format(r["engine"],
+              r["messages"],r["median_ms"],r["p99_ms"],r["cpu_pct"],
+              r["children_cpu_s"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+__description__ = \
+"""
+Report the memory and latency cost of each device execution mode (inline,
+thread, process).  For each mode, a DeviceManager loads a number of cheap
+devices and we measure the total proportional set size (PSS) of the manager
+and any device processes, plus the time from put() of a command to the device
+echoing it back.  The cost per device is what that adds to a manager with no
+devices loaded.
+
+usage: execution_benchmark.py [--devices N] [--num N]
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import sys, os, time, argparse, selectors
+
+from rpyBot import manager, transport
+from rpyBot.messages import RobotMessage
+from rpyBot.devices import RobotDevice
+
+class Noop(RobotDevice):
+    """
+    Device with a single command that does nothing (but is still echoed back
+    to the controller like any other command).
+    """
+
+    def __init__(self,name):
+
+        RobotDevice.__init__(self,name)
+        self._control_dict = {"noop":self._noop}
+
+    def _noop(self,owner=None):
+
+        pass
+
+def memory_kb(pid):
+    """
+    Proportional set size of a process in kB (falls back to RSS).  PSS splits
+    pages shared between forked processes, so summing it is fair.
+    """
+
+    try:
+        with open("/proc/{}/smaps_rollup".format(pid)) as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    with open("/proc/{}/status".format(pid)) as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+    return 0
+
+def command_latency(handle,num):
+    """
+    Time from put() of a command to the echo coming back through get().
+    """
+
+    selector = selectors.DefaultSelector()
+    selector.register(handle.fileno(),selectors.EVENT_READ)
+
+    latencies = []
+    for i in range(num):
+        m = RobotMessage(destination="robot",destination_device=handle.name,
+                         message="noop")
+        start = time.perf_counter()
+        handle.put(m)
+        while not handle.get():
+            selector.select(1.0)
+        latencies.append(time.perf_counter() - start)
+
+    selector.close()
+    latencies.sort()
+
+    return latencies
+
+def baseline_kb():
+    """
+    Memory of this process with a DeviceManager but no devices loaded.
+    """
+
+    dm = manager.DeviceManager([])
+    memory = memory_kb(os.getpid())
+    dm.shutdown()
+
+    return memory
+
+def run_mode(mode,num_devices,num):
+
+    baseline = baseline_kb()
+
+    devices = [Noop("noop{}".format(i)) for i in range(num_devices)]
+    dm = manager.DeviceManager(devices,
+                               execution_modes=dict([(d.name,mode) for d in devices]))
+    for d in devices:
+        dm.load_device(d)
+
+    # Give processes a moment to come up.
+    for h in dm.loaded_devices:
+        h.ping()
+
+    pids = set([h.pid for h in dm.loaded_devices] + [os.getpid()])
+    memory = sum([memory_kb(p) for p in pids])
+
+    latencies = command_latency(dm.loaded_devices[0],num)
+    dm.shutdown()
+
+    return {"mode":mode,
+            "memory_mb":memory/1024.0,
+            "baseline_mb":baseline/1024.0,
+            "per_device_mb":(memory - baseline)/1024.0/num_devices,
+            "median_ms":1000*latencies[len(latencies)//2],
+            "p99_ms":1000*latencies[int(0.99*(len(latencies)-1))]}
+
+def main(argv=None):
+
+    if argv == None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("--devices",type=int,default=10,
+                        help="number of devices to load per mode")
+    parser.add_argument("--num",type=int,default=500,
+                        help="number of commands to time")
+    args = parser.parse_args(argv)
+
+    print("{:10s} {:>12s} {:>12s} {:>14s} {:>10s} {:>10s}".format("mode",
+          "total(MB)","baseline(MB)","per device(MB)","median(ms)","p99(ms)"))
+    for mode in transport.EXECUTION_MODES:
+        r = run_mode(mode,args.devices,args.num)
+        print("{:10s} {:12.1f} {:12.1f} {:14.2f} {:10.3f} {:10.3f}".format(
+              r["mode"],r["memory_mb"],r["baseline_mb"],r["per_device_mb"],
+              r["median_ms"],r["p99_ms"]))
+
+if __name__ == "__main__":
+    main()
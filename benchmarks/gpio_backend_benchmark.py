@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+__description__ = \
+"""
+Per-operation cost of each gpio backend: the raw call to the backend, and the
+same operation made through Pin or PinGroup (ownership check, state cache and
+so on), with the difference between the two (the overhead rpyBot adds).
+Every timed call alternates between two values, so each one really writes.
+
+A process can only load one backend, so each backend is timed in a fresh
+process.  The rpi backend drives real pins (--pins), so it is only timed when
+asked for.
+
+usage: gpio_backend_benchmark.py [--backend NAME ...] [--pins P,P,P,P] [--num N] [--repeat R]
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import sys, argparse, timeit, multiprocessing
+
+def time_call(call,num,repeat):
+    """
+    Return the best time (in us) per call over repeat runs of num calls.
+    """
+
+    return 1e6*min(timeit.repeat(call,number=num,repeat=repeat))/num
+
+def time_raw_pwm(gpio,pin,num,repeat):
+    """
+    Time the backend's own PWM object on pin.  Returns the us per start/stop
+    and per duty cycle change.  The PWM object only lives in here.
+    """
+
+    pwm = gpio.PWM(pin.pin_number,pin.frequency)
+    start = time_call(lambda: (pwm.start(pin.duty_cycle),pwm.stop()),num,repeat)
+    pwm.start(pin.duty_cycle)
+    duty = time_call(lambda: (pwm.ChangeDutyCycle(40),pwm.ChangeDutyCycle(60)),num,repeat)
+    pwm.stop()
+
+    return start, duty
+
+def run(backend,pin_numbers,num,repeat,queue):
+    """
+    Time each operation on backend, putting a list of (operation,raw us,
+    rpyBot us) on queue (or an error message if the backend won't load).
+    """
+
+    from rpyBot import exceptions
+    from rpyBot.devices.gpio.hardware import gpio_backend, Pin, PinLease, PinGroup
+
+    try:
+        gpio_backend.select(backend)
+        gpio = gpio_backend.get()
+    except exceptions.BotConfigurationError as e:
+        queue.put(str(e).strip())
+        return
+
+    pins = [Pin(p) for p in pin_numbers]
+    lease = PinLease(pins)
+    owner = lease.hold()
+    p = pins[0]
+    n = p.pin_number
+
+    results = []
+
+    # Single pin output
+    raw = time_call(lambda: (gpio.output(n,True),gpio.output(n,False)),num,repeat)
+    ours = time_call(lambda: (p.up(owner),p.down(owner)),num,repeat)
+    results.append(("output",raw/2,ours/2))
+
+    # Every pin at once
+    numbers = [q.pin_number for q in pins]
+    on = [True]*len(pins)
+    off = [False]*len(pins)
+    raw = time_call(lambda: (gpio.output(numbers,on),gpio.output(numbers,off)),num,repeat)
+    lease.release()
+    group = PinGroup(pins,pwm=False)
+    ours = time_call(lambda: (group.set(group.mask),group.set(0)),num,repeat)
+    results.append(("group output",raw/2,ours/2))
+    owner = group.hold()
+
+    # Pulse width modulation.  Time the backend's own PWM object first; it is
+    # gone before the pin makes one of its own.
+    raw_start, raw_duty = time_raw_pwm(gpio,p,num,repeat)
+
+    ours = time_call(lambda: (p.start_pwm(owner),p.stop_pwm(owner)),num,repeat)
+    results.append(("pwm start/stop",raw_start/2,ours/2))
+
+    p.start_pwm(owner)
+    ours = time_call(lambda: (p.set_duty_cycle(40,owner),p.set_duty_cycle(60,owner)),num,repeat)
+    results.append(("duty cycle",raw_duty/2,ours/2))
+
+    group.stop()
+    queue.put(results)
+
+def main(argv=None):
+
+    if argv == None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("--backend",nargs="+",default=["fake","recording"],
+                        help="backends to time (rpi drives the pins given by --pins)")
+    parser.add_argument("--pins",default="11,12,13,15",
+                        help="comma separated board pins to use")
+    parser.add_argument("--num",type=int,default=20000,
+                        help="number of calls per run")
+    parser.add_argument("--repeat",type=int,default=5,
+                        help="number of runs (the best is reported)")
+    args = parser.parse_args(argv)
+
+    pin_numbers = [int(p) for p in args.pins.split(",")]
+
+    print("{:10s} {:15s} {:>10s} {:>10s} {:>10s}".format("backend","operation",
+                                                         "raw us","rpyBot us",
+                                                         "overhead"))
+
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backend:
+
+        queue = context.Queue()
+        proc = context.Process(target=run,args=(backend,pin_numbers,args.num,
+                                                args.repeat,queue))
+        proc.start()
+        results = queue.get()
+        proc.join()
+
+        if type(results) == str:
+            print("{:10s} unavailable: {}".format(backend,results))
+            continue
+
+        for operation, raw, ours in results:
+            print("{:10s} {:15s} {:10.2f} {:10.2f} {:10.2f}".format(backend,
+                                                                    operation,
+                                                                    raw,ours,
+                                                                    ours - raw))
+
+if __name__ == "__main__":
+    main()
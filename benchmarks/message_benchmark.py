@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+__description__ = \
+"""
+Micro-benchmark for RobotMessage: the cost of constructing a message,
+serializing it with as_string and parsing it back with from_string.  Only
+uses the public interface, so it can be run against older versions of the
+package to compare.
+
+The same measurements are made on the package as it was at a baseline git
+revision (by default, just before this benchmark was added along with the
+compact RobotMessage), in a fresh process, and reported alongside.
+
+usage: message_benchmark.py [--num N] [--repeat R] [--baseline REV | --no-baseline]
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import sys, os, io, json, argparse, contextlib, subprocess, tarfile, tempfile, timeit
+
+from rpyBot.messages import RobotMessage
+
+def _construct():
+
+    return RobotMessage(destination="robot",
+                        destination_device="drivetrain",
+                        source="controller",
+                        source_device="controller",
+                        message=["setspeed",{"speed":2}])
+
+def time_operation(function,num,repeat):
+    """
+    Return the best time (in us) per call of function over repeat runs of num
+    calls.
+    """
+
+    timer = timeit.Timer(function)
+    best = min(timer.repeat(repeat=repeat,number=num))
+
+    return 1e6*best/num
+
+def measure(num,repeat):
+    """
+    Time each operation on the RobotMessage that is imported.  Returns a list
+    of (operation,us per call), plus the size of a message on the wire.
+    """
+
+    # Older versions of RobotMessage print on construction; keep that out of
+    # the terminal (it is still paid for, as it was in real use).
+    with contextlib.redirect_stdout(io.StringIO()):
+
+        message = _construct()
+        message_string = message.as_string()
+
+        results = [("construct",time_operation(_construct,num,repeat)),
+                   ("as_string",time_operation(message.as_string,num,repeat)),
+                   ("from_string",time_operation(
+                        lambda: RobotMessage().from_string(message_string),
+                        num,repeat))]
+
+    return results, len(message_string)
+
+def default_baseline():
+    """
+    The revision just before this benchmark was added.
+    """
+
+    out = subprocess.run(["git","log","--diff-filter=A","--format=%H","--",
+                          os.path.basename(__file__)],
+                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True,text=True,check=True)
+    revisions = out.stdout.split()
+    if not revisions:
+        raise ValueError("this benchmark is not in git")
+
+    return revisions[-1] + "^"
+
+def measure_baseline(revision,num,repeat):
+    """
+    Run measure() in a fresh process against the package as it was at a git
+    revision.
+    """
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    archive = subprocess.run(["git","archive",revision,"rpyBot"],cwd=root,
+                             capture_output=True,check=True).stdout
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tarfile.open(fileobj=io.BytesIO(archive)).extractall(tmp)
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = tmp
+        out = subprocess.run([sys.executable,os.path.abspath(__file__),
+                              "--num",str(num),"--repeat",str(repeat),
+                              "--json"],
+                             env=env,capture_output=True,text=True,check=True)
+
+    results, wire_bytes = json.loads(out.stdout)
+
+    return [tuple(r) for r in results], wire_bytes
+
+def main(argv=None):
+
+    if argv == None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("--num",type=int,default=20000,
+                        help="number of calls per run")
+    parser.add_argument("--repeat",type=int,default=5,
+                        help="number of runs (the best is reported)")
+    parser.add_argument("--baseline",default=None,
+                        help="git revision to compare against (default: just before this benchmark was added)")
+    parser.add_argument("--no-baseline",action="store_true",
+                        help="only time the current package")
+    parser.add_argument("--json",action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    results, wire_bytes = measure(args.num,args.repeat)
+
+    # Measurements for a baseline run are handed back to the parent.
+    if args.json:
+        print(json.dumps([results,wire_bytes]))
+        return
+
+    baseline = None
+    if not args.no_baseline:
+        try:
+            revision = args.baseline
+            if revision == None:
+                revision = default_baseline()
+            baseline = measure_baseline(revision,args.num,args.repeat)
+        except (OSError,ValueError,subprocess.CalledProcessError) as err:
+            print("baseline unavailable: {}".format(err))
+
+    if baseline == None:
+        print("{:12s} {:>10s}".format("operation","us/call"))
+        for name, t in results:
+            print("{:12s} {:10.2f}".format(name,t))
+        print("{:12s} {:10d}".format("wire bytes",wire_bytes))
+        return
+
+    print("baseline: {}".format(revision))
+    print("{:12s} {:>10s} {:>10s} {:>8s}".format("operation","before","after",
+                                                 "speedup"))
+    for (name, before), (name, after) in zip(baseline[0],results):
+        print("{:12s} {:10.2f} {:10.2f} {:7.2f}x".format(name,before,after,
+                                                         before/after))
+    print("{:12s} {:10d} {:10d}".format("wire bytes",baseline[1],wire_bytes))
+
+if __name__ == "__main__":
+    main()
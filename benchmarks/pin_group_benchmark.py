@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+__description__ = \
+"""
+Micro-benchmark for PinGroup: the cost of a state transition switched pin by
+pin (the way Motor and LightTower used to) against the same transition made
+with PinGroup.set.  Each case flips between two states, so every transition
+switches pins; times are per transition.  Run on a machine without RPi.GPIO
+to time the bookkeeping alone (fake gpio backend).
+
+usage: pin_group_benchmark.py [--num N] [--repeat R]
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import sys, argparse, timeit
+
+from rpyBot.devices.gpio.hardware import Pin, PinLease, PinGroup
+
+def time_cycle(cycle,num,repeat):
+    """
+    Return the best time (in us) per call to cycle over repeat runs of num
+    calls.
+    """
+
+    return 1e6*min(timeit.repeat(cycle,number=num,repeat=repeat))/num
+
+def motor_cases(pins):
+    """
+    One motor: forward then coast.
+    """
+
+    lease = PinLease(pins)
+
+    def by_pin():
+        owner = lease.hold()
+        pins[1].stop_pwm(owner)
+        pins[0].start_pwm(owner)
+        owner = lease.hold()
+        pins[0].stop_pwm(owner)
+        pins[1].stop_pwm(owner)
+
+    group = PinGroup(pins)
+
+    def by_group():
+        group.set(0b01)
+        group.set(0b00)
+
+    return lease, group, by_pin, by_group
+
+def drive_cases(pins):
+    """
+    Two motors (cat steer): both forward, then both coast.
+    """
+
+    lease = PinLease(pins)
+
+    def by_pin():
+        for i in (0,2):
+            owner = lease.hold()
+            pins[i+1].stop_pwm(owner)
+            pins[i].start_pwm(owner)
+        for i in (0,2):
+            owner = lease.hold()
+            pins[i].stop_pwm(owner)
+            pins[i+1].stop_pwm(owner)
+
+    group = PinGroup.join([PinGroup(pins[:2]),PinGroup(pins[2:])])
+
+    def by_group():
+        group.set(0b0101)
+        group.set(0b0000)
+
+    return lease, group, by_pin, by_group
+
+def roll_cases(pins):
+    """
+    Light tower: roll the lit LED one place along, and back.
+    """
+
+    lease = PinLease(pins)
+    owner = lease.hold()
+    pins[0].start_pwm(owner)
+
+    def by_pin():
+        owner = lease.hold()
+        pins[0].stop_pwm(owner)
+        pins[1].start_pwm(owner)
+        owner = lease.hold()
+        pins[1].stop_pwm(owner)
+        pins[0].start_pwm(owner)
+
+    def start_group():
+        lease.stop()
+        group = PinGroup.join([PinGroup((p,)) for p in pins])
+        group.set(0b00001)
+        return group
+
+    return lease, start_group, by_pin
+
+def digital_cases(pins):
+    """
+    Four digital pins: all up, then all down.
+    """
+
+    lease = PinLease(pins)
+
+    def by_pin():
+        owner = lease.hold()
+        for p in pins:
+            p.up(owner)
+        owner = lease.hold()
+        for p in pins:
+            p.down(owner)
+
+    group = PinGroup(pins,pwm=False)
+
+    def by_group():
+        group.set(0b1111)
+        group.set(0b0000)
+
+    return lease, group, by_pin, by_group
+
+def main(argv=None):
+
+    if argv == None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("--num",type=int,default=20000,
+                        help="number of transitions per run")
+    parser.add_argument("--repeat",type=int,default=5,
+                        help="number of runs (the best is reported)")
+    args = parser.parse_args(argv)
+
+    results = []
+
+    # Each case times the pin by pin version first, then hands its pins over
+    # to a group.
+    for name, cases, pins in [("motor",motor_cases,(11,12)),
+                              ("cat drive",drive_cases,(13,15,16,18)),
+                              ("digital x4",digital_cases,(29,31,32,33))]:
+        lease, group, by_pin, by_group = cases([Pin(p) for p in pins])
+        t_pin = time_cycle(by_pin,args.num,args.repeat)
+        lease.stop()
+        t_group = time_cycle(by_group,args.num,args.repeat)
+        group.stop()
+        results.append((name,t_pin,t_group))
+
+    lease, start_group, by_pin = roll_cases([Pin(p) for p in (35,36,37,38,40)])
+    t_pin = time_cycle(by_pin,args.num,args.repeat)
+    group = start_group()
+    t_group = time_cycle(lambda: (group.set(0b00010),group.set(0b00001)),
+                         args.num,args.repeat)
+    group.stop()
+    results.append(("light roll",t_pin,t_group))
+
+    print("{:12s} {:>10s} {:>10s}".format("case","us/pin","us/group"))
+    for name, t_pin, t_group in results:
+        print("{:12s} {:10.2f} {:10.2f}".format(name,t_pin/2,t_group/2))
+
+if __name__ == "__main__":
+    main()
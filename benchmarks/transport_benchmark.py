@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+__description__ = \
+"""
+Measure round trip latency and messages/sec between the DeviceManager and each
+device process.  With no arguments, a bare RobotDevice is benchmarked; pass a
+configuration file to benchmark every device in its device_list.
+
+usage: transport_benchmark.py [configuration.py] [--num N]
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import sys, os, argparse
+
+from rpyBot import manager
+from rpyBot.devices import RobotDevice
+
+def main(argv=None):
+
+    if argv == None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("config_file",nargs="?",default=None)
+    parser.add_argument("--num",type=int,default=1000,
+                        help="number of messages per measurement")
+    args = parser.parse_args(argv)
+
+    if args.config_file == None:
+        device_list = [RobotDevice(name="bare_device")]
+    else:
+        sys.path.append(os.getcwd())
+        configuration = __import__(os.path.basename(args.config_file)[:-3])
+        device_list = configuration.device_list
+
+    dm = manager.DeviceManager(device_list)
+    for d in device_list:
+        dm.load_device(d)
+
+    try:
+        print("{:20s} {:>10s} {:>10s} {:>10s} {:>12s}".format("device",
+              "mean(ms)","median(ms)","max(ms)","msgs/sec"))
+        for r in dm.benchmark_devices(args.num):
+            print("{:20s} {:10.3f} {:10.3f} {:10.3f} {:12.0f}".format(r["device"],
+                  r["rtt_mean_ms"],r["rtt_median_ms"],r["rtt_max_ms"],
+                  r["msgs_per_sec"]))
+    finally:
+        dm.shutdown()
+
+if __name__ == "__main__":
+    main()
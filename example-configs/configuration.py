@@ -9,6 +9,11 @@ hardware configuration.
 import rpyBot
 from rpyBot.devices import arduino, gpio, web
 
+# To run without the pi's pins, pick another gpio backend ("fake", or
+# "recording" to see what the pins would do) before making any devices, e.g.
+# gpio.hardware.gpio_backend.select("recording").  rpyBot --gpio and the
+# RPYBOT_GPIO environment variable do the same from outside.
+
 device_list = [
                #gpio.TwoMotorCatSteer(left_pin1=15,left_pin2=13,right_pin1=11,right_pin2=7,name="drivetrain"),
                arduino.Drivetrain(name="drivetrain",internal_device_name="MOTOR_SPEED_CONTROLLER"),
@@ -18,3 +23,30 @@ device_list = [
                #gpio.IndicatorLight(control_pin=10,name="client_connected_light"),
                web.WebInterface(8081,name="controller")
 ]
+
+# Where each device runs: "inline" (on the manager thread), "thread" (on a
+# thread pool shared with other devices) or "process" (in its own process).
+# Devices not listed here use their class default.
+execution_modes = {"system_up_light":"inline",
+                   "attention_light":"inline",
+                   "light_tower":"thread"}
+
+# Bounds on device queues, as a size or (size,policy).  Policies are "block",
+# "drop_oldest", "drop_newest" and "latest_wins".  inbox_limits caps commands
+# waiting for a device; outbox_limits caps messages a device has produced
+# that the manager has not collected yet.
+inbox_limits = {"drivetrain":(8,"drop_oldest"),
+                "controller":(256,"drop_oldest")}
+outbox_limits = {"controller":(64,"block")}
+
+# What each device sends back to the controller after a command: "none",
+# "error" (only warnings), "aggregate" (warnings plus a periodic count of
+# the commands run) or "echo" (warnings plus every command, the default).
+# The client can ask for something else on any one message.
+ack_modes = {"system_up_light":"error",
+             "light_tower":"aggregate"}
+
+# Record the path of every client command, from the websocket through the
+# manager to the pin writes (see rpyBot.tracing).  rpyBot --trace FILE turns
+# this on and writes the traces out as json on exit.
+trace = False
@@ -4,7 +4,7 @@ __description__ = \
 __author__ = "Michael J. Harms"
 __date__ = "2016-05-23"
 
-__all__ = ["devices","manager","messages","main","exceptions"]
+__all__ = ["devices","manager","async_manager","messages","scheduler","queues","codec","dispatch","executor","tracing","transport","main","exceptions"]
 
 
 from rpyBot import exceptions, messages
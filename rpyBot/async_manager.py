@@ -0,0 +1,350 @@
+__description__ = \
+"""
+A DeviceManager engine built on asyncio.  Devices run inline on a single event
+loop (which tornado shares, for the WebInterface) instead of in processes of
+their own.  Messages wait in the same priority scheduler the DeviceManager
+uses; a single drain callback (loop.call_soon when something is ready,
+loop.call_at for the next deadline otherwise) routes them in lane order.
+Device output is picked up with loop.add_reader on each device's wakeup handle.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import asyncio, threading, time
+
+from rpyBot import exceptions, queues
+from rpyBot.manager import DeviceManager
+
+class _AsyncDeviceHandle:
+    """
+    Wraps a device loaded into an AsyncDeviceManager.  put() drops the message
+    into a per-device inbox that a worker task feeds to device.aput(), so
+    commands for one device run in order without holding up the others.
+    """
+
+    def __init__(self,device,manager,inbox_limit=None):
+
+        self.device = device
+        self.name = device.name
+
+        self._manager = manager
+        self._estop_result = None
+
+        self.inbox = queues.BoundedQueue(*queues.parse_limit(inbox_limit,
+                                                             self.name))
+        self._has_work = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._work())
+
+    def put(self,message):
+        """
+        Queue a message for the device.  Returns False if the inbox is full
+        and blocks.
+        """
+
+        if not self.inbox.put(message,self.device.coalesce_key(message)):
+            return False
+
+        self._has_work.set()
+
+        return True
+
+    def queue_counters(self,timeout=1.0):
+
+        return {"inbox":dict(self.inbox.counters),
+                "outbox":self.device.queue_counters(),
+                "dispatch":self.device.dispatch_counters(),
+                "periodic":self.device.periodic_counters()}
+
+    def trace_spans(self,timeout=1.0):
+
+        return []
+
+    def get(self):
+
+        return self.device.get()
+
+    def fileno(self):
+
+        return self.device.fileno()
+
+    def stop(self,owner=None):
+
+        self._worker.cancel()
+        self.device.stop(owner)
+
+    def disconnect(self):
+
+        self.device.disconnect()
+
+    def emergency_stop(self,owner=None):
+        """
+        Throw away queued commands and stop the device right now.
+        """
+
+        self.inbox.clear()
+
+        # A blocking_io command may be part way through on an executor thread.
+        start = time.perf_counter()
+        try:
+            with self.device.command_lock:
+                self.device.emergency_stop(owner)
+            self._estop_result = time.perf_counter() - start
+        except Exception:
+            self._estop_result = None
+
+    def wait_emergency_stop(self,timeout=1.0):
+
+        return self._estop_result
+
+    async def _work(self):
+        """
+        Feed queued messages to the device, one at a time.
+        """
+
+        while True:
+            if not self.inbox:
+                self._has_work.clear()
+                await self._has_work.wait()
+                continue
+
+            message = self.inbox.popleft()
+
+            # That made room; let through anything held for a full inbox.
+            if self._manager._held:
+                self._manager._release_held()
+
+            try:
+                await self.device.aput(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                msg = "{} failed on {} ({})".format(self.name,message.message,err)
+                self._manager._queue_message(msg,destination_device="warn")
+
+
+class AsyncDeviceManager(DeviceManager):
+    """
+    DeviceManager that runs every device on one asyncio event loop.  Takes the
+    same device_list as DeviceManager.  Use start() to run on a fresh event
+    loop, or await run() to share a loop that is already running.
+    """
+
+    def __init__(self,device_list=[],verbosity=0,inbox_limits={},
+                 outbox_limits={},ack_modes={},trace=False):
+        """
+        Initialize.
+            device_list: list of RobotDevice instances
+            verbosity: whether or not to spew messages to standard out
+            inbox_limits, outbox_limits: bounds on device queues (see
+                                         DeviceManager)
+            ack_modes: what each device sends back after a command (see
+                       DeviceManager)
+            trace: record the path of every client command (see
+                   DeviceManager)
+        """
+
+        DeviceManager.__init__(self,device_list,verbosity=verbosity,
+                               inbox_limits=inbox_limits,
+                               outbox_limits=outbox_limits,
+                               ack_modes=ack_modes,trace=trace)
+
+        self._loop = None
+        self._stopped = None
+
+        # The pending drain of the scheduler: a call_soon handle, or a
+        # call_at handle and the deadline (ms) it was set for.
+        self._drain_handle = None
+        self._drain_at = None
+
+    def start(self):
+        """
+        Start the main loop running on a new event loop.
+        """
+
+        self._run_loop = True
+        asyncio.run(self.run())
+
+    async def run(self):
+        """
+        Load the devices and route messages until stop() is called.
+        """
+
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._run_loop = True
+
+        for d in self.device_list:
+            self.load_device(d)
+
+        self._queue_message("starting system")
+
+        # Anything queued before the loop was running sits in the scheduler.
+        self._schedule_drain()
+
+        await self._stopped.wait()
+
+    def stop(self):
+        """
+        Stop the main loop from running.  Safe to call from any thread.  Does
+        not automatically unload devices or stop them.
+        """
+
+        self._run_loop = False
+        if self._loop != None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def load_device(self,d):
+        """
+        Load a device into the AsyncDeviceManager.  Must be called with the
+        event loop running.
+        """
+
+        if d.name in self.loaded_devices_dict:
+            message = "device {:s} already connected!".format(d.name)
+            self._queue_message(message,destination_device="warn")
+            return
+
+        try:
+            d.connect(self.manager_id)
+        except exceptions.BotConnectionError as err:
+            self._queue_message(str(err),destination_device="warn")
+            return
+
+        d.compile_commands()
+        d.set_ack_mode(self.ack_modes.get(d.name,d.ack_mode))
+        d.set_outbox_limit(self.outbox_limits.get(d.name,d.outbox_limit))
+        inbox_limit = queues.parse_limit(self.inbox_limits.get(d.name,
+                                                               d.inbox_limit),
+                                         d.name)
+
+        handle = _AsyncDeviceHandle(d,self,inbox_limit)
+        self._add_route(handle)
+
+        self._watch_device(handle)
+
+        # Devices that know about asyncio start on the loop.  Everyone else
+        # gets start() run on a daemon thread, in case it never returns.
+        if hasattr(d,"start_async"):
+            self._loop.create_task(d.start_async())
+        else:
+            threading.Thread(target=d.start,daemon=True).start()
+
+        self._collect(handle)
+
+    def unload_device(self,device_name):
+        """
+        Unload a device from the control of the AsyncDeviceManager.
+        """
+
+        handle = self._remove_route(device_name)
+        if handle == None:
+            message = "device {} is not connected".format(device_name)
+            self._queue_message(message,destination_device="warn")
+            return
+
+        for m in self._held.pop(device_name,()):
+            self.counters["held"] -= 1
+            self._unhold(m)
+        if handle in self._paused:
+            self._paused.discard(handle)
+        else:
+            self._unwatch_device(handle)
+        handle.stop(self.manager_id)
+        handle.disconnect()
+
+    def _watch_device(self,handle):
+        """
+        Collect a device's output whenever its wakeup handle is readable.
+        """
+
+        self._loop.add_reader(handle.fileno(),self._collect,handle)
+
+    def _unwatch_device(self,handle):
+
+        if self._loop != None and not self._loop.is_closed():
+            self._loop.remove_reader(handle.fileno())
+
+    def _collect(self,handle):
+        """
+        Reader callback: put a device's output into the queue.
+        """
+
+        for m in handle.get():
+            self._queue_message(m)
+
+    def _enqueue(self,message):
+        """
+        Hand a RobotMessage to the scheduler and make sure a drain is coming.
+        """
+
+        self.queue.push(message)
+        self._schedule_drain()
+
+    def _schedule_drain(self):
+        """
+        Arrange for _drain to run: on the next pass of the loop if anything is
+        ready, at the next deadline otherwise.  Only one drain is ever pending.
+        """
+
+        if self._loop == None:
+            return
+
+        # Already draining as soon as possible.
+        if self._drain_handle != None and self._drain_at == None:
+            return
+
+        wait = self.queue.time_to_next()
+        if wait == None:
+            return
+
+        if wait == 0:
+            if self._drain_handle != None:
+                self._drain_handle.cancel()
+            self._drain_handle = self._loop.call_soon(self._drain)
+            self._drain_at = None
+            return
+
+        # Only move a timer that is set for later than the new deadline.
+        deadline = self.queue.next_deadline()
+        if self._drain_handle != None:
+            if self._drain_at <= deadline:
+                return
+            self._drain_handle.cancel()
+
+        self._drain_handle = self._loop.call_at(self._loop.time() + wait,
+                                                self._drain)
+        self._drain_at = deadline
+
+    def _drain(self):
+        """
+        Route the messages that are ready, highest priority first.  Like
+        DeviceManager._tick, only messages ready when the drain starts are
+        routed; anything queued while routing waits for the next drain, so
+        other callbacks on the loop get a turn in between.
+        """
+
+        self._drain_handle = None
+        self._drain_at = None
+
+        if self._held:
+            self._release_held()
+
+        budget = self.queue.promote()
+        if self.max_per_tick != None and budget > self.max_per_tick:
+            budget = self.max_per_tick
+
+        for i in range(budget):
+            message = self._get_message()
+            if message == None:
+                break
+            self._route(message)
+
+        self._schedule_drain()
+
+    def _route(self,message):
+        """
+        Send a message on to its device.
+        """
+
+        self._message_to_device(message)
+        self.counters["dispatched"] += 1
@@ -0,0 +1,456 @@
+__description__ = \
+"""
+Wire codecs for RobotMessage.  The json codec is the original string format
+(RobotMessage.as_string), which the javascript client speaks.  The binary
+codec is a compact alternative for peers that both run this package (device
+processes, or a client that asks for it):
+
+    byte 0: BINARY_MAGIC (never the first byte of a json message)
+    then, for each field present: one tag byte (see FIELD_TAGS) and a value
+
+Every value starts with a one byte type:
+
+    NONE, FALSE, TRUE
+    INT: zig-zag varint
+    FLOAT: 8 byte little-endian double
+    STR: varint length, then utf-8
+    NAME: varint index into the codec's table of interned names
+    LIST: varint count, then that many values
+    DICT: varint count, then that many key/value pairs (packed kwargs); keys
+          are scalars (none, booleans, numbers or strings)
+
+Varints are at most MAX_VARINT_BYTES long (a 64 bit value).
+
+Device names, commands and kwarg names that appear in the table are sent as a
+one or two byte NAME rather than as a string.  Both ends must build their
+codec with the same extra names; everything else still round trips, just
+less compactly.  Decoded messages are checked exactly like parsed json ones
+(RobotMessage.from_dict).
+
+Several messages can travel together in one envelope (a batch), so a busy
+stream costs one frame per flush rather than one per message:
+
+    json: an array of message objects, [{...},{...}]
+    binary: BATCH_MAGIC, a varint count, then each message as a varint length
+            followed by its binary encoding
+
+decode_all reads a single message or an envelope in either format.  Anything
+that can't be decoded raises BotMessageError, whatever is wrong with it.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import struct, json
+
+from rpyBot import exceptions
+from rpyBot.messages import RobotMessage
+
+JSON = "json"
+BINARY = "binary"
+
+# Codecs we can speak, most preferred first.
+CODECS = (BINARY,JSON)
+
+# Websocket subprotocol name for each codec.
+SUBPROTOCOLS = {BINARY:"rpybot.binary",JSON:"rpybot.json"}
+
+BINARY_MAGIC = 0xb1
+BATCH_MAGIC = 0xb2
+
+# Most messages accepted in one envelope.
+MAX_BATCH = 256
+
+# Longest varint accepted (enough for any 64 bit value).
+MAX_VARINT_BYTES = 10
+
+FIELD_TAGS = {"destination":1,
+              "destination_device":2,
+              "source":3,
+              "source_device":4,
+              "delay":5,
+              "message_id":6,
+              "message":7,
+              "priority":8,
+              "arrival_time":9,
+              "minimum_time":10,
+              "ttl":11,
+              "ack":12,
+              "trace_id":13}
+_TAG_FIELDS = dict((v,k) for k, v in FIELD_TAGS.items())
+
+NONE, FALSE, TRUE, INT, FLOAT, STR, NAME, LIST, DICT = range(9)
+
+# Types a decoded dictionary key may have.
+_KEY_TYPES = (str,int,float,bool,type(None))
+
+# Names interned by every binary codec.  Only ever append to this list: the
+# index of a name is its wire value.
+COMMON_NAMES = ("robot","controller","manager","warn","",
+                "drivetrain","forward","reverse","left","right","brake",
+                "coast","center","setspeed","getspeed","speed","estop",
+                "on","off","flip","flash","roll","duty","freq",
+                "duty_cycle","frequency","get","forward_range",
+                "attention_light","client_connected_light","light_tower",
+                "ack","none","error","aggregate","echo","commands","count",
+                "last_id")
+
+_double = struct.Struct("<d")
+
+def negotiate(offered,supported=CODECS):
+    """
+    Pick the codec to use given the codecs the other side offered (most
+    preferred first).  Falls back to json, which everyone speaks.
+    """
+
+    for name in offered:
+        if name in supported:
+            return name
+
+    return JSON
+
+def make_codec(name,names=()):
+    """
+    Build a codec by name.  names are extra names to intern (binary only).
+    """
+
+    if name == BINARY:
+        return BinaryCodec(names)
+    elif name == JSON:
+        return JsonCodec()
+
+    err = "codec must be one of {}, not {}".format(CODECS,name)
+    raise exceptions.BotConfigurationError(err)
+
+def decode(data,codec=None,keep_times=False,message=None):
+    """
+    Decode a message (str or bytes) in either format, telling them apart by
+    the first byte.  codec is the binary codec to use (one with no extra
+    names if None).  If message is given, it is populated rather than a new
+    RobotMessage.
+    """
+
+    if type(data) != str and len(data) > 0 and data[0] == BINARY_MAGIC:
+        if codec == None or codec.name != BINARY:
+            codec = _default_binary
+        return codec.decode(data,keep_times,message)
+
+    return _json.decode(data,keep_times,message)
+
+def decode_all(data,codec=None,keep_times=False,new_message=RobotMessage):
+    """
+    Decode a single message or an envelope of them (str or bytes, in either
+    format), returning a list of messages.  codec is as for decode.  Each
+    message starts out as new_message() before the decoded fields are loaded.
+    """
+
+    if type(data) != str and len(data) > 0:
+        if data[0] == BATCH_MAGIC:
+            if codec == None or codec.name != BINARY:
+                codec = _default_binary
+            return codec.decode_batch(data,keep_times,new_message)
+
+        if data[0] == BINARY_MAGIC:
+            return [decode(data,codec,keep_times,new_message())]
+
+    return _json.decode_batch(data,keep_times,new_message)
+
+def json_batch(messages):
+    """
+    Json envelope for a list of messages, as a string (a websocket text
+    frame).
+    """
+
+    return "[{}]".format(",".join([m.as_string() for m in messages]))
+
+def _check_batch_size(n):
+
+    if n > MAX_BATCH:
+        err = "Too many messages in one envelope ({})".format(n)
+        raise exceptions.BotMessageError(err)
+
+
+class JsonCodec:
+    """
+    The original json string format.
+    """
+
+    name = JSON
+
+    def encode(self,message):
+
+        return message.as_string().encode()
+
+    def decode(self,data,keep_times=False,message=None):
+
+        if type(data) != str:
+            try:
+                data = bytes(data).decode()
+            except UnicodeDecodeError:
+                err = "Mangled message string ({})".format(bytes(data))
+                raise exceptions.BotMessageError(err)
+
+        if message == None:
+            message = RobotMessage()
+        message.from_string(data,keep_times)
+
+        return message
+
+    def encode_batch(self,messages):
+
+        return json_batch(messages).encode()
+
+    def decode_batch(self,data,keep_times=False,new_message=RobotMessage):
+        """
+        Decode a single message or an array of them.
+        """
+
+        if type(data) != str:
+            try:
+                data = bytes(data).decode()
+            except UnicodeDecodeError:
+                err = "Mangled message string ({})".format(bytes(data))
+                raise exceptions.BotMessageError(err)
+
+        try:
+            decoded = json.loads(data)
+        except (ValueError,TypeError,RecursionError):
+            err = "Mangled message string ({})".format(data)
+            raise exceptions.BotMessageError(err)
+
+        if type(decoded) != list:
+            decoded = [decoded]
+        _check_batch_size(len(decoded))
+
+        out = []
+        for message_dict in decoded:
+            message = new_message()
+            message.from_dict(message_dict,keep_times)
+            out.append(message)
+
+        return out
+
+
+class BinaryCodec:
+    """
+    Compact tagged binary format.
+    """
+
+    name = BINARY
+
+    def __init__(self,names=()):
+        """
+        Initialize.  names are interned on top of COMMON_NAMES.
+        """
+
+        self.names = list(COMMON_NAMES)
+        for n in names:
+            if n not in self.names:
+                self.names.append(n)
+
+        # Encoded NAME value for each interned name, ready to append.
+        self._encoded_names = {}
+        for i, n in enumerate(self.names):
+            out = bytearray((NAME,))
+            _write_varint(out,i)
+            self._encoded_names[n] = bytes(out)
+
+    def encode(self,message):
+        """
+        Encode a RobotMessage as bytes.
+        """
+
+        out = bytearray((BINARY_MAGIC,))
+        for field, value in message.as_dict().items():
+            out.append(FIELD_TAGS[field])
+            self._write(out,value)
+
+        return bytes(out)
+
+    def decode(self,data,keep_times=False,message=None):
+        """
+        Decode bytes back into a RobotMessage (populating message, if given).
+        """
+
+        data = memoryview(data)
+        try:
+            if data[0] != BINARY_MAGIC:
+                raise ValueError
+
+            message_dict = {}
+            pos = 1
+            while pos < len(data):
+                field = _TAG_FIELDS[data[pos]]
+                message_dict[field], pos = self._read(data,pos + 1)
+
+        except (ValueError,TypeError,KeyError,IndexError,UnicodeDecodeError,
+                struct.error,RecursionError):
+            err = "Mangled binary message ({})".format(bytes(data))
+            raise exceptions.BotMessageError(err)
+
+        if message == None:
+            message = RobotMessage()
+        message.from_dict(message_dict,keep_times)
+
+        return message
+
+    def encode_batch(self,messages):
+        """
+        Encode a list of RobotMessages as one binary envelope.
+        """
+
+        out = bytearray((BATCH_MAGIC,))
+        _write_varint(out,len(messages))
+        for m in messages:
+            encoded = self.encode(m)
+            _write_varint(out,len(encoded))
+            out += encoded
+
+        return bytes(out)
+
+    def decode_batch(self,data,keep_times=False,new_message=RobotMessage):
+        """
+        Decode a binary envelope into a list of RobotMessages.
+        """
+
+        data = memoryview(data)
+        try:
+            if data[0] != BATCH_MAGIC:
+                raise ValueError
+
+            n, pos = _read_varint(data,1)
+            _check_batch_size(n)
+
+            chunks = []
+            for i in range(n):
+                length, pos = _read_varint(data,pos)
+                if pos + length > len(data):
+                    raise IndexError
+                chunks.append(data[pos:pos+length])
+                pos += length
+
+            if pos != len(data):
+                raise ValueError
+
+        except (ValueError,IndexError):
+            err = "Mangled binary envelope ({})".format(bytes(data))
+            raise exceptions.BotMessageError(err)
+
+        return [self.decode(c,keep_times,new_message()) for c in chunks]
+
+    def _write(self,out,value):
+
+        t = type(value)
+        if t == str:
+            encoded = self._encoded_names.get(value)
+            if encoded != None:
+                out += encoded
+            else:
+                raw = value.encode()
+                out.append(STR)
+                _write_varint(out,len(raw))
+                out += raw
+        elif value == None:
+            out.append(NONE)
+        elif t == bool:
+            out.append(TRUE if value else FALSE)
+        elif t == int:
+            out.append(INT)
+            _write_varint(out,value << 1 if value >= 0 else ((-value) << 1) - 1)
+        elif t == float:
+            out.append(FLOAT)
+            out += _double.pack(value)
+        elif t == list or t == tuple:
+            out.append(LIST)
+            _write_varint(out,len(value))
+            for v in value:
+                self._write(out,v)
+        elif t == dict:
+            out.append(DICT)
+            _write_varint(out,len(value))
+            for k, v in value.items():
+                self._write(out,k)
+                self._write(out,v)
+        else:
+            err = "can't encode {} in a message".format(value)
+            raise exceptions.BotMessageError(err)
+
+    def _read(self,data,pos):
+        """
+        Read the value starting at pos.  Returns the value and the position
+        just past it.
+        """
+
+        t = data[pos]
+        pos += 1
+
+        if t == NAME:
+            index, pos = _read_varint(data,pos)
+            return self.names[index], pos
+        elif t == STR:
+            n, pos = _read_varint(data,pos)
+            if pos + n > len(data):
+                raise IndexError
+            return str(data[pos:pos+n],"utf-8"), pos + n
+        elif t == INT:
+            v, pos = _read_varint(data,pos)
+            return (v >> 1) ^ -(v & 1), pos
+        elif t == FLOAT:
+            return _double.unpack_from(data,pos)[0], pos + 8
+        elif t == NONE:
+            return None, pos
+        elif t == TRUE:
+            return True, pos
+        elif t == FALSE:
+            return False, pos
+        elif t == LIST:
+            n, pos = _read_varint(data,pos)
+            out = []
+            for i in range(n):
+                v, pos = self._read(data,pos)
+                out.append(v)
+            return out, pos
+        elif t == DICT:
+            n, pos = _read_varint(data,pos)
+            out = {}
+            for i in range(n):
+                k, pos = self._read(data,pos)
+                if type(k) not in _KEY_TYPES:
+                    raise ValueError
+                out[k], pos = self._read(data,pos)
+            return out, pos
+
+        raise ValueError
+
+
+def _write_varint(out,value):
+
+    if value < 0x80:
+        out.append(value)
+        return
+
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data,pos):
+    """
+    Read the varint starting at pos.  Returns the value and the position just
+    past it.  Raises ValueError if it runs past MAX_VARINT_BYTES.
+    """
+
+    value = 0
+    shift = 0
+    for i in range(MAX_VARINT_BYTES):
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+    raise ValueError
+
+
+_json = JsonCodec()
+_default_binary = BinaryCodec()
@@ -17,9 +17,19 @@ key which maps to a callback specified in the _control_dict of the device.
     "key" OR
     ["key",{kwarg1:value1,kwarg2:value2...}"]
 
+The _control_dict is compiled (see rpyBot.dispatch) when the device is loaded.
+Commands that aren't in it, or whose kwargs don't match the signature of the
+callback, are rejected before anything is called.  A callback that takes time
+should not sleep: write it as a generator that yields the delay between its
+steps, and the device's executor runs it without holding up other commands
+(see rpyBot.executor).  Work that repeats (animations, sensor sampling)
+belongs in a periodic task (add_periodic_task), not in a message the device
+keeps sending itself.
+
 When writing methods, all functions should access self._messages via the 
-self._append_message and self._get_messages methods, as these use a re-enterant
-thread lock to stay thread-safe.  This is critical because the tornado server
+self._queue_message and self._get_all_messages methods, as these keep the
+outbox thread-safe (a lock-free ring, or a re-enterant lock around a bounded
+queue; see rpyBot.queues).  This is critical because the tornado server
 and device manager are on different threads but can both post messages.
 """ 
 __author__ = "Michael J. Harms"
@@ -27,6 +37,6 @@ __date__ = "2014-06-18"
 
 __all__ = ["arduino","gpio","web"]
 
-from .robot_device import RobotDevice
+from .robot_device import RobotDevice, MotionDevice
 from . import gpio, arduino, web
 
@@ -9,6 +9,7 @@ __date__ = "2016-05-20"
 import serial, re, os
 
 import PyCmdMessenger
+from rpyBot import tracing
 from .. import RobotDevice
 
 class ArduinoRobotDevice(RobotDevice):
@@ -16,6 +17,9 @@ class ArduinoRobotDevice(RobotDevice):
     Base class for a RobotDevice that uses an arduino.
     """
 
+    # Every command is a blocking serial round trip.
+    blocking_io = True
+
     def __init__(self,
                  internal_device_name=None,
                  commands=(),
@@ -104,6 +108,17 @@ class ArduinoRobotDevice(RobotDevice):
                 pass
 
 
+    def _send(self,command,*args):
+        """
+        Send a command to the arduino (recording it in the trace of the
+        command being run, if tracing).
+        """
+
+        if tracing.enabled:
+            tracing.mark("arduino.send",command)
+
+        self._arduino_msg.send(command,*args)
+
     def _not_connected_callback(self,owner=None):
         """
         This is a callback that should override other callbacks in the event 
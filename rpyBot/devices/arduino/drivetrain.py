@@ -6,6 +6,7 @@ __author__ = "Michael J. Harms"
 __date__ = "2016-09-26"
 
 from . import ArduinoRobotDevice
+from .. import MotionDevice
 
 COMMANDS = (("who_are_you",""),
             ("set_speed","dd"),
@@ -17,12 +18,21 @@ COMMANDS = (("who_are_you",""),
 
 BAUD_RATE = 9600                   
 
-class Drivetrain(ArduinoRobotDevice):
+class Drivetrain(ArduinoRobotDevice,MotionDevice):
     """
     Class for interfacing with an arduino drivetrain that has two motors 
     arranged "cat" style.  
     """
 
+    # Only the newest motion command and the newest speed matter.
+    coalesce_groups = {"forward":"motion",
+                       "reverse":"motion",
+                       "brake":"motion",
+                       "coast":"motion",
+                       "left":"motion",
+                       "right":"motion",
+                       "setspeed":"speed"}
+
     def __init__(self,
                  internal_device_name=None,
                  device_tty=None,
@@ -69,7 +79,7 @@ class Drivetrain(ArduinoRobotDevice):
         properly recieved.
         """
 
-        self._arduino_msg.send("set_speed",m0,m1)
+        self._send("set_speed",m0,m1)
 
         reply = self._arduino_msg.receive()
         if reply is not None and reply[0] == "set_speed_return":
@@ -134,6 +144,16 @@ class Drivetrain(ArduinoRobotDevice):
         self._speed_to_arduino(0,0)
         self._queue_message("Set motors to stopped")
 
+    def emergency_stop(self,owner=None):
+        """
+        Stop both motors right away, skipping the message back to the
+        controller.
+        """
+
+        if self._hardware_is_found:
+            self.state = "coast"
+            self._speed_to_arduino(0,0)
+
     def _set_speed(self,speed,owner=None):
         """
         Set the speed of the motors.
@@ -161,7 +181,7 @@ class Drivetrain(ArduinoRobotDevice):
         Get the current speed of the motors, as measured on the arduino.
         """
 
-        self._arduino_msg.send("get_speed")
+        self._send("get_speed")
         reply = self._arduino_msg.receive()
  
         if reply is not None and reply[0] == "get_speed_return":
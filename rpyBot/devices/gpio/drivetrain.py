@@ -1,12 +1,19 @@
 
-import time
-
 from . import hardware, GPIORobotDevice 
+from .. import MotionDevice
 
-class SingleMotor(GPIORobotDevice):
+class SingleMotor(GPIORobotDevice,MotionDevice):
     """
     Single hardware.Motor under control of two GPIO pins.
     """
+
+    # Only the newest direction, duty cycle and frequency matter.
+    coalesce_groups = {"forward":"motion",
+                       "reverse":"motion",
+                       "brake":"motion",
+                       "coast":"motion",
+                       "set_dutycycle":"duty_cycle",
+                       "set_freq":"frequency"}
  
     def __init__(self,pin1,pin2,duty_cycle=100,frequency=50,name=None):
         """
@@ -42,12 +49,29 @@ class SingleMotor(GPIORobotDevice):
 
         self._motor.stop(owner)
 
+    def emergency_stop(self,owner=None):
+        """
+        Coast the motor.
+        """
+
+        self._motor.coast(owner)
 
-class TwoMotorDriveSteer(GPIORobotDevice):
+
+class TwoMotorDriveSteer(GPIORobotDevice,MotionDevice):
     """
     Two GPIOMotors that work in synchrony.  The drive motor does forward and 
     reverse, the steer motor moves the wheels left and right.
     """ 
+
+    # Only the newest drive and steering commands matter.  A new steering
+    # command also preempts a centering still in progress.
+    coalesce_groups = {"forward":"drive",
+                       "reverse":"drive",
+                       "brake":"drive",
+                       "coast":"drive",
+                       "left":"steer",
+                       "right":"steer",
+                       "center":"steer"}
  
     def __init__(self,drive_pin1,drive_pin2,steer_pin1,steer_pin2,name=None,
                  left_return_constant=0.03,right_return_constant=0.03):
@@ -97,35 +121,58 @@ class TwoMotorDriveSteer(GPIORobotDevice):
         self._steer_motor.reverse(owner)
 
     def _steer_center(self,owner):
+        """
+        Run the steering motor back to center.  A sequence for the device's
+        executor, so it doesn't hold up drive commands while it runs.
+        """
 
-        # Steering wheels in the left-hand position
-        if self._current_steer_motor_state == -1:
+        state = self._current_steer_motor_state
+        self._current_steer_motor_state = 0
 
-           self._steer_motor.reverse(owner)
-           time.sleep(self._left_return_constant)
-           self._steer_motor.coast(owner)
+        # Steering wheels in the left-hand position
+        if state == -1:
+            self._steer_motor.reverse(owner)
+            yield self._left_return_constant
 
         # Steering wheels in the right-hand position
-        if self._current_steer_motor_state == 1:
-            
+        elif state == 1:
             self._steer_motor.forward(owner)
-            time.sleep(self._left_return_constant)
-            self._steer_motor.coast(owner)
+            yield self._right_return_constant
 
         self._steer_motor.coast(owner)
-        self._current_steer_motor_state = 0
 
     def stop(self,owner):
         
+        self.cancel_commands()
         self._steer_motor.stop(owner)
         self._drive_motor.stop(owner)
 
-class TwoMotorCatSteer(GPIORobotDevice):
+    def emergency_stop(self,owner=None):
+        """
+        Coast the drive motor and let the steering go slack.
+        """
+
+        self.cancel_commands()
+        self._drive_motor.coast(owner)
+        self._steer_motor.coast(owner)
+        self._current_steer_motor_state = 0
+
+class TwoMotorCatSteer(GPIORobotDevice,MotionDevice):
     """
     Two hardware.Motor that work in synchrony as a cat drive.  The left and right
     motors go forward and reverse independently.  Steering is achieved by 
     running one forward, the other in reverse.  
     """ 
+
+    # Only the newest motion command and the newest speed matter.  A new
+    # motion command also preempts a burst start still in progress.
+    coalesce_groups = {"forward":"motion",
+                       "reverse":"motion",
+                       "brake":"motion",
+                       "coast":"motion",
+                       "left":"motion",
+                       "right":"motion",
+                       "setspeed":"speed"}
  
     def __init__(self,left_pin1,left_pin2,right_pin1,right_pin2,
                  pwm_frequency=100,max_pwm_duty_cycle=35,name=None,speed=0,
@@ -166,6 +213,10 @@ class TwoMotorCatSteer(GPIORobotDevice):
 
         self._left_motor = hardware.Motor(left_pin1,left_pin2,pwm_frequency,max_pwm_duty_cycle)
         self._right_motor = hardware.Motor(right_pin1,right_pin2,pwm_frequency,max_pwm_duty_cycle) 
+
+        # Both motors as one pin group, so they change direction together.
+        self._motors = hardware.PinGroup.join((self._left_motor.pins,
+                                               self._right_motor.pins))
     
         self._control_dict = {"forward":self._forward,
                               "reverse":self._reverse,
@@ -182,70 +233,75 @@ class TwoMotorCatSteer(GPIORobotDevice):
         return self._speed*self._speed_constant 
 
     def _burst_start(self,owner):
+        """
+        Steps of a burst start (nothing if soft control is off).  The motion
+        commands hand these to the device's executor.
+        """
+
+        if not self._soft_control:
+            return
 
         # Break static friction with burst of high power
         self._left_motor.set_duty_cycle(self._burst_start_duty,owner)
         self._right_motor.set_duty_cycle(self._burst_start_duty,owner)
-        time.sleep(self._burst_start_delay)
+        yield self._burst_start_delay
    
         # Set to appropriate motor speed
         self._left_motor.set_duty_cycle(self.duty,owner)
         self._right_motor.set_duty_cycle(self.duty,owner)
 
 
+    def _drive(self,left,right,owner):
+        """
+        Put the left and right motors in states left and right (Motor.FORWARD
+        etc.) in a single operation, on behalf of owner.
+        """
+
+        self._motors.set(left | right << 2,owner)
+
     def _forward(self,owner):
 
         # Set motor configuration
         self._speed = self._drive_speed
-        self._left_motor.forward(owner)
-        self._right_motor.forward(owner)
+        self._drive(hardware.Motor.FORWARD,hardware.Motor.FORWARD,owner)
 
         # burst start
-        if self._soft_control:
-            self._burst_start(owner)
+        yield from self._burst_start(owner)
 
     def _reverse(self,owner):
 
         # Set motor configuration
         self._speed = self._drive_speed
-        self._left_motor.reverse(owner)
-        self._right_motor.reverse(owner)
+        self._drive(hardware.Motor.REVERSE,hardware.Motor.REVERSE,owner)
         
         # burst start
-        if self._soft_control:
-            self._burst_start(owner)
+        yield from self._burst_start(owner)
         
     def _left(self,owner):
       
         # Set motor configuration
         self._speed = self._turn_speed 
-        self._left_motor.reverse(owner)
-        self._right_motor.forward(owner)
+        self._drive(hardware.Motor.REVERSE,hardware.Motor.FORWARD,owner)
         
         # burst start
-        if self._soft_control:
-            self._burst_start(owner)
+        yield from self._burst_start(owner)
 
     def _right(self,owner):
       
         # Set motor configuration
         self._speed = self._turn_speed 
-        self._left_motor.forward(owner) 
-        self._right_motor.reverse(owner)
+        self._drive(hardware.Motor.FORWARD,hardware.Motor.REVERSE,owner)
         
         # burst start
-        if self._soft_control:
-            self._burst_start(owner)
+        yield from self._burst_start(owner)
         
     def _brake(self,owner):
 
-        self._left_motor.brake(owner)
-        self._right_motor.brake(owner)
+        self._drive(hardware.Motor.BRAKE,hardware.Motor.BRAKE,owner)
         
     def _coast(self,owner):
 
-        self._left_motor.coast(owner)
-        self._right_motor.coast(owner)
+        self._drive(hardware.Motor.COAST,hardware.Motor.COAST,owner)
 
     def _set_speed(self,speed,owner):
         """
@@ -271,8 +327,21 @@ class TwoMotorCatSteer(GPIORobotDevice):
         self._right_motor.set_duty_cycle(self.duty,owner)
                      
     def stop(self,owner):
+        """
+        Coast, then shut down both motors.  Their pins share one lease, so
+        they are stopped together, once.
+        """
+
+        self.cancel_commands()
+        self._coast(owner)
+        self._motors.stop(owner)
+
+    def emergency_stop(self,owner=None):
+        """
+        Coast both motors.
+        """
 
-        self._left_motor.stop(owner)
-        self._right_motor.stop(owner)
+        self.cancel_commands()
+        self._coast(owner)
         
 
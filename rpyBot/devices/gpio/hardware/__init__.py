@@ -5,9 +5,10 @@ Should be thread-safe. Main class is "Pin" which controls access to a given GPIO
 pin in straightforward, thread-safe manner. 
 """
 
-__all__ = ["pin","motor","led","rangefinder","fake_gpio"] 
+__all__ = ["pin","motor","led","rangefinder","gpio_backend","fake_gpio",
+           "recording_gpio"]
 
-from .pin import Pin, global_pin_owners, global_pin_lock, OwnershipError
+from .pin import Pin, PinLease, PinGroup, global_pin_owners, global_pin_lock, OwnershipError
 from .motor import Motor
 from .led import LED
 from .rangefinder import UltrasonicRange
@@ -29,6 +29,14 @@ class PWM:
         pass
         #print("WARNING! Using dummy GPIO interface.")
 
+    def ChangeDutyCycle(self,*args,**kwargs):
+        pass
+        #print("WARNING! Using dummy GPIO interface.")
+
+    def ChangeFrequency(self,*args,**kwargs):
+        pass
+        #print("WARNING! Using dummy GPIO interface.")
+
 def cleanup(*args,**kwargs):
    
     pass 
@@ -0,0 +1,112 @@
+__description__ = \
+"""
+Chooses the GPIO interface (backend) that the pins talk to.  A backend is
+anything with the interface of the RPi.GPIO module (setmode, setup, output,
+input, PWM, cleanup and so on):
+
+    "rpi"       RPi.GPIO, the real pins.
+    "fake"      fake_gpio, which does nothing.
+    "recording" recording_gpio, which records every call and keeps track of
+                what the pins would be doing.
+    "auto"      rpi if RPi.GPIO can be loaded here, fake if not (the default).
+
+The backend is the one given to select(), else the one named in the
+RPYBOT_GPIO environment variable, else auto.  Nothing is loaded--and the
+hardware is not touched--until get() is first called, which Pin does when the
+first pin is made.  After that the backend can't be changed.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import importlib, threading, os
+
+from rpyBot import exceptions
+
+# Module for each backend (relative names are in this package).
+BACKENDS = {"rpi":"RPi.GPIO",
+            "fake":".fake_gpio",
+            "recording":".recording_gpio"}
+
+ENVIRONMENT_VARIABLE = "RPYBOT_GPIO"
+
+_requested = None
+_name = None
+_gpio = None
+_lock = threading.Lock()
+
+def select(name):
+    """
+    Use backend name (a key of BACKENDS, or "auto").  Raises
+    BotConfigurationError if a different backend is already loaded.
+    """
+
+    _check(name)
+
+    if _gpio != None and name not in ("auto",_name):
+        err = "gpio backend {} already in use, cannot switch to {}.\n".format(_name,name)
+        err += "Choose the backend before making any pins.\n"
+        raise exceptions.BotConfigurationError(err)
+
+    global _requested
+    _requested = name
+
+def get():
+    """
+    Return the backend, loading it (and setting it up) the first time.
+    """
+
+    if _gpio == None:
+        _load()
+
+    return _gpio
+
+def name():
+    """
+    Return the name of the loaded backend (None if nothing is loaded yet).
+    """
+
+    return _name
+
+def _check(name):
+
+    if name != "auto" and name not in BACKENDS:
+        err = "gpio backend must be one of {}, not {}\n".format(["auto"] + sorted(BACKENDS),name)
+        raise exceptions.BotConfigurationError(err)
+
+def _load():
+    """
+    Load the backend chosen by select() or the environment.
+    """
+
+    global _name, _gpio
+
+    with _lock:
+
+        if _gpio != None:
+            return
+
+        name = _requested
+        if name == None:
+            name = os.environ.get(ENVIRONMENT_VARIABLE,"auto")
+            _check(name)
+
+        # The import dies on machines that aren't a raspberry pi.
+        if name == "auto":
+            try:
+                gpio = importlib.import_module(BACKENDS["rpi"])
+                name = "rpi"
+            except (RuntimeError,ImportError):
+                gpio = importlib.import_module(BACKENDS["fake"],__package__)
+                name = "fake"
+        else:
+            try:
+                gpio = importlib.import_module(BACKENDS[name],__package__)
+            except (RuntimeError,ImportError) as e:
+                err = "could not load gpio backend {} ({})\n".format(name,e)
+                raise exceptions.BotConfigurationError(err)
+
+        gpio.setmode(gpio.BOARD)
+        gpio.setwarnings(10)
+
+        _name = name
+        _gpio = gpio
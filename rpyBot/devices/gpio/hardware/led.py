@@ -1,78 +1,71 @@
-from . import Pin, OwnershipError
+from . import Pin, PinGroup, OwnershipError
 
 class LED:
     """
     Class for controlling an LED via a single GPIO pin.  Brightness and 
     flashing is controlled by pulse width modulation.
+
+    Like Motor, the LED's pin is a (one pin) PinGroup, held on a lease (see
+    PinLease) rather than claimed for every command, and each method is
+    refused if another owner has claimed it.  LightTower joins the groups of
+    its LEDs to switch them together.
     """
 
-    def __init__(self,pin,frequency=1,duty_cycle=100):
+    def __init__(self,pin,frequency=1,duty_cycle=100,lease_time=None):
         
         self.pin = Pin(pin,frequency,duty_cycle)
-        self.led_on = False
+        self.pins = PinGroup((self.pin,),lease_time=lease_time)
+
+    @property
+    def led_on(self):
+
+        return self.pins.state == 1
 
     def on(self,owner):
         """
         Turn LED on.
         """
 
-        self.pin.acquire(owner)
-        self.pin.start_pwm(owner)
-        self.led_on = True
-        self.pin.release(owner)
+        self.pins.set(1,owner)
 
     def off(self,owner):
         """
         Turn LED off.
         """
 
-        self.pin.acquire(owner)
-        self.pin.stop_pwm(owner)
-        self.led_on = False
-        self.pin.release(owner)
+        self.pins.set(0,owner)
    
     def flip(self,owner):
         """
         Flip state of LED from off->on or on->off.
         """   
  
-        self.pin.acquire(owner)
-
-        if self.led_on:
-            self.off(owner)
-        else:
-            self.on(owner)
-
-        self.pin.release(owner)
+        self.pins.set(self.pins.state ^ 1,owner)
 
     def set_frequency(self,frequency,owner):
         """
         Change pulse width modulation frequency.
         """
 
-        self.pin.acquire(owner)
+        lease = self.pins.hold(owner)
 
         self.frequency = frequency
-        self.pin.set_frequency(self.frequency,owner)
-
-        self.pin.release(owner)
+        self.pin.set_frequency(self.frequency,lease)
 
     def set_duty_cycle(self,duty_cycle,owner):
         """
         Change pulse width modulation duty cycle.
         """
 
-        self.pin.acquire(owner)
+        lease = self.pins.hold(owner)
 
         self.duty_cycle = duty_cycle
-        self.pin.set_duty_cycle(self.duty_cycle,owner)
-
-        self.pin.release(owner)
+        self.pin.set_duty_cycle(self.duty_cycle,lease)
 
     def stop(self,owner):
         """
-        Shut down the GPIO pin for this LED.
+        Shut down the GPIO pin for this LED (whether or not it was ever used).
         """
         
-        self.pin.stop(owner)       
+        self.pins.stop(owner)
  
@@ -1,140 +1,97 @@
-from . import Pin, OwnershipError
+from . import Pin, PinGroup, OwnershipError
 
 class Motor:
     """
     Class for controlling a DC motor via two GPIO pins.  Motor speed can be
     controlled via pulse-width modulation.
+
+    The pins are a PinGroup, so each change of direction is one operation that
+    never passes through brake.  The group holds both pins on a lease (see
+    PinLease) from the motor's first command until it is stopped, rather than
+    claiming them for every command.  The owner passed to each method is the
+    command asking, and is refused if another owner has claimed the pins.
     """
+
+    # States of the motor's pin group (bit 0 is pin1, bit 1 is pin2).
+    COAST = 0b00
+    FORWARD = 0b01
+    REVERSE = 0b10
+    BRAKE = 0b11
+
+    _STATE_NAMES = {COAST:"coast",FORWARD:"forward",REVERSE:"reverse",
+                    BRAKE:"brake"}
     
-    def __init__(self,pin1,pin2,frequency=50,duty_cycle=100):
+    def __init__(self,pin1,pin2,frequency=50,duty_cycle=100,lease_time=None):
         
         self.pin1 = Pin(pin1,frequency,duty_cycle)
         self.pin2 = Pin(pin2,frequency,duty_cycle)
         self.frequency = frequency
         self.duty_cycle = duty_cycle
 
-        self._current_state = "coast"
+        self.pins = PinGroup((self.pin1,self.pin2),lease_time=lease_time)
 
-    def _acquire(self,owner):
-        """
-        Acquire locks on both pins, releasing the acquired pin if acquisition
-        of the other pin fails.
-        """
-
-        try:
-            self.pin1.acquire(owner)
-            self.pin2.acquire(owner)
-        except OwnershipError as err:
-            self.pin1.release(owner)
-            raise OwnershipError(err)
+    @property
+    def _current_state(self):
 
-    def _release(self,owner):
-        """
-        Release locks on both pins.
-        """
-
-        self.pin1.release(owner)
-        self.pin2.release(owner)
+        return self._STATE_NAMES[self.pins.state]
     
     def forward(self,owner):
         """
         Run motor forward.
         """
 
-        if self._current_state == "forward":
-            return None
-
-        self._acquire(owner)
-
-        self.pin1.start_pwm(owner)
-        self.pin2.stop_pwm(owner)
-        self._current_state = "forward"
-
-        self._release(owner)
-
+        self.pins.set(self.FORWARD,owner)
 
     def reverse(self,owner):
         """
         Run motor in reverse.
         """
     
-        if self._current_state == "reverse":
-            return None
-
-        self._acquire(owner)
-
-        self.pin1.stop_pwm(owner)
-        self.pin2.start_pwm(owner)
-        self._current_state = "reverse"
-        
-        self._release(owner)
-        
+        self.pins.set(self.REVERSE,owner)
    
     def brake(self,owner):
         """
         Use the motor as a brake by running both pins.
         """
 
-        if self._current_state == "brake":
-            return None
-
-        self._acquire(owner)
-
-        self.pin1.start_pwm(owner)
-        self.pin2.start_pwm(owner)
-        self._current_state = "brake"
-
-        self._release(owner)
-        
+        self.pins.set(self.BRAKE,owner)
    
     def coast(self,owner):
         """
         Put motor in coast by stopping both pins.
         """
 
-        if self._current_state == "coast":
-            return None
-        
-        self._acquire(owner)
-
-        self.pin1.stop_pwm(owner)
-        self.pin2.stop_pwm(owner)
-        self._current_state = "coast"
-
-        self._release(owner)
+        self.pins.set(self.COAST,owner)
 
     def set_duty_cycle(self,duty_cycle,owner):
         """
         Set pulse width modulation duty cycle.
         """
 
-        self._acquire(owner)
+        lease = self.pins.hold(owner)
 
         self.duty_cycle = duty_cycle
-        self.pin1.set_duty_cycle(self.duty_cycle,owner)
-        self.pin2.set_duty_cycle(self.duty_cycle,owner)
-
-        self._release(owner)
+        self.pin1.set_duty_cycle(self.duty_cycle,lease)
+        self.pin2.set_duty_cycle(self.duty_cycle,lease)
 
     def set_frequency(self,frequency,owner):
         """
         Set pulse width modulation frequency.
         """
 
-        self._acquire(owner)
+        lease = self.pins.hold(owner)
 
         self.frequency = frequency
-        self.pin1.set_frequency(self.frequency,owner)
-        self.pin2.set_frequency(self.frequency,owner)
-
-        self._release(owner)
+        self.pin1.set_frequency(self.frequency,lease)
+        self.pin2.set_frequency(self.frequency,lease)
 
     def stop(self,owner):
         """
-        Shut down and clean up the pins.
+        Shut down and clean up the pins (whether or not the motor was ever
+        used).  If the motor's pins are joined into a bigger group, this stops
+        every pin in it (see PinGroup.stop), so stop the group instead.
         """     
  
         self.coast(owner) 
-        self.pin1.stop(owner)
-        self.pin2.stop(owner)
+        self.pins.stop(owner)
 
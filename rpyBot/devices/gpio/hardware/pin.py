@@ -1,19 +1,83 @@
 
-# import the gpio hardware interface.  This will die on non-raspberry pi
-# machines, so load a fake interface in.
-try:
-    import RPi.GPIO as GPIO
-except (RuntimeError,ImportError):
-    from . import fake_gpio as GPIO
-    
-GPIO.setmode(GPIO.BOARD)
-GPIO.setwarnings(10)
-
-import multiprocessing
-global_pin_owners = [-1 for i in range(40)]
+import multiprocessing, ctypes, itertools, time, os
+from rpyBot import tracing, exceptions
+from . import gpio_backend
+
+# The gpio hardware interface.  Loaded when the first pin is made, so nothing
+# touches the hardware before then (see gpio_backend).
+GPIO = None
+
+# Board pin numbers run from 1 to 40.
+NUM_PINS = 41
+
+# Owner of every pin: -1 if the pin has not been set up, 0 if it is free,
+# otherwise the owner (a message id or a PinLease id, both unique across
+# processes).  The table is in shared memory, so device processes forked by
+# the DeviceManager all see (and respect) the same owners.  Reading it takes
+# no lock.  Claiming a pin is a compare-and-set on its entry made under that
+# pin's own lock, so devices using different pins never wait on each other.
+# Only the owner ever changes an owned entry (unless its claim has lapsed,
+# see below), so releasing a pin needs no lock at all.
+global_pin_owners = multiprocessing.RawArray(ctypes.c_int64,NUM_PINS)
+for i in range(NUM_PINS):
+    global_pin_owners[i] = -1
+
+# For each owned pin, the process that claimed it and when (time.monotonic)
+# its claim lapses (0 for never).  Pins whose claim has lapsed, or whose
+# process has died, are reclaimed by the next owner to ask for them.
+global_pin_pids = multiprocessing.RawArray(ctypes.c_int64,NUM_PINS)
+global_pin_expiry = multiprocessing.RawArray(ctypes.c_double,NUM_PINS)
+
+_pin_locks = [multiprocessing.Lock() for i in range(NUM_PINS)]
+
+# Held while setting up or cleaning up a pin on the GPIO chip.
 global_pin_lock = multiprocessing.RLock()
 
-class OwnershipError(Exception):
+# Lease ids count up from the pid like message ids, with bit 62 set so the
+# two never collide.
+_lease_ids = None
+
+def _reset_lease_ids():
+
+    global _lease_ids
+    _lease_ids = itertools.count((1 << 62) + (os.getpid() << 30) + 1)
+
+_reset_lease_ids()
+os.register_at_fork(after_in_child=_reset_lease_ids)
+
+def _process_alive(pid):
+    """
+    Whether process pid is still running (a zombie that has not been reaped
+    yet counts as dead).
+    """
+
+    try:
+        os.kill(pid,0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    try:
+        with open("/proc/{:d}/stat".format(pid)) as f:
+            return f.read().rsplit(")",1)[1].split()[0] != "Z"
+    except (OSError,IndexError):
+        return True
+
+def _lapsed(pin_number):
+    """
+    Whether the owner of a pin has lost its claim: its lease has expired or
+    the process that made it has died.
+    """
+
+    expiry = global_pin_expiry[pin_number]
+    if expiry and time.monotonic() > expiry:
+        return True
+
+    pid = global_pin_pids[pin_number]
+    return pid not in (0,os.getpid()) and not _process_alive(pid)
+
+class OwnershipError(exceptions.BotOwnershipError):
     """
     Errors in the ownership of a given gpio pin (such as two threads trying to
     control a pin simultaneously). 
@@ -21,7 +85,7 @@ class OwnershipError(Exception):
 
     pass 
 
-class HardwareConflictError(Exception):
+class HardwareConflictError(exceptions.BotHardwareConflictError):
     """
     Errors in which the user to put the hardware into a nonsensical state (such as 
     manually putting a pin with pulse width mondulation running into the up state).
@@ -32,8 +96,8 @@ class HardwareConflictError(Exception):
 
 class Pin:
     """
-    Class that, in conjunction with global_pin_owners and global_pin_lock,
-    provides thread-safe access to GPIO functionality.  Each Pin can only be
+    Class that, in conjunction with global_pin_owners, provides thread- and
+    process-safe access to GPIO functionality.  Each Pin can only be
     controlled by a single owner--defined by an integer--at a single time. 
     """
 
@@ -44,32 +108,65 @@ class Pin:
         self.frequency = frequency
         self.as_input = as_input 
  
+        # PWM object for the pin (made the first time pwm is started, and
+        # kept until the pin is stopped), whether it is running, and the
+        # frequency and duty cycle it is running at.
         self._pwm = None
+        self._pwm_running = False
+        self._pwm_frequency = None
+        self._pwm_duty_cycle = None
+
+        # Level last written to the pin (None if not known).  Writes that
+        # wouldn't change anything are skipped.
+        self._level = None
+
+        global GPIO
+        if GPIO == None:
+            GPIO = gpio_backend.get()
+
         self._initialize()
 
 
-    def acquire(self,owner):
+    def acquire(self,owner,lease_time=None):
         """
-        Acquire ownership of a pin.
+        Acquire ownership of a pin.  If lease_time (seconds) is given, the
+        claim lapses that long from now unless owner acquires the pin again
+        first, and the pin can then be reclaimed by someone else.  A pin held
+        by a process that has died can be reclaimed at any time.
         """
 
-        with global_pin_lock:
+        # Already acquired by owner
+        if global_pin_owners[self.pin_number] == owner and lease_time == None:
+            return
 
-            # Already acquired by owner
-            if global_pin_owners[self.pin_number] == owner:
-                return
+        if type(owner) != int or owner <= 0:
+            err = "pin owner must be a positive integer, not {}\n".format(owner)
+            raise OwnershipError(err)
 
-            if global_pin_owners[self.pin_number] == -1:
-                self._initialize()
-                global_pin_owners[self.pin_number] = owner
+        with _pin_locks[self.pin_number]:
 
-            elif global_pin_owners[self.pin_number] == 0:
+            current = global_pin_owners[self.pin_number]
+            if current == -1:
+                self._setup()
+                current = 0
+
+            if current not in (0,owner) and _lapsed(self.pin_number):
+                current = 0
+
+            if current in (0,owner):
+                if current != owner:
+                    self._forget()
+                expiry = 0.0
+                if lease_time != None:
+                    expiry = time.monotonic() + lease_time
+                global_pin_pids[self.pin_number] = os.getpid()
+                global_pin_expiry[self.pin_number] = expiry
                 global_pin_owners[self.pin_number] = owner
+                return
 
-            else:
-                err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                    self.pin_number,global_pin_owners[self.pin_number],owner)
-                raise OwnershipError(err)   
+        err = "pin {:d} owned by {:d}, not {:d}\n".format(self.pin_number,
+                                                          current,owner)
+        raise OwnershipError(err)   
  
     def release(self,owner):
         """
@@ -77,7 +174,15 @@ class Pin:
         the pin because the end state (pin-not-owned-by-owner) is the same.
         """       
  
-        with global_pin_lock:
+        if global_pin_owners[self.pin_number] != owner:
+            return
+
+        # A lapsed lease may be reclaimed while we are releasing it.
+        if global_pin_expiry[self.pin_number] == 0:
+            global_pin_owners[self.pin_number] = 0
+            return
+
+        with _pin_locks[self.pin_number]:
             if global_pin_owners[self.pin_number] == owner:
                 global_pin_owners[self.pin_number] = 0
     
@@ -87,16 +192,18 @@ class Pin:
         """
 
         if global_pin_owners[self.pin_number] == owner:
-            if self._pwm == None:
-                GPIO.output(self.pin_number,True)
+            if not self._pwm_running:
+                if self._level != True:
+                    if tracing.enabled:
+                        tracing.mark("gpio.up",self.pin_number)
+                    GPIO.output(self.pin_number,True)
+                    self._level = True
             else:
                 err = "cannot set to 'up': pulse width modulation running on pin.\n"
                 raise HardwareConflictError(err)
 
         else:
-            err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                self.pin_number,global_pin_owners[self.pin_number],owner)
-            raise OwnershipError(err)   
+            raise self._not_owner(owner)
 
     def down(self,owner):
         """
@@ -104,15 +211,17 @@ class Pin:
         """
 
         if global_pin_owners[self.pin_number] == owner:
-            if self._pwm == None:
-                GPIO.output(self.pin_number,False)
+            if not self._pwm_running:
+                if self._level != False:
+                    if tracing.enabled:
+                        tracing.mark("gpio.down",self.pin_number)
+                    GPIO.output(self.pin_number,False)
+                    self._level = False
             else:
                 err = "cannot set to 'down': pulse width modulation running on pin.\n"
                 raise HardwareConflictError(err)
         else:
-            err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                self.pin_number,global_pin_owners[self.pin_number],owner)
-            raise OwnershipError(err)   
+            raise self._not_owner(owner)
       
     def input(self,owner):
         """
@@ -122,25 +231,23 @@ class Pin:
         if global_pin_owners[self.pin_number] == owner:
             return GPIO.input(self.pin_number)
         else:
-            err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                self.pin_number,global_pin_owners[self.pin_number],owner)
-            raise OwnershipError(err)   
+            raise self._not_owner(owner)
 
     def start_pwm(self,owner):
         """
         Start pulse width modulation running (using self.frequency and
-        self.duty_cycle).
+        self.duty_cycle).  (Doesn't throw an error if it is already running).
         """
 
         if global_pin_owners[self.pin_number] == owner:
 
-            self._pwm = GPIO.PWM(self.pin_number,self.frequency)
-            self._pwm.start(self.duty_cycle)
+            if not self._pwm_running:
+                if tracing.enabled:
+                    tracing.mark("gpio.start_pwm",self.pin_number)
+                self._start_pwm()
 
         else:
-            err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                self.pin_number,global_pin_owners[self.pin_number],owner)
-            raise OwnershipError(err)   
+            raise self._not_owner(owner)
     
     def stop_pwm(self,owner):
         """
@@ -150,51 +257,49 @@ class Pin:
 
         if global_pin_owners[self.pin_number] == owner:
 
-            if self._pwm != None:
-                self._pwm.stop()    
-                self._pwm = None
+            if self._pwm_running:
+                if tracing.enabled:
+                    tracing.mark("gpio.stop_pwm",self.pin_number)
+                self._stop_pwm()
 
         else:
-            err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                self.pin_number,global_pin_owners[self.pin_number],owner)
-            raise OwnershipError(err)   
+            raise self._not_owner(owner)
         
     def set_frequency(self,frequency,owner):
         """
-        Change pulse width modulation frequency.  If PWM is already running, it
-        will be stopped and restarted with the new frequency.
+        Change pulse width modulation frequency.  If PWM is already running,
+        the change is made in place.
         """
  
         if global_pin_owners[self.pin_number] == owner: 
 
             self.frequency = frequency
-            if self._pwm != None:
-                self.stop_pwm(owner)
-                self.start_pwm(owner)
+            if self._pwm_running and self._pwm_frequency != frequency:
+                if tracing.enabled:
+                    tracing.mark("gpio.frequency",[self.pin_number,frequency])
+                self._pwm.ChangeFrequency(frequency)
+                self._pwm_frequency = frequency
 
         else:
-            err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                self.pin_number,global_pin_owners[self.pin_number],owner)
-            raise OwnershipError(err)   
+            raise self._not_owner(owner)
 
     def set_duty_cycle(self,duty_cycle,owner):
         """
-        Change pulse width modulation duty cycle.  If PWM is already running, it
-        will be stopped and restarted with the new duty cycle.
+        Change pulse width modulation duty cycle.  If PWM is already running,
+        the change is made in place.
         """
         
         if global_pin_owners[self.pin_number] == owner: 
 
             self.duty_cycle = duty_cycle
-            if self._pwm != None:
-                self.stop_pwm(owner)
-                self.start_pwm(owner)
+            if self._pwm_running and self._pwm_duty_cycle != duty_cycle:
+                if tracing.enabled:
+                    tracing.mark("gpio.duty_cycle",[self.pin_number,duty_cycle])
+                self._pwm.ChangeDutyCycle(duty_cycle)
+                self._pwm_duty_cycle = duty_cycle
 
         else:
-       
-            err = "pin {:d} owned by {:d}, not {:d}\n".format(
-                self.pin_number,global_pin_owners[self.pin_number],owner)
-            raise OwnershipError(err)   
+            raise self._not_owner(owner)
 
     def stop(self,owner):
         """
@@ -202,37 +307,464 @@ class Pin:
         release the lock.
         """
 
-        with global_pin_lock:
+        with _pin_locks[self.pin_number], global_pin_lock:
             if global_pin_owners[self.pin_number] == owner:
 
                 # Put the pin in the down state
-                if self._pwm != None:
+                if self._pwm_running:
                     self.stop_pwm(owner)
                 self.down(owner)   
 
                 GPIO.cleanup(self.pin_number)
+                self._pwm = None
+                self._pwm_frequency = None
+                self._pwm_duty_cycle = None
+                self._forget()
 
                 # Record that the pin is cleaned up.  This will also
                 # release the pin.
                 global_pin_owners[self.pin_number] = -1
+                global_pin_pids[self.pin_number] = 0
+                global_pin_expiry[self.pin_number] = 0.0
+
+    def _start_pwm(self):
+        """
+        Start pulse width modulation (which must not be running), without any
+        checks.  The pin's PWM object is made the first time and kept until
+        the pin is stopped.
+        """
+
+        if self._pwm == None:
+            self._pwm = GPIO.PWM(self.pin_number,self.frequency)
+            self._pwm_frequency = self.frequency
+        elif self._pwm_frequency != self.frequency:
+            self._pwm.ChangeFrequency(self.frequency)
+            self._pwm_frequency = self.frequency
+
+        self._pwm.start(self.duty_cycle)
+        self._pwm_duty_cycle = self.duty_cycle
+        self._pwm_running = True
+        self._level = None
+
+    def _stop_pwm(self):
+        """
+        Stop pulse width modulation (which must be running), without any
+        checks.
+        """
+
+        self._pwm.stop()
+        self._pwm_running = False
+        self._level = None
+
+    def _forget(self):
+        """
+        Forget the level last written to the pin, so the next write goes to
+        the hardware whatever it is.  Called whenever someone new claims the
+        pin, as they may have written to it from another process.
+        """
+
+        self._level = None
+
+    def _not_owner(self,owner):
+        """
+        Return the error for owner trying to use a pin it doesn't own.
+        """
+
+        err = "pin {:d} owned by {:d}, not {}\n".format(self.pin_number,
+                                                        global_pin_owners[self.pin_number],
+                                                        owner)
+        return OwnershipError(err)
 
     def _initialize(self):
         """
-        Initialize a pin (called by acquire or __init__, but not public).
+        Initialize a pin (called by __init__, but not public).
         """
  
-        with global_pin_lock:
+        with _pin_locks[self.pin_number]:
 
             # If the pin has not been initialized (global_pin_owners[pin] == -1),
             # initailize it
             if global_pin_owners[self.pin_number] == -1:
-                if self.as_input == True:
-                    GPIO.setup(self.pin_number, GPIO.IN)
-                else:
-                    GPIO.setup(self.pin_number, GPIO.OUT)
-                    self.down(owner=-1)
-                global_pin_owners[self.pin_number] = 0
+                self._setup()
             else:
                 err = "pin {:d} already under control of another gpio.Pin instance\n".format(self.pin_number)
                 raise OwnershipError(err)
 
+    def _setup(self):
+        """
+        Set the pin up on the GPIO chip and mark it free.  Called with the
+        pin's lock held, when global_pin_owners[pin] == -1.
+        """
+
+        with global_pin_lock:
+            if self.as_input == True:
+                GPIO.setup(self.pin_number, GPIO.IN)
+            else:
+                GPIO.setup(self.pin_number, GPIO.OUT)
+                self.down(owner=-1)
+            global_pin_owners[self.pin_number] = 0
+
+
+
+class PinLease:
+    """
+    Ownership of a set of pins, taken once and held across many commands
+    rather than claimed and released around every write.  The lease owns the
+    pins under an id of its own: pass hold() as the owner to the pins' methods,
+    which then validate each write with a single comparison.
+
+    The commands using the lease are still owners in their own right.  Any
+    command may use a lease that is free, but a command can claim the lease
+    (see claim) to keep it to itself until it is done, as Pin.acquire does
+    for a single pin.  While a lease is claimed, every other owner gets an
+    OwnershipError.
+
+    If lease_time (seconds) is set, the claim on the pins lapses unless the
+    lease is used at least that often (hold() renews it half way through),
+    after which another owner may reclaim the pins.  Pins held by a process
+    that has died are reclaimed whether or not the lease has lapsed.
+    """
+
+    def __init__(self,pins,lease_time=None):
+
+        self.pins = tuple(pins)
+        self.lease_time = lease_time
+
+        # Id the pins are held under (None when not held), and when hold()
+        # should renew the claim.
+        self.owner = None
+        self._renew_at = None
+
+        # Owner that has claimed the lease for itself (None if nobody has).
+        self.holder = None
+
+    def hold(self,owner=None):
+        """
+        Return the id the pins are held under, taking or renewing the lease
+        first if need be.  owner is the command asking.  Raises
+        OwnershipError if another owner has claimed the lease, or someone else
+        holds one of the pins.
+        """
+
+        if self.holder != None and self.holder != owner:
+            raise self._not_holder(owner)
+
+        if self.owner != None and \
+           (self._renew_at == None or time.monotonic() < self._renew_at):
+            return self.owner
+
+        lease_owner = self.owner
+        if lease_owner == None:
+            lease_owner = next(_lease_ids)
+
+        taken = []
+        try:
+            for p in self.pins:
+                p.acquire(lease_owner,self.lease_time)
+                taken.append(p)
+        except OwnershipError:
+            for p in taken:
+                p.release(lease_owner)
+            self.owner = None
+            raise
+
+        self.owner = lease_owner
+        if self.lease_time != None:
+            self._renew_at = time.monotonic() + self.lease_time/2
+
+        return lease_owner
+
+    def claim(self,owner):
+        """
+        Keep the lease for owner alone (until unclaim), taking it if need be.
+        Returns the id the pins are held under.
+        """
+
+        lease_owner = self.hold(owner)
+        self.holder = owner
+
+        return lease_owner
+
+    def unclaim(self,owner):
+        """
+        Let other owners use the lease again.  Does nothing unless owner has
+        claimed it.
+        """
+
+        if self.holder == owner:
+            self.holder = None
+
+    def release(self):
+        """
+        Give up the pins.
+        """
+
+        self.holder = None
+
+        if self.owner == None:
+            return
+
+        for p in self.pins:
+            p.release(self.owner)
+        self.owner = None
+
+    def stop(self,owner=None):
+        """
+        Shut the pins down and clean them up (see Pin.stop), ending the lease.
+        The pins are cleaned up whether or not the lease was held, except
+        those someone else holds.  Raises OwnershipError if another owner has
+        claimed the lease.
+        """
+
+        if self.holder != None and self.holder != owner:
+            raise self._not_holder(owner)
+
+        lease_owner = self.owner
+        if lease_owner == None:
+            lease_owner = next(_lease_ids)
+
+        for p in self.pins:
+            if global_pin_owners[p.pin_number] == -1:
+                continue
+            try:
+                p.acquire(lease_owner)
+            except OwnershipError:
+                continue
+            p.stop(lease_owner)
+
+        self.owner = None
+        self._renew_at = None
+        self.holder = None
+
+    def _not_holder(self,owner):
+        """
+        Return the error for owner trying to use a lease another owner has
+        claimed.
+        """
+
+        err = "pins {} claimed by {}, not {}\n".format([p.pin_number for p in self.pins],
+                                                      self.holder,owner)
+        return OwnershipError(err)
+
+
+class PinGroup:
+    """
+    A set of pins switched together, held on one PinLease.  The state of the
+    group is a bitmask (bit i is pins[i]): pulse width modulation running on
+    the pin if pwm is True, the pin up if not.  set() moves the group to a new
+    state in one operation:
+
+        - only the pins that change are touched;
+        - ownership of every one of them is checked before any is switched, so
+          the group is never left half way between states;
+        - pins switching off go before pins switching on (break before make),
+          so an H-bridge passes through coast, never brake;
+        - without pwm, all the writes go in a single GPIO.output call.
+
+    RPi.GPIO runs pulse width modulation in software, one channel at a time,
+    so pwm groups switch pin by pin (but in a safe order).
+
+    Each method takes the owner (the command) asking, which is checked
+    against the lease (see PinLease.claim).
+
+    Groups can be joined (see join) to switch the pins of several at once.
+    Joined groups share one lease, so stopping any of them stops them all.
+    """
+
+    def __init__(self,pins,pwm=True,lease_time=None):
+
+        self.pins = tuple(pins)
+        self.pwm = pwm
+        self.mask = (1 << len(self.pins)) - 1
+        self.state = 0
+
+        self._lease = PinLease(self.pins,lease_time)
+
+        # For each transition (current << len(pins) | state), the pins that
+        # switch off, the pins that switch on, all of them (off first), the
+        # arguments to GPIO.output that switch them, and the new states of the
+        # member groups that change (see join).  Worked out the first time the
+        # transition is made (see _plan).
+        self._transitions = {}
+        self._width = len(self.pins)
+
+        # Groups joined into this one (and theirs, and so on), each with the
+        # shift of its bits in the state; and the group this one is joined
+        # into, if any.
+        self._members = ()
+        self._parent = None
+        self._shift = 0
+
+    @staticmethod
+    def join(groups,lease_time=None):
+        """
+        Return a group over the pins of groups (in order, so the state of
+        groups[1] is shifted left by the number of pins in groups[0], and so
+        on).  The groups share the new group's lease, and can still be set on
+        their own.
+        """
+
+        groups = tuple(groups)
+
+        pins = []
+        shifts = []
+        members = []
+        state = 0
+        for g in groups:
+            if g.pwm != groups[0].pwm:
+                err = "cannot join pwm and non-pwm pin groups\n"
+                raise HardwareConflictError(err)
+            if g._parent != None:
+                err = "pin group already joined into another\n"
+                raise HardwareConflictError(err)
+
+            shifts.append(len(pins))
+            members.append((g,len(pins)))
+            members.extend((m,len(pins) + shift) for m, shift in g._members)
+            state |= g.state << len(pins)
+            pins.extend(g.pins)
+
+        joined = PinGroup(pins,groups[0].pwm,lease_time)
+        joined.state = state
+        joined._members = tuple(members)
+
+        for g, shift in members:
+            g._share_lease(joined._lease)
+        for g, shift in zip(groups,shifts):
+            g._parent = joined
+            g._shift = shift
+
+        return joined
+
+    def set(self,state,owner=None):
+        """
+        Move the group to state (a bitmask, or a sequence of booleans, one
+        per pin) on behalf of owner.  Raises OwnershipError without touching
+        anything if the group's lease can't be held for owner.
+        """
+
+        lease = self._lease
+        if lease.holder != None and lease.holder != owner:
+            raise lease._not_holder(owner)
+
+        if type(state) != int:
+            state = sum(1 << i for i, s in enumerate(state) if s)
+
+        state &= self.mask
+        current = self.state
+        if current == state:
+            return
+
+        try:
+            going_off, going_on, switching, output, members = self._transitions[current << self._width | state]
+        except KeyError:
+            going_off, going_on, switching, output, members = self._plan(current,state)
+
+        lease_owner = lease.hold(owner)
+
+        # Check every pin that is switching before touching any of them.
+        for p in switching:
+            if global_pin_owners[p.pin_number] != lease_owner:
+                raise p._not_owner(lease_owner)
+
+        if tracing.enabled:
+            tracing.mark("gpio.group",[[p.pin_number for p in self.pins],state])
+
+        if self.pwm:
+            for p in going_off:
+                if p._pwm_running:
+                    p._stop_pwm()
+            for p in going_on:
+                if not p._pwm_running:
+                    p._start_pwm()
+        else:
+            for p in switching:
+                if p._pwm_running:
+                    err = "cannot switch pin {:d}: pulse width modulation running on pin.\n".format(p.pin_number)
+                    raise HardwareConflictError(err)
+            GPIO.output(*output)
+            for p in going_off:
+                p._level = False
+            for p in going_on:
+                p._level = True
+
+        self.state = state
+        for g, s in members:
+            g.state = s
+        if self._parent != None:
+            self._update_parents()
+
+    def hold(self,owner=None):
+        """
+        Return the id the group's pins are held under for owner (see
+        PinLease.hold), to pass to the methods of individual pins.
+        """
+
+        return self._lease.hold(owner)
+
+    def claim(self,owner):
+        """
+        Keep the group (and any it is joined with) for owner alone until
+        unclaim (see PinLease.claim).
+        """
+
+        return self._lease.claim(owner)
+
+    def unclaim(self,owner):
+
+        self._lease.unclaim(owner)
+
+    def stop(self,owner=None):
+        """
+        Shut down and clean up every pin on the group's lease (see
+        PinLease.stop): all of the pins of the groups it is joined with, too.
+        """
+
+        g = self
+        while g._parent != None:
+            g = g._parent
+
+        self._lease.stop(owner)
+
+        g.state = 0
+        for m, shift in g._members:
+            m.state = 0
+
+    def _plan(self,current,state):
+        """
+        Work out (and remember) which pins switch to move from current to
+        state (see __init__ for what is remembered).
+        """
+
+        going_off = tuple(p for i, p in enumerate(self.pins)
+                          if current >> i & 1 and not state >> i & 1)
+        going_on = tuple(p for i, p in enumerate(self.pins)
+                         if state >> i & 1 and not current >> i & 1)
+
+        output = ([p.pin_number for p in going_off + going_on],
+                  [False]*len(going_off) + [True]*len(going_on))
+
+        members = tuple((g,state >> shift & g.mask)
+                        for g, shift in self._members
+                        if (current ^ state) >> shift & g.mask)
+
+        plan = (going_off,going_on,going_off + going_on,output,members)
+        self._transitions[current << self._width | state] = plan
+
+        return plan
+
+    def _update_parents(self):
+        """
+        Copy the state of the group into the groups it is joined into.
+        """
+
+        g = self
+        while g._parent != None:
+            parent = g._parent
+            parent.state = parent.state & ~(g.mask << g._shift) | g.state << g._shift
+            g = parent
+
+    def _share_lease(self,lease):
+
+        self._lease.release()
+        self._lease = lease
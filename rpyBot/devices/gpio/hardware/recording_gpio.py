@@ -0,0 +1,119 @@
+__description__ = \
+"""
+A gpio interface that records every call made to it and keeps track of what
+the pins would be doing, so that software can be run and checked without a
+raspberry pi.  Select it with gpio_backend.select("recording") (or
+RPYBOT_GPIO=recording).
+
+    calls   the most recent calls, as (time.monotonic(),function,args)
+    levels  level of each pin that has been written (or set up)
+    pwm     [frequency,duty_cycle] of each pin running pulse width modulation
+
+input() reads back levels, so set levels[pin] to simulate an input pin.  Each
+process keeps its own record (devices run in processes of their own see only
+their own calls).
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import collections, time
+
+MAX_CALLS = 100000
+
+calls = collections.deque(maxlen=MAX_CALLS)
+levels = {}
+pwm = {}
+
+def _record(function,*args):
+
+    calls.append((time.monotonic(),function,args))
+
+def output(channel,value):
+
+    _record("output",channel,value)
+
+    # Like RPi.GPIO, take a list of channels with one value or a list of them.
+    if type(channel) not in (list,tuple):
+        levels[channel] = bool(value)
+    elif type(value) not in (list,tuple):
+        for c in channel:
+            levels[c] = bool(value)
+    else:
+        for c, v in zip(channel,value):
+            levels[c] = bool(v)
+
+def input(channel):
+
+    _record("input",channel)
+    return int(levels.get(channel,False))
+
+class PWM:
+
+    def __init__(self,channel,frequency):
+
+        _record("PWM",channel,frequency)
+        self.channel = channel
+        self.frequency = frequency
+        self.duty_cycle = None
+
+    def start(self,duty_cycle):
+
+        _record("PWM.start",self.channel,duty_cycle)
+        self.duty_cycle = duty_cycle
+        pwm[self.channel] = [self.frequency,self.duty_cycle]
+
+    def stop(self):
+
+        _record("PWM.stop",self.channel)
+        pwm.pop(self.channel,None)
+
+    def ChangeDutyCycle(self,duty_cycle):
+
+        _record("PWM.ChangeDutyCycle",self.channel,duty_cycle)
+        self.duty_cycle = duty_cycle
+        if self.channel in pwm:
+            pwm[self.channel][1] = duty_cycle
+
+    def ChangeFrequency(self,frequency):
+
+        _record("PWM.ChangeFrequency",self.channel,frequency)
+        self.frequency = frequency
+        if self.channel in pwm:
+            pwm[self.channel][0] = frequency
+
+def cleanup(channel=None):
+
+    _record("cleanup",channel)
+    if channel == None:
+        levels.clear()
+        pwm.clear()
+    else:
+        levels.pop(channel,None)
+        pwm.pop(channel,None)
+
+def setup(channel,direction):
+
+    _record("setup",channel,direction)
+    if direction == OUT:
+        levels[channel] = False
+
+def setmode(mode):
+
+    _record("setmode",mode)
+
+def setwarnings(flag):
+
+    _record("setwarnings",flag)
+
+def clear():
+    """
+    Forget every call and pin state recorded so far.
+    """
+
+    calls.clear()
+    levels.clear()
+    pwm.clear()
+
+IN = 0
+OUT = 1
+BOARD = 0
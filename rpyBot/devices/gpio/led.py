@@ -6,6 +6,9 @@ class IndicatorLight(GPIORobotDevice):
     Class for controlling an indicator light.
     """
 
+    # Toggling a pin is cheap; not worth a process of its own.
+    execution = "inline"
+
     def __init__(self,control_pin,name=None,frequency=1,duty_cycle=100):
         """
         Initialize the light.
@@ -56,6 +59,9 @@ class LightTower(GPIORobotDevice):
     Control a linear array of LEDs, either independently or as a group.
     """
 
+    # Toggling a pin is cheap; not worth a process of its own.
+    execution = "inline"
+
     def __init__(self,control_pins,name=None,frequency=1,duty_cycle=100):
         """
         Initialize the light.
@@ -72,6 +78,8 @@ class LightTower(GPIORobotDevice):
               kwargs = {roll_time: float <- seconds between roll,
                         starting_led: int <- first led (list index, not pin)}
         stoproll: stop an existing led roll
+
+        Every other command stops a roll that is running before it runs.
         duty: set duty cycle, kwargs = {duty_cycle: float}
         freq: set frequency, kwargs = {frequency: float}
         """
@@ -83,13 +91,25 @@ class LightTower(GPIORobotDevice):
             self._led_list.append(hardware.LED(i,frequency=frequency,
                                                duty_cycle=duty_cycle))
 
+        # All of the LEDs as one pin group (bit i is led i), so the tower
+        # changes in a single operation.
+        self._leds = hardware.PinGroup.join([l.pins for l in self._led_list])
+
         self._control_dict = {"on":self._on,
                               "off":self._off,
                               "flip":self._flip,
                               "flash":self._flash,
                               "roll":self._roll,
+                              "stoproll":self._stop_roll,
                               "duty":self._duty,
                               "freq":self._freq}
+
+        # Periodic task stepping the roll (see _roll), the next led in it, and
+        # the owner of the roll (which has the LEDs to itself while it runs,
+        # until a command stops it).
+        self._roll_task = None
+        self._roll_led = 0
+        self._roll_owner = None
  
         # HACK 
         self._queue_message(["roll",{"roll_time":1.0}],destination="robot",destination_device=self.name)
@@ -101,11 +121,12 @@ class LightTower(GPIORobotDevice):
         turn on all of them.
         """
 
+        self._stop_roll()
+
         if led_number is not None:
             self._led_list[led_number].on(owner)
         else:
-            for l in self._led_list:
-                l.on(owner)
+            self._leds.set(self._leds.mask,owner)
 
     def _off(self,led_number=None,owner=None):
         """
@@ -113,11 +134,12 @@ class LightTower(GPIORobotDevice):
         turn off all of them.
         """
 
+        self._stop_roll()
+
         if led_number is not None:
             self._led_list[led_number].off(owner)
         else:
-            for l in self._led_list:
-                l.off(owner)
+            self._leds.set(0,owner)
 
     def _flip(self,led_number=None,owner=None):
         """
@@ -125,11 +147,12 @@ class LightTower(GPIORobotDevice):
         flip all of them.
         """
 
+        self._stop_roll()
+
         if led_number is not None:
             self._led_list[led_number].flip(owner)
         else:
-            for l in self._led_list:
-                l.flip(owner)
+            self._leds.set(self._leds.state ^ self._leds.mask,owner)
 
     def _duty(self,led_number=None,duty_cycle=100.0,owner=None):
         """
@@ -137,6 +160,8 @@ class LightTower(GPIORobotDevice):
         set duty on all of them.
         """
 
+        self._stop_roll()
+
         if led_number is not None:
             self._led_list[led_number].set_duty_cycle(duty_cycle,owner)
         else:
@@ -149,6 +174,8 @@ class LightTower(GPIORobotDevice):
         set frequency on all of them.
         """
 
+        self._stop_roll()
+
         if led_number is not None:
             self._led_list[led_number].set_frequency(frequency,owner)
         else:
@@ -162,6 +189,8 @@ class LightTower(GPIORobotDevice):
         it off after seconds_to_flash seconds. 
         """
 
+        self._stop_roll()
+
         if led_number is not None:
             self._led_list[led_number].on(owner)
             self._queue_message(["off",{"led_number":led_number}],
@@ -169,8 +198,7 @@ class LightTower(GPIORobotDevice):
                                 destination_device=self.name,
                                 delay_time=seconds_to_flash*1000)
         else:
-            for l in self._led_list:
-                l.on(owner)
+            self._leds.set(self._leds.mask,owner)
 
             self._queue_message("off",
                                 destination="robot",
@@ -180,49 +208,57 @@ class LightTower(GPIORobotDevice):
     def _roll(self,roll_time=1.0,starting_led=0,owner=None):
         """
         Turn on LEDs sequentially in rolling fashion until interrupted by
-        self._stop_roll.
+        self._stop_roll.  Runs as a periodic task, so it stays off the message
+        queue.  The roll claims the LEDs, so nothing else can write to them
+        while it runs; any other LED command stops the roll (giving the LEDs
+        back) before it runs.  Rolling again restarts the roll.
 
             roll_time: time in seconds between moving to next led
             starting_led: led on which to start the roll.
             owner: owner of leds while being set.
         """
 
-        # Check to see if _stop_roll has been called, which will set 
-        # self._rolling_status to "Stop running" and thus break the 
-        # _roll loop. If this is the first time ._roll has been called, this
-        # will thrown an attribute error -- so initialize the attribute.
-        try:
-            if self._rolling_status == "Not running":
-                self._rolling_status = "Running"
-            elif self._rolling_status == "Stop running":
-                self._off(owner)
-                self._rolling_status = "Not running"
-                return 
-            else:
-                self._rolling_status = "Running"
-        except AttributeError:
-            self._rolling_status = "Running"
-
-        # Now, turn on the starting led
-        self._led_list[starting_led-1].off(owner)
-        self._led_list[starting_led].on(owner)
-     
-        # Determine the next led we will turn on. 
-        starting_led += 1
-        if starting_led >= len(self._led_list):
-            starting_led -= len(self._led_list)
-
-        # Now queue a message to turn on the next led after roll_time has elapsed.
-        self._queue_message(["roll",{"starting_led":starting_led,
-                                     "roll_time":roll_time}],
-                            #destination="robot",
-                            destination_device=self.name,
-                            delay_time=roll_time*1000)
+        if self._roll_task != None:
+            self.remove_periodic_task(self._roll_task)
+            self._roll_task = None
+            self._leds.unclaim(self._roll_owner)
+
+        self._leds.claim(owner)
+        self._roll_owner = owner
+
+        self._roll_led = starting_led % len(self._led_list)
+        self._roll_task = self.add_periodic_task(self._roll_step,roll_time,
+                                                 kwargs={"owner":owner},
+                                                 name="roll")
+
+    def _roll_step(self,owner):
+        """
+        Move the roll along one led (the only one lit).
+        """
+
+        self._leds.set(1 << self._roll_led,owner)
+
+        self._roll_led = (self._roll_led + 1) % len(self._led_list)
+
+    def _stop_roll(self,owner=None):
+        """
+        Interrupt the rolling LEDs.  The roll's own owner turns them off and
+        gives them back.
+        """
+
+        if self._roll_task != None:
+            self.remove_periodic_task(self._roll_task)
+            self._roll_task = None
+            self._off(owner=self._roll_owner)
+            self._leds.unclaim(self._roll_owner)
+            self._roll_owner = None
 
-    def _stop_roll(self,owner):
+    def stop(self,owner=None):
         """
-        Interrupt the rolling LEDs.
+        Stop any roll and shut down every LED in the tower.  The LEDs share
+        one lease, so they are stopped together, once.
         """
 
-        self._rolling_status = "Stop running"
+        self._stop_roll(owner)
+        self._leds.stop(owner)
 
@@ -8,6 +8,9 @@ class RangeFinder(GPIORobotDevice):
     Class wrapping a GPIO range finder.
     """
 
+    # Sampling busy-waits on the echo pin.
+    blocking_io = True
+
     def __init__(self,trigger_pin,echo_pin,name=None,timeout=5000):
         """
         Initialize ranging system.
@@ -5,16 +5,55 @@ The parent class RobotDevice.
 __author__ = "Michael J. Harms"
 __date__ = "2014-06-18"
 
-from rpyBot import exceptions
-from rpyBot.messages import RobotMessage
+from rpyBot import exceptions, queues, codec, dispatch, executor, tracing
+from rpyBot.messages import RobotMessage, EMERGENCY_STOP, \
+                            ACK_MODES, ACK_NONE, ACK_AGGREGATE, ACK_ECHO
 from random import random
-import time, threading, copy
+import time, threading, copy, os, asyncio
 
 class RobotDevice:
     """
     Base class for connecting to low-level device functionality.  
     """
 
+    # Set to True in devices whose commands block (serial round trips, sleeps,
+    # busy-waits on pins), so the asyncio engine runs them off the event loop.
+    blocking_io = False
+
+    # Where the DeviceManager runs the device: "inline" (manager thread),
+    # "thread" (shared pool) or "process" (its own process).  Can be set per
+    # instance or overridden by the manager's execution_modes.
+    execution = "process"
+
+    # Bounds on the device's queues, as a size or a (size,policy) tuple (see
+    # rpyBot.queues).  inbox_limit caps the commands waiting for the device,
+    # outbox_limit the messages waiting for the manager to collect them.  None
+    # means unbounded.  Overridden by the manager's inbox_limits and
+    # outbox_limits.
+    inbox_limit = None
+    outbox_limit = None
+
+    # Commands that make older, still queued commands pointless, mapped to a
+    # group name.  A command waiting for the device is replaced by a newer
+    # one from the same group, so the device acts on the latest intent rather
+    # than working through every stale one.
+    coalesce_groups = {}
+
+    # How long (in ms) after it came due a command is still worth running, by
+    # command, with max_command_age as the limit for every other command.
+    # Older commands are dropped (and the controller warned) rather than run
+    # late.  A message's own ttl is applied on top of these.  None means no
+    # limit.
+    command_ttl = {}
+    max_command_age = None
+
+    # What to send back to the controller after a command (one of
+    # rpyBot.messages.ACK_MODES), unless the message asks for something else.
+    # In aggregate mode, one ack counting the commands run goes out at most
+    # every ack_interval ms.  Overridden by the manager's ack_modes.
+    ack_mode = ACK_ECHO
+    ack_interval = 1000
+
     def __init__(self,name=None):
         """
         Initialize the device.
@@ -29,8 +68,42 @@ class RobotDevice:
         self._control_dict = {}
         self._manager = None
 
+        # Runs the timed steps of generator commands and periodic tasks (see
+        # rpyBot.executor).
+        self._executor = executor.CommandExecutor(self._report_step_error,
+                                                  self.name)
+        self._periodic_tasks = []
+
+        # _control_dict compiled by compile_commands (built on first use if
+        # nobody compiled it).
+        self._dispatch_table = None
+        self._dispatch_counters = {"dispatched":0,
+                                   "rejected_command":0,
+                                   "rejected_args":0,
+                                   "dispatch_ns":0}
+
+        # Number of commands dropped by put() for being stale.
+        self._expired = 0
+
+        # Commands run since the last aggregate ack (command -> count), the
+        # id of the last one, and the timer that will send the ack.
+        self._acks = {}
+        self._last_acked = None
+        self._ack_timer = None
+
         self._lock = threading.RLock()
-        self._messages = [] 
+        self._messages = queues.make_outbox(self.outbox_limit,self.name)
+
+        # List get() hands back, refilled on every call rather than allocated.
+        self._drained = []
+
+        # Pipe used to tell whoever is polling the device that it has output
+        # waiting.  The read end is exposed via fileno() so a manager can
+        # block on it (and many others) with select.  Both ends are
+        # non-blocking: a full pipe already means "wake up".
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r,False)
+        os.set_blocking(self._wake_w,False)
 
     @property
     def connected(self):
@@ -40,6 +113,14 @@ class RobotDevice:
         return True
 
 
+    def fileno(self):
+        """
+        Selectable handle that becomes readable when the device has messages
+        waiting to be collected by get().
+        """
+
+        return self._wake_r
+
     def connect(self,manager):
         """
         Connect this device to requesting manager, unless we're already connected
@@ -62,12 +143,152 @@ class RobotDevice:
  
         self._manager = None 
 
+    def compile_commands(self):
+        """
+        Compile _control_dict into the dispatch table used by put().  Called
+        when the device is loaded; a device that changes _control_dict after
+        that must call it again.
+        """
+
+        self._dispatch_table = dispatch.compile_commands(self._control_dict)
+
+    def set_ack_mode(self,mode):
+        """
+        Set what the device sends back after a command (one of ACK_MODES).
+        """
+
+        if mode not in ACK_MODES:
+            err = "ack mode for {} must be one of {}, not {}".format(self.name,
+                                                                     ACK_MODES,
+                                                                     mode)
+            raise exceptions.BotConfigurationError(err)
+
+        self.ack_mode = mode
+
+    def dispatch_counters(self):
+        """
+        Return a copy of the dispatch counters: commands run, commands
+        rejected as unknown or with bad arguments, and the total time (in ns)
+        spent looking up and checking commands.
+        """
+
+        return dict(self._dispatch_counters)
+
+    def add_periodic_task(self,function,period,kwargs=None,name=None,
+                          start=True):
+        """
+        Run function(**kwargs) every period seconds on the device's executor,
+        without a message per run.  Returns the executor.PeriodicTask handle
+        (already started unless start is False).  Use it to stop and restart
+        the task.
+        """
+
+        task = executor.PeriodicTask(self._executor,function,period,kwargs,name)
+        self._periodic_tasks.append(task)
+
+        if start:
+            task.start()
+
+        return task
+
+    def remove_periodic_task(self,task):
+        """
+        Stop a periodic task and forget about it.
+        """
+
+        task.stop()
+        if task in self._periodic_tasks:
+            self._periodic_tasks.remove(task)
+
+    def periodic_counters(self):
+        """
+        Return the run counts and jitter of every periodic task (see
+        executor.PeriodicTask.stats).
+        """
+
+        return [t.stats() for t in self._periodic_tasks]
+
+    def cancel_commands(self):
+        """
+        Preempt every command sequence still in flight (periodic tasks
+        included).  Devices that move things should call this from stop() and
+        emergency_stop().
+        """
+
+        return self._executor.cancel()
+
+    @property
+    def command_lock(self):
+        """
+        Lock held while a command (or a step of one) runs.  Hold it to touch
+        the hardware from another thread, so the two never interleave.
+        """
+
+        return self._executor.lock
+
+    def coalesce_key(self,message):
+        """
+        Return the coalescing group of a message, or None if it should never be
+        replaced by a newer one.
+        """
+
+        try:
+            return self.coalesce_groups.get(message.command)
+        except (AttributeError,TypeError):
+            return None
+
+    def is_stale(self,message,now=None):
+        """
+        Whether a message is too old to act on: past its own ttl, or older than
+        the limit this device sets for its command.
+        """
+
+        if message.expired(now):
+            return True
+
+        try:
+            ttl = self.command_ttl.get(message.command,self.max_command_age)
+        except TypeError:
+            ttl = self.max_command_age
+
+        if ttl == None:
+            return False
+
+        return message.age(now) > ttl
+
+    def set_outbox_limit(self,limit):
+        """
+        Change the bound on messages waiting to be collected (a size or a
+        (size,policy) tuple).  Anything already queued is kept.
+        """
+
+        with self._lock:
+            messages = queues.make_outbox(limit,self.name)
+            for m in self._messages.drain():
+                messages.put(m)
+            self._messages = messages
+
+    def queue_counters(self):
+        """
+        Return a copy of the outbox queue counters, plus the number of stale
+        commands put() refused to run.
+        """
+
+        with self._lock:
+            counters = dict(self._messages.counters)
+
+        counters["expired"] = self._expired
+
+        return counters
+
     def get(self):
         """
         Function to poll this piece of hardware for new messages to pass to the 
-        manager.
+        manager.  The list returned is reused by the next call, so use it
+        before polling again.
         """
 
+        self._clear_notify()
         return self._get_all_messages()
     
 
@@ -77,36 +298,113 @@ class RobotDevice:
         message.message_id integer to declare the owner of the hardware 
         associated with the device.
         """
+
+        ack = message.ack
+        if ack == None:
+            ack = self.ack_mode
+
+        # The command may have waited in a queue; don't act on old intent.
+        if self.is_stale(message):
+            self._expired += 1
+            err = "{} dropped stale command {} ({:.0f} ms old)".format(self.name,
+                                                                  message.message,
+                                                                  message.age())
+            self._warn(err,ack)
+            return
    
+        counters = self._dispatch_counters
+        start = time.perf_counter_ns()
+
+        if self._dispatch_table == None:
+            self.compile_commands()
+
+        # Look the command up and check its arguments before calling anything
         try:
+            name, kwargs = dispatch.split_command(message.message)
+            command = self._dispatch_table[name]
+        except (KeyError,exceptions.BotMessageError):
+            counters["rejected_command"] += 1
+            err = "{} got unknown command ({})".format(self.name,message.message)
+            self._warn(err,ack)
+            return
+
+        try:
+            command.check(kwargs)
+        except exceptions.BotMessageError as err:
+            counters["rejected_args"] += 1
+            self._warn(str(err),ack)
+            return
+
+        counters["dispatched"] += 1
+        counters["dispatch_ns"] += time.perf_counter_ns() - start
+
+        # Hardware writes made by the command (or its later steps) are
+        # recorded against the message's trace.
+        trace_id = message.trace_id
+        if trace_id != None and tracing.enabled:
+            tracing.record(trace_id,"device.put",name)
+            previous_trace = tracing.set_current(trace_id)
+        else:
+            trace_id = None
+
+        try:
+
+            # A new command preempts any sequence still running for the same
+            # group (or, for commands in no group, for the same command).
+            group = self.coalesce_key(message)
+            if group == None:
+                group = name
+
+            try:
+                with self._executor.lock:
+                    self._executor.cancel(group)
+                    result = command(message.message_id,kwargs)
+                    if command.sequence:
+                        self._executor.start(group,result,trace_id)
+            except (KeyError,ValueError,TypeError) as err:
+                counters["rejected_args"] += 1
+                err = "Bad command ({}): {}".format(message.message,err)
+                self._warn(err,ack)
+                return
+            except (exceptions.BotOwnershipError,
+                    exceptions.BotHardwareConflictError) as err:
+                err = "{} refused {} ({})".format(self.name,message.message,err)
+                self._warn(err,ack)
+                return
+
+            # Let the controller know the command ran.
+            if ack == ACK_ECHO:
+                self._queue_message(message.message)
+            elif ack == ACK_AGGREGATE:
+                self._add_ack(message)
 
-            # kwargs are specified, parse!
-            if type(message.message) == list:
-                try:
-                    function_key = message.message[0]
-                    kwargs = message.message[1]
-                    self._control_dict[function_key](owner=message.message_id,**kwargs)
-                except (KeyError,ValueError):
-                    err = "Mangled command ({:s})".format(message.message)
-                    self._queue_message(err,destination_device="warn")
-
-            # No kwargs specified         
-            else:
-
-                try:
-                    self._control_dict[message.message](owner=message.message_id)
-                except (KeyError,ValueError):
-                    err = "Mangled command ({:s})".format(message.message)
-                    self._queue_message(err,destination_device="warn")
-
-            # Send the message we just processed back to the controller.
-            self._queue_message(message.message)
-
-        except:
-            err = "Unknown error occurred while passing message\n{}".format(message.pretty)
-            print(err)
+        except exceptions.BotEmergencyError as err:
+            self._queue_message("{} ({})".format(EMERGENCY_STOP,err),
+                                destination_device="warn")
+            self._queue_message(EMERGENCY_STOP,destination="robot")
+
+        # Last resort, so a bug in one command can't take the device down.
+        except Exception as err:
+            err = "{} failed on {} ({}: {})".format(self.name,message.message,
+                                                     type(err).__name__,err)
             self._queue_message(err,destination_device="warn")
+
+        finally:
+            if trace_id != None:
+                tracing.set_current(previous_trace)
  
+    async def aput(self,message):
+        """
+        Coroutine version of put() used by the asyncio engine.  Devices with
+        blocking_io set have put() run in the loop's default executor.
+        """
+
+        if self.blocking_io:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None,self.put,message)
+        else:
+            self.put(message)
+
     def start(self):
         """
         Dummy function, in case device needs to be started up.
@@ -121,6 +419,16 @@ class RobotDevice:
     
         pass
 
+    def emergency_stop(self,owner=None):
+        """
+        Put the hardware in a safe state as fast as possible (e.g. coast the
+        motors).  Called directly by the DeviceManager, bypassing the message
+        queue, with command_lock held (so it waits for a command that is part
+        way through a write).  Devices that move things should override this.
+        """
+
+        pass
+
 
     def _queue_message(self,
                        message="",
@@ -131,7 +439,8 @@ class RobotDevice:
         """
         Append to a RobotMessage instance to self._messages in a thread-safe
         manner.  Automatically set the source and source device.  Take args
-        to set other attributes.
+        to set other attributes.  Returns False if the message was refused
+        because the outbox is full (block policy).
         """
 
 
@@ -145,22 +454,134 @@ class RobotDevice:
                              message=message)
 
             # If msg_string is set to something besides None, parse that string
-            # and load into the RobotMessage instance.
+            # (json, or bytes in the binary codec) and load into the
+            # RobotMessage instance.
             if msg_string != None:
-                m.from_string(msg_string)
+                codec.decode(msg_string,message=m)
             message = m
                 
+        # Only the first message after a get() needs to wake the manager.
+        messages = self._messages
+        if messages.lock_free:
+            return messages.put(message,wake=self._notify)
+
         with self._lock:
-            self._messages.append(message)             
+            accepted = messages.put(message)
+            if len(messages) == 1:
+                self._notify()
+
+        return accepted
+
+    def _report_step_error(self,err):
+        """
+        Tell the controller a step of a command sequence failed.
+        """
+
+        self._queue_message("{}: {}".format(self.name,err),
+                            destination_device="warn")
+
+    def _warn(self,err,ack):
+        """
+        Warn the controller that a command was not run, unless it asked to
+        hear nothing back.
+        """
+
+        if ack != ACK_NONE:
+            self._queue_message(err,destination_device="warn")
+
+    def _add_ack(self,message):
+        """
+        Count a command towards the next aggregate ack, starting the timer
+        that sends it if this is the first since the last one.
+        """
+
+        with self._lock:
+            command = message.command
+            self._acks[command] = self._acks.get(command,0) + 1
+            self._last_acked = message.message_id
+
+            if self._ack_timer == None:
+                self._ack_timer = threading.Timer(self.ack_interval/1000,
+                                                  self._send_acks)
+                self._ack_timer.daemon = True
+                self._ack_timer.start()
+
+    def _send_acks(self):
+        """
+        Send one ack for every command run since the last one:
+        ["ack",{"count":total,"commands":{command:count},"last_id":id}]
+        """
+
+        with self._lock:
+            acks = self._acks
+            last_acked = self._last_acked
+            self._acks = {}
+            self._ack_timer = None
+
+        if len(acks) > 0:
+            self._queue_message(["ack",{"count":sum(acks.values()),
+                                        "commands":acks,
+                                        "last_id":last_acked}])
+
+    def _notify(self):
+        """
+        Mark the device's wakeup handle as readable.  Safe to call from any
+        thread (or from a child process that inherited the pipe).
+        """
+
+        try:
+            os.write(self._wake_w,b"\0")
+        except (BlockingIOError,OSError):
+            pass
+
+    def _clear_notify(self):
+        """
+        Drain the wakeup handle so it stops reporting readable.  Call this
+        before collecting messages so a message queued in between re-arms it.
+        """
+
+        try:
+            while os.read(self._wake_r,4096):
+                pass
+        except (BlockingIOError,OSError):
+            pass
 
     def _get_all_messages(self):
         """
         Get all self._messages (wiping out existing) in a thread-safe manner.
+        Returns the device's reused _drained list.  Lock-free outboxes are
+        drained without taking the device lock.
         """
 
-        with self._lock:
-            m = self._messages[:]
-            self._messages = []
+        drained = self._drained
+        drained.clear()
+
+        messages = self._messages
+        if not messages.lock_free:
+            with self._lock:
+                return messages.drain_into(drained)
+
+        messages.drain_into(drained)
+
+        # A message queued while we were draining may not have woken us (its
+        # producer read the head before we moved it up).  The head has moved
+        # now, so such a message shows here; wake ourselves for it.
+        if messages:
+            self._notify()
+
+        return drained
 
-        return m
 
+
+class MotionDevice(RobotDevice):
+    """
+    Base class for devices that move the robot (drivetrains, motors).  Mix in
+    alongside the hardware base class, e.g. class X(GPIORobotDevice,
+    MotionDevice).
+    """
+
+    # Never act on a command more than half a second after it was due, except
+    # for stopping, which is worth doing however late.  Devices (or
+    # instances) that need a different limit override these.
+    max_command_age = 500
+    command_ttl = {"coast":None,"brake":None}
@@ -3,6 +3,10 @@ var RANGE_PROXIMITY_CUTOFF = 10;  // cm
 var RANGE_CHECK_FREQUENCY = 2000; // milliseconds
 var LOG_LEVEL = 4;
 
+// MESSAGE BATCHING
+var BATCH_SIZE = 16;      // most messages sent to the robot in one frame
+var BATCH_LATENCY = 20;   // milliseconds a message waits for others to join it
+
 /* ------------------------------------------------------------------------- */
 /* RobotMessage class.  This is for constructing and parsing messages from   */
 /* the robot on the socket. These directly mirror the python RobotMessage    */
@@ -34,6 +38,14 @@ var RobotMessage = function(options){
     this.message_id         = Math.floor(Math.random()*1e9);
     this.message            = options.message;
 
+    /* Left undefined (and so out of the JSON) unless given; the robot then  */
+    /* picks the priority from the destination.                              */
+    this.priority           = options.priority;
+
+    /* Also left undefined unless given: what the robot sends back once it   */
+    /* has the command ("none", "error", "aggregate" or "echo").             */
+    this.ack                = options.ack;
+
     this.minimum_time       = this.arrival_time + this.delay;
 
     /* Method: return the message in proper string format */
@@ -43,8 +55,12 @@ var RobotMessage = function(options){
 
     /* Method: build a RobotMessage from a string */
     this.fromString = function(message_string){
+        this.fromObject(JSON.parse(message_string));
+    };
+
+    /* Method: build a RobotMessage from an already parsed object */
+    this.fromObject = function(raw_msg){
 
-        var raw_msg = JSON.parse(message_string);
         for (var key in raw_msg){
             this[key] = raw_msg[key];
         };
@@ -119,6 +135,81 @@ function recieveMessage(socket,msg){
 
 }   
 
+function recieveFrame(socket,frame){
+
+    /* Recieve a frame from the socket.  It holds either one message or a batch
+       of them (an array). */
+
+    var raw = JSON.parse(frame);
+    if (!Array.isArray(raw)){
+        raw = [raw];
+    }
+
+    for (var i = 0; i < raw.length; i++){
+
+        var msg = new RobotMessage();
+        msg.fromObject(raw[i]);
+
+        /* update the last message recieved */
+        if (msg.source_device != "controller"){
+            $("#last-recieved-message").html(JSON.stringify(raw[i]));
+        }
+
+        recieveMessage(socket,msg);
+    }
+
+}
+
+/* Messages waiting to go to the robot in the next frame */
+var outgoing = [];
+var outgoingTimer = null;
+
+function flushOutgoing(socket){
+
+    /* Send everything waiting in outgoing as one frame: the message itself if
+       there is only one, otherwise an array of them. */
+
+    if (outgoingTimer !== null){
+        clearTimeout(outgoingTimer);
+        outgoingTimer = null;
+    }
+
+    if (outgoing.length == 0){
+        return;
+    }
+
+    var frame;
+    if (outgoing.length == 1){
+        frame = outgoing[0];
+    } else {
+        frame = "[" + outgoing.join(",") + "]";
+    }
+    outgoing = [];
+
+    waitForSocketConnection(socket, function(){
+        socket.send(frame);
+    });
+
+}
+
+function batchMessage(socket,message_string,urgent){
+
+    /* Queue a message string for the robot.  The batch is sent when it is
+       full, after BATCH_LATENCY ms, or right away if the message is urgent. */
+
+    outgoing.push(message_string);
+
+    if (urgent || outgoing.length >= BATCH_SIZE){
+        flushOutgoing(socket);
+    } else if (outgoingTimer === null){
+        outgoingTimer = setTimeout(function(){
+            outgoingTimer = null;
+            flushOutgoing(socket);
+        }, BATCH_LATENCY);
+    }
+
+}
+
 function sendMessage(socket,message,allow_repeat){
 
     /* Send a message.  
@@ -147,13 +238,11 @@ function sendMessage(socket,message,allow_repeat){
         /* Send the message */
         if (($("#last-sent-message").html() != message_string) || (allow_repeat == true)){
 
-            /* Wait until the state of the socket is ready and send message */
-            waitForSocketConnection(socket, function(){
-                socket.send(message_string);
+            /* Add to the next frame; emergency messages go right away */
+            batchMessage(socket,message_string,message.priority === 0);
 
-                /* update the last message sent */
-                $("#last-sent-message").html(message_string);
-            });
+            /* update the last message sent */
+            $("#last-sent-message").html(message_string);
         }
     }
 
@@ -203,7 +292,8 @@ function main(){
             //sendMessage(socket,new RobotMessage({destination_device:"forward_range",
             //                                     message:"get"}));
             sendMessage(socket,new RobotMessage({destination_device:"drivetrain",
-                                                 message:"getspeed"}));
+                                                 message:"getspeed",
+                                                 ack:"error"}));
         }, RANGE_CHECK_FREQUENCY );  // run
 
     /* Or complain...  */
@@ -432,6 +522,15 @@ function setSpeed(speed,socket){
                                          message:["setspeed",{"speed":Number(speed)}]}));
 }
 
+function emergencyStop(socket){
+
+    /* Stop the robot now.  Skips everything else waiting in the robot queue. */
+
+    sendMessage(socket,new RobotMessage({destination_device:"drivetrain",
+                                         message:"estop",
+                                         priority:0}));
+}
+
 function setAttentionLight(socket){
 
     if ($("#attention_light_button").hasClass("attention-light-active")){
@@ -513,7 +612,7 @@ function socketListener(socket){
 
     /* Listen for data coming down the socket */
     socket.onmessage = function(socket_spew) {
-        recieveMessage(socket,socket_spew.data);
+        recieveFrame(socket,socket_spew.data);
     }
 
     /* Close the socket */
@@ -527,6 +626,11 @@ function passKeyPress(key,socket){
 
     switch(event.which) {
         
+        /* Emergency stop */
+        case 32: // space
+            emergencyStop(socket);
+            break;
+
         /* Steer the robot */
         case 16: // esc
             setSteer("coast",socket);
@@ -8,7 +8,7 @@ __usage__ = ""
 
 HACK_PATH = "/home/harmsm/rpyBot/rpyBot/devices/web/client" #"/home/harmsm/Desktop/rpyBot/rpyBot/devices/web/client/" 
  
-import multiprocessing, os
+import multiprocessing, os, queue, collections, asyncio
 
 import tornado.httpserver
 import tornado.ioloop
@@ -16,6 +16,8 @@ import tornado.web
 import tornado.websocket
 import tornado.gen
 
+from rpyBot import queues, codec, exceptions, tracing
+from rpyBot.messages import RobotMessage, PRIORITY_EMERGENCY, now_ms
 from .. import RobotDevice, gpio
 
 class IndexHandler(tornado.web.RequestHandler):
@@ -62,7 +64,28 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         kwargs.pop("client_list")
 
         tornado.websocket.WebSocketHandler.__init__(self,*args,**kwargs)
-        self._get_queue = self.application.settings.get("queue")
+        self._post = self.application.settings.get("post")
+
+        # Codec used for messages sent to this client.  Json unless the client
+        # asks for something else when it connects.
+        self._codec = codec.make_codec(codec.JSON)
+
+    def select_subprotocol(self,subprotocols):
+        """
+        Pick the codec to speak from the subprotocols the client offered.  If
+        it offered none we know, stick with json (what the javascript client
+        speaks).
+        """
+
+        offered = [name for name in codec.CODECS
+                   if codec.SUBPROTOCOLS[name] in subprotocols]
+        if len(offered) == 0:
+            return None
+
+        name = codec.negotiate(offered)
+        self._codec = codec.make_codec(name)
+
+        return codec.SUBPROTOCOLS[name]
 
     def open(self):
         """
@@ -70,23 +93,51 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
         """
 
         self._client_list.append(self)
-        self._get_queue.put("LOCALMSG client added")
+        self._post("LOCALMSG client added")
 
     def on_message(self, message):
         """
-        When a message comes from the client, append it to from_client_queue.
+        When a message comes from the client, pass it back to the device.
+        Binary frames arrive as bytes, text frames as str.  A frame holds one
+        message or an envelope of them; get() decodes any of these.  When
+        tracing, the frame goes with the time it arrived.
         """
 
-        self._get_queue.put(message)
+        if tracing.enabled:
+            self._post((message,now_ms()))
+        else:
+            self._post(message)
 
     def on_close(self):
         """
         When the socket connection is closed, dump the client.
         """
 
-        self._get_queue.put("LOCALMSG removed client")
+        self._post("LOCALMSG removed client")
         self._client_list.remove(self)
 
+    def send(self,message):
+        """
+        Send a RobotMessage to the client in its codec.
+        """
+
+        if self._codec.name == codec.BINARY:
+            self.write_message(self._codec.encode(message),binary=True)
+        else:
+            self.write_message(message.as_string())
+
+    def send_batch(self,messages):
+        """
+        Send a list of RobotMessages to the client as one frame.
+        """
+
+        if len(messages) == 1:
+            self.send(messages[0])
+        elif self._codec.name == codec.BINARY:
+            self.write_message(self._codec.encode_batch(messages),binary=True)
+        else:
+            self.write_message(codec.json_batch(messages))
+
 class WebInterface(RobotDevice):
     """
     A WebInterfaceDevice that serves an http/javascript website that can be used
@@ -99,10 +150,15 @@ class WebInterface(RobotDevice):
     http://niltoid.com/blog/raspberry-pi-arduino-tornado/
     """
 
-    def __init__(self,port=8081,led_gpio=None,name=None,web_path=None):
+    def __init__(self,port=8081,led_gpio=None,name=None,web_path=None,
+                 batch_size=32,batch_latency=10):
         """
         Initialize a the class, starting up the input/output queues, the tornado
         handlers, etc.
+
+        Messages for the clients are sent in batches of up to batch_size
+        messages per frame.  A partial batch is sent once its oldest message
+        has waited batch_latency ms (emergency messages go right away).
         """
     
         super(WebInterface, self).__init__(name) 
@@ -120,16 +176,66 @@ class WebInterface(RobotDevice):
         if self._web_path == None:
             self._web_path = HACK_PATH
  
-        # Create a multiprocessing queue to hold messages from the client
-        self._get_queue = multiprocessing.Queue()
+        # Pipe to hold messages from the client.  Unlike a multiprocessing
+        # queue, send() is synchronous, so once we poke the wakeup handle the
+        # message is guaranteed to be readable on the other end.
+        self._get_conn, self._post_conn = multiprocessing.Pipe(duplex=False)
         self._put_queue = multiprocessing.Queue()
         self._client_list = []
 
+        # Outgoing batch
+        self._batch_size = batch_size
+        self._batch_latency = batch_latency
+        self._batch = []
+        self._batch_start = 0.0
+        self._batch_urgent = False
+        self._flush_handle = None
+
+        # Client messages decoded from an envelope that didn't fit in a
+        # blocking outbox yet.
+        self._client_backlog = collections.deque()
+
     def start(self):
         """
         Start up the tornado server.
         """
 
+        self._start_server()
+
+        # Typical tornado.ioloop initialization, except we added a callback in which we 
+        self._mainLoop = tornado.ioloop.IOLoop.instance()
+        self._scheduler = tornado.ioloop.PeriodicCallback(self._send_queued_to_client,10,
+                                                          io_loop=self._mainLoop)
+        # Start the io loop
+        self._scheduler.start()
+        self._mainLoop.start()
+
+    async def start_async(self):
+        """
+        Start the tornado server on the running asyncio event loop (shared with
+        AsyncDeviceManager) rather than on a loop of its own.
+        """
+
+        self._start_server()
+
+    async def aput(self,message):
+        """
+        Coroutine version of put().  Tornado shares our event loop, so the
+        batch can be written to the clients as soon as it is due.
+        """
+
+        self._add_to_batch(message)
+        if self._batch_due():
+            self._flush_batch()
+        elif self._flush_handle == None:
+            self._flush_handle = asyncio.get_event_loop().call_later(
+                self._batch_latency/1000,self._flush_batch)
+
+    def _start_server(self):
+        """
+        Build the tornado application and start the http server listening.
+        """
+
         # Initailize handler 
         app = tornado.web.Application(
             handlers=[
@@ -142,7 +248,7 @@ class WebInterface(RobotDevice):
                 (r"/fonts/(.*)",tornado.web.StaticFileHandler,{'path':os.path.join(self._web_path,"fonts")}),
                 (r"/img/(.*)",tornado.web.StaticFileHandler,{'path':os.path.join(self._web_path,"img")}),
             ],
-            queue=self._get_queue,
+            post=self._post_from_client,
         )
 
         # Create http server
@@ -152,31 +258,52 @@ class WebInterface(RobotDevice):
         # Indicate that robot is ready to listen
         self._queue_message("Listening on port: {:d}".format(self._port))
 
-        # Typical tornado.ioloop initialization, except we added a callback in which we 
-        self._mainLoop = tornado.ioloop.IOLoop.instance()
-        self._scheduler = tornado.ioloop.PeriodicCallback(self._send_queued_to_client,10,
-                                                          io_loop=self._mainLoop)
-        # Start the io loop
-        self._scheduler.start()
-        self._mainLoop.start()
-
     def get(self):
         """
         Poll the client queue for messages.
         """
 
-        # Grab messages from the _get_queue (populated by tornado socket)
-        if not self._get_queue.empty():
-            from_client = self._get_queue.get() 
+        self._clear_notify()
+
+        # Grab messages from the client pipe (populated by tornado socket).  If
+        # the outbox blocks when full, leave the rest in the pipe so a flooding
+        # client backs up on its own connection instead of in our memory.
+        while self._client_backlog or self._get_conn.poll():
+            if self._messages.full() and self._messages.policy == queues.BLOCK:
+                self._notify()
+                break
+
+            if self._client_backlog:
+                self._queue_message(self._client_backlog.popleft())
+                continue
+
+            from_client = self._get_conn.recv()
+
+            received = None
+            if type(from_client) == tuple:
+                from_client, received = from_client
 
             # put these messages into the normal RobotDevice._messages queue,
             # converting to RobotMessage instances in the process.  The LOCALMSG
             # is a hack that lets the tornado client use the queue to send a status
             # string without first converting it into a RobotMessage instance.
-            if from_client.startswith("LOCALMSG"):
+            if type(from_client) == str and from_client.startswith("LOCALMSG"):
                 self._queue_message("".join(from_client[9:]))
-            else:
-                self._queue_message(msg_string=from_client)
+                continue
+
+            # Don't let one bad message from a client take down the device
+            try:
+                from_client = codec.decode_all(from_client,
+                                               new_message=self._client_message)
+            except exceptions.BotMessageError as err:
+                self._queue_message("bad message from client: {}".format(err),
+                                    destination_device="warn")
+                continue
+
+            if received != None:
+                self._trace_client_messages(from_client,received)
+
+            self._client_backlog.extend(from_client)
 
         # Now do a standard "get" and return all of the messages 
         return self._get_all_messages()
@@ -190,6 +317,36 @@ class WebInterface(RobotDevice):
 
         self._put_queue.put(message)
 
+    def _client_message(self):
+        """
+        Blank message for a client message to be decoded into, with the same
+        defaults as _queue_message.
+        """
+
+        return RobotMessage(destination="",
+                            destination_device="controller",
+                            source="robot",
+                            source_device=self.name)
+
+    def _trace_client_messages(self,messages,received):
+        """
+        Give each message from a client a trace id (unless the client sent one
+        of its own) and record when its frame arrived.
+        """
+
+        for m in messages:
+            if m.trace_id == None:
+                m.trace_id = tracing.new_trace_id()
+            tracing.record(m.trace_id,"ws.receive",self.name,received)
+
+    def _post_from_client(self,message):
+        """
+        Called on the tornado thread to hand a client message to get().
+        """
+
+        self._post_conn.send(message)
+        self._notify()
+
 
     def stop(self,owner=None):
         """
@@ -213,14 +370,65 @@ class WebInterface(RobotDevice):
 
     def _send_queued_to_client(self):
         """
-        Send any messages that have been put in self._input_messages since we 
-        last checked, and then send them over the socket to the client.
+        Collect the messages that have been put since we last checked, and send
+        them over the socket to the clients once the batch is due.
         """
 
-        if not self._put_queue.empty():
-            m = self._put_queue.get()
-    
-            # Send all messages to the client
-            for c in self._client_list:
-                c.write_message(m.as_string())
+        while True:
+            try:
+                message = self._put_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._add_to_batch(message)
+
+        if self._batch_due():
+            self._flush_batch()
+
+    def _add_to_batch(self,message):
+        """
+        Add a message to the outgoing batch.
+        """
+
+        if len(self._batch) == 0:
+            self._batch_start = now_ms()
+        self._batch.append(message)
+
+        if message.priority == PRIORITY_EMERGENCY:
+            self._batch_urgent = True
+
+    def _batch_due(self):
+        """
+        Whether the outgoing batch should be sent now.
+        """
+
+        if len(self._batch) == 0:
+            return False
+
+        return self._batch_urgent or \
+               len(self._batch) >= self._batch_size or \
+               now_ms() - self._batch_start >= self._batch_latency
+
+    def _flush_batch(self):
+        """
+        Send the outgoing batch to the clients, batch_size messages per frame.
+        """
+
+        if self._flush_handle != None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch = self._batch
+        self._batch = []
+        self._batch_urgent = False
+
+        for i in range(0,len(batch),self._batch_size):
+            self._write_to_clients(batch[i:i+self._batch_size])
+
+    def _write_to_clients(self,messages):
+        """
+        Send a list of messages to all connected clients.
+        """
+
+        for c in self._client_list:
+            c.send_batch(messages)
 
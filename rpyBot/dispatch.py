@@ -0,0 +1,131 @@
+__description__ = \
+"""
+Command dispatch tables for devices.  A device's _control_dict (command name
+to callback) is compiled once, when the device is loaded, into a table of
+Command entries holding the callback and the keyword arguments it takes (read
+from its signature).  put() checks every command against the table before
+calling anything, so an unknown or mangled command is turned away cheaply and
+without side effects instead of failing part way through a call.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import inspect
+
+from rpyBot import exceptions
+
+_NO_KWARGS = {}
+
+def split_command(command):
+    """
+    Split the message of a command into its name and kwargs.  A command is
+    "name", ["name"] or ["name",{kwargs}].  Raises BotMessageError for
+    anything else.
+    """
+
+    if type(command) == str:
+        return command, _NO_KWARGS
+
+    if type(command) in (list,tuple) and len(command) in (1,2) and \
+       type(command[0]) == str:
+
+        if len(command) == 1:
+            return command[0], _NO_KWARGS
+
+        if type(command[1]) == dict:
+            return command[0], command[1]
+
+    err = "Mangled command ({})".format(command)
+    raise exceptions.BotMessageError(err)
+
+def compile_commands(control_dict):
+    """
+    Compile a control dictionary into a dispatch table (command name to
+    Command).
+    """
+
+    return dict((name,Command(name,function))
+                for name, function in control_dict.items())
+
+
+class Command:
+    """
+    A compiled command: the callback plus the schema of its kwargs.
+    """
+
+    __slots__ = ("name","function","required","allowed","takes_owner",
+                 "sequence")
+
+    def __init__(self,name,function):
+        """
+        Read the schema from the signature of function.  Callbacks whose
+        signature can't be read (some builtins) accept anything, and any
+        problem is left to the call itself.
+        """
+
+        self.name = name
+        self.function = function
+
+        # Generator callbacks return a sequence of timed steps for the
+        # device's CommandExecutor rather than doing all the work at once.
+        self.sequence = inspect.isgeneratorfunction(function)
+
+        # allowed is None when any kwarg is accepted (**kwargs).
+        self.required = ()
+        self.allowed = None
+        self.takes_owner = True
+
+        try:
+            signature = inspect.signature(function)
+        except (TypeError,ValueError):
+            return
+
+        named = (inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                 inspect.Parameter.KEYWORD_ONLY)
+
+        required = []
+        allowed = set()
+        var_kwargs = False
+        for p in signature.parameters.values():
+            if p.kind == inspect.Parameter.VAR_KEYWORD:
+                var_kwargs = True
+            elif p.kind in named:
+                allowed.add(p.name)
+                if p.default is inspect.Parameter.empty and p.name != "owner":
+                    required.append(p.name)
+
+        self.takes_owner = var_kwargs or "owner" in allowed
+        allowed.discard("owner")
+
+        self.required = tuple(required)
+        if not var_kwargs:
+            self.allowed = frozenset(allowed)
+
+    def check(self,kwargs):
+        """
+        Raise BotMessageError unless kwargs are arguments this command takes.
+        Only the names are checked; a value of the wrong type fails in the
+        call itself (TypeError or ValueError), which put() also rejects.
+        """
+
+        if self.allowed != None:
+            for k in kwargs:
+                if k not in self.allowed:
+                    err = "{} got an unexpected argument ({})".format(self.name,
+                                                                      k)
+                    raise exceptions.BotMessageError(err)
+
+        for k in self.required:
+            if k not in kwargs:
+                err = "{} is missing argument ({})".format(self.name,k)
+                raise exceptions.BotMessageError(err)
+
+    def __call__(self,owner,kwargs):
+        """
+        Run the command on behalf of owner.
+        """
+
+        if self.takes_owner:
+            return self.function(owner=owner,**kwargs)
+
+        return self.function(**kwargs)
@@ -20,6 +20,14 @@ class BotOwnershipError(BotError):
 
     pass
 
+class BotHardwareConflictError(BotError):
+    """
+    Exception raised when a command would put a piece of hardware into a
+    nonsensical state.
+    """
+
+    pass
+
 class BotEmergencyError(BotError):
     """
     Exception for some error state that is so bad the bot should (probably) be
@@ -0,0 +1,282 @@
+__description__ = \
+"""
+Per-device executor for commands that take time.  Rather than sleeping in a
+handler (which keeps the device from taking anything else, including brake,
+until the sleep ends), a handler can be written as a generator that does one
+step at a time and yields how long (in seconds) to wait before the next:
+
+    def _steer_center(self,owner):
+        self._steer_motor.reverse(owner)
+        yield self._return_constant
+        self._steer_motor.coast(owner)
+
+The first step runs as soon as the command is dispatched; the executor runs
+the rest on a worker thread when they come due.  A newer command in the same
+group (see RobotDevice.coalesce_groups) preempts the sequence: it is closed,
+so its remaining steps never run (a try/finally in the handler can tidy up).
+
+Steps are scheduled from when the previous one was due, not from when it
+actually ran, so timing errors don't accumulate.  PeriodicTask builds on this
+to run a callable at a fixed rate (animations, sensor sampling) without
+sending the device a message for every run.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import threading, time
+
+from rpyBot import exceptions, tracing
+
+class CommandExecutor:
+    """
+    Runs the timed steps of a device's command sequences, at most one in
+    flight per group.  Hold lock while touching the device from outside the
+    executor so steps never interleave with other commands.
+    """
+
+    def __init__(self,report=None,name=""):
+        """
+        Initialize.
+            report: called with an error message if a step raises
+            name: used to name the worker thread
+        """
+
+        self.lock = threading.RLock()
+        self._ready = threading.Condition(self.lock)
+        self._report = report
+        self._name = name
+
+        # group -> [steps,time the next step is due,trace id of the command
+        # that started it (see tracing)]
+        self._running = {}
+        self._thread = None
+
+        self.counters = {"started":0,
+                         "finished":0,
+                         "preempted":0}
+
+    def __len__(self):
+
+        return len(self._running)
+
+    def start(self,group,steps,trace_id=None):
+        """
+        Start running a sequence (an iterator of steps that yields the delay
+        before the next one) for group, preempting anything already running
+        for it.  The first step runs now, in the caller's thread.  Later steps
+        run with trace_id as the current trace.
+        """
+
+        with self.lock:
+            self.cancel(group)
+            self.counters["started"] += 1
+
+            start = time.monotonic()
+            delay = self._step(steps)
+            if delay == None:
+                return
+
+            self._running[group] = [steps,start + delay,trace_id]
+
+            if self._thread == None:
+                self._thread = threading.Thread(target=self._work,daemon=True,
+                                                name="{}-executor".format(self._name))
+                self._thread.start()
+
+            self._ready.notify()
+
+    def running(self,group):
+        """
+        Whether a sequence is in flight for group.
+        """
+
+        return group in self._running
+
+    def cancel(self,group=None):
+        """
+        Preempt the sequence running for group (every sequence if group is
+        None).  Returns the number cancelled.
+        """
+
+        with self.lock:
+
+            if group == None:
+                groups = list(self._running)
+            elif group in self._running:
+                groups = [group]
+            else:
+                return 0
+
+            for g in groups:
+                steps = self._running.pop(g)[0]
+                self.counters["preempted"] += 1
+                try:
+                    steps.close()
+                except Exception as err:
+                    self._error(err)
+
+            return len(groups)
+
+    def _step(self,steps):
+        """
+        Run one step.  Returns the delay before the next, or None if the
+        sequence is over.
+        """
+
+        try:
+            delay = next(steps)
+        except StopIteration:
+            self.counters["finished"] += 1
+            return None
+        except Exception as err:
+            self._error(err)
+            return None
+
+        if delay == None:
+            return 0.0
+
+        return delay
+
+    def _error(self,err):
+
+        if self._report != None:
+            self._report("command step failed ({})".format(err))
+
+    def _work(self):
+        """
+        Worker thread: run each step when it comes due.
+        """
+
+        with self.lock:
+            while True:
+
+                if len(self._running) == 0:
+                    self._ready.wait()
+                    continue
+
+                group = min(self._running,key=lambda g: self._running[g][1])
+                steps, due, trace_id = self._running[group]
+
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._ready.wait(wait)
+                    continue
+
+                tracing.set_current(trace_id)
+                delay = self._step(steps)
+
+                # The step may have started or cancelled sequences itself.
+                if self._running.get(group,[None])[0] is not steps:
+                    continue
+
+                if delay == None:
+                    self._running.pop(group)
+                else:
+                    self._running[group][1] = due + delay
+
+
+class PeriodicTask:
+    """
+    Handle for a callable run every period seconds on a CommandExecutor.
+    Runs are scheduled on a fixed grid from when the task was started, so
+    they don't drift.  If a run is more than a period late, the runs it
+    missed are skipped (and counted) rather than fired back to back.
+    """
+
+    def __init__(self,executor,function,period,kwargs=None,name=None):
+        """
+        Initialize (but don't start).
+            executor: CommandExecutor to run on
+            function: callable, called with kwargs (a dict) on every run
+            period: seconds between runs
+            name: used in stats (defaults to the function's name)
+        """
+
+        if period <= 0:
+            err = "period must be greater than 0, not {}".format(period)
+            raise exceptions.BotConfigurationError(err)
+
+        self.function = function
+        self.period = period
+        self.kwargs = kwargs
+        if self.kwargs == None:
+            self.kwargs = {}
+
+        self.name = name
+        if self.name == None:
+            self.name = getattr(function,"__name__","task")
+
+        self._executor = executor
+        self._group = ("periodic",id(self))
+
+        self._reset_stats()
+
+    @property
+    def running(self):
+
+        return self._executor.running(self._group)
+
+    def start(self):
+        """
+        Start running (the first run is right away).  Restarts the schedule
+        and stats if already running.
+        """
+
+        self._reset_stats()
+        self._executor.start(self._group,self._steps())
+
+    def stop(self):
+        """
+        Stop running.
+        """
+
+        self._executor.cancel(self._group)
+
+    def stats(self):
+        """
+        Return run counts and jitter (how late each run started relative to
+        its slot on the schedule, in ms).
+        """
+
+        runs = self._runs
+        return {"name":self.name,
+                "period_ms":self.period*1000,
+                "runs":runs,
+                "missed":self._missed,
+                "jitter_mean_ms":self._jitter_sum/runs if runs else 0.0,
+                "jitter_max_ms":self._jitter_max}
+
+    def _reset_stats(self):
+
+        self._runs = 0
+        self._missed = 0
+        self._jitter_sum = 0.0
+        self._jitter_max = 0.0
+
+    def _steps(self):
+        """
+        The sequence run by the executor: one run per step, forever.
+        """
+
+        period = self.period
+        due = time.monotonic()
+        while True:
+
+            late = time.monotonic() - due
+            jitter = late*1000
+            self._runs += 1
+            self._jitter_sum += jitter
+            if jitter > self._jitter_max:
+                self._jitter_max = jitter
+
+            self.function(**self.kwargs)
+
+            # Skip any slots we are already too late for.
+            delay = period
+            if late >= period:
+                skipped = int(late/period)
+                self._missed += skipped
+                delay += skipped*period
+
+            due += delay
+            yield delay
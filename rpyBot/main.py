@@ -10,19 +10,47 @@ __usage__ = "called from command line. usage defined by argparse"
  
 import signal, sys, time, argparse, os
 
-from . import manager, exceptions
+from . import manager, async_manager, exceptions
 
-def start_bot(configuration,verbosity=0):
+def start_bot(configuration,verbosity=0,use_asyncio=False,trace_file=None):
     """
-    Start the bot up in a frame that can catch ctrl+c.
+    Start the bot up in a frame that can catch ctrl+c.  If use_asyncio is
+    True, run the devices on the asyncio engine rather than in processes.  If
+    trace_file is given, trace commands and write the traces to it as json on
+    the way down.
     """   
  
-    dm = manager.DeviceManager(configuration.device_list,verbosity=verbosity)
+    inbox_limits = getattr(configuration,"inbox_limits",{})
+    outbox_limits = getattr(configuration,"outbox_limits",{})
+    ack_modes = getattr(configuration,"ack_modes",{})
+    trace = trace_file != None or getattr(configuration,"trace",False)
+
+    if use_asyncio:
+        dm = async_manager.AsyncDeviceManager(configuration.device_list,
+                                              verbosity=verbosity,
+                                              inbox_limits=inbox_limits,
+                                              outbox_limits=outbox_limits,
+                                              ack_modes=ack_modes,
+                                              trace=trace)
+    else:
+        execution_modes = getattr(configuration,"execution_modes",{})
+        dm = manager.DeviceManager(configuration.device_list,verbosity=verbosity,
+                                   execution_modes=execution_modes,
+                                   inbox_limits=inbox_limits,
+                                   outbox_limits=outbox_limits,
+                                   ack_modes=ack_modes,
+                                   trace=trace)
 
     def signal_handler(signal, frame):
         """
         Function for catching ctrl+c.
         """
+
+        # Collect the traces while the device processes are still up.
+        if trace_file != None:
+            with open(trace_file,"w") as f:
+                f.write(dm.export_trace(indent=1))
+
         dm.shutdown()
         print("Shutting down...")
         sys.exit()
@@ -49,6 +77,12 @@ def main(argv=None):
                         help='configuration python script')
     parser.add_argument("--verbose",dest='verbose',action='store_true',
                         help='be verbose')
+    parser.add_argument("--asyncio",dest='use_asyncio',action='store_true',
+                        help='run devices on the asyncio engine')
+    parser.add_argument("--trace",dest='trace_file',action='store',default=None,
+                        help='trace commands, writing the traces to this file (json) on exit')
+    parser.add_argument("--gpio",dest='gpio_backend',action='store',default=None,
+                        help='gpio backend: auto, rpi, fake or recording (default: $RPYBOT_GPIO, else auto)')
     args = parser.parse_args(argv)
 
     # Grab the configuration file
@@ -58,10 +92,16 @@ def main(argv=None):
         err = "\n\nConfiguration file {} not found.\n\n".format(config_file)
         raise exceptions.BotConfigurationError(err)
 
+    # Choose the gpio backend before the configuration makes any pins
+    if args.gpio_backend != None:
+        from .devices.gpio.hardware import gpio_backend
+        gpio_backend.select(args.gpio_backend)
+
     # import configuration file as "configuration" module
     sys.path.append(os.getcwd())
     configuration = __import__(config_file[:-3])
-    start_bot(configuration,verbosity=verbose)
+    start_bot(configuration,verbosity=verbose,use_asyncio=args.use_asyncio,
+              trace_file=args.trace_file)
 
 # If called from the command line
 if __name__ == "__main__":
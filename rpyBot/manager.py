@@ -4,38 +4,153 @@ __description__ = \
 __author__ = "Michael J. Harms"
 __date__ = "2014-06-18"
 
-import multiprocessing, time, random, copy
+import time, random, os, selectors, collections
+import concurrent.futures
 
-from rpyBot.messages import RobotMessage
+from rpyBot import exceptions
+from rpyBot.messages import RobotMessage, EMERGENCY_STOP, PRIORITY_CONTROL
+from rpyBot.scheduler import MessageScheduler
+from rpyBot import transport, queues, codec, tracing
+
+# Virtual devices that route to a real one.  Messages to "warn" go to the
+# controller.
+ROUTE_ALIASES = {"warn":"controller"}
 
 class DeviceManager:
     """
     Class for aynchronous communication and integration between all of the 
-    devices attached to the robot.  It runs on the main thread and then spawns
-    a thread for each device attached to the robot.
+    devices attached to the robot.  It runs on the main thread.  Each device
+    runs according to its execution mode: inline on the manager thread, on a
+    shared thread pool, or in a process of its own that the manager talks to
+    over a pipe (see rpyBot.transport).
     """
  
-    def __init__(self,device_list=[],poll_interval=0.1,verbosity=0):
+    def __init__(self,device_list=[],poll_interval=None,verbosity=0,
+                 batch_dispatch=True,max_per_tick=None,execution_modes={},
+                 thread_pool_size=4,estop_timeout=0.25,inbox_limits={},
+                 outbox_limits={},codecs=codec.CODECS,ack_modes={},
+                 trace=False):
         """
         Initialize.  
             device_list: list of RobotDevice instances
-            poll_interval: how often to poll messaging queues (in seconds) 
+            poll_interval: longest time (in seconds) to block waiting for a 
+                           device to signal it has output.  None means block
+                           until a device is ready or a delayed message comes
+                           due.  Devices without a selectable fileno() are
+                           polled at least every 0.1 s regardless.
             verbosity: whether or not to spew messages to standard out 
+            batch_dispatch: route every message that is ready in a single
+                            tick.  If False, route at most one message per
+                            tick (the original behavior).
+            max_per_tick: optional cap on the number of messages routed per
+                          tick when batch_dispatch is True (None = no cap).
+            execution_modes: dictionary mapping device names to "inline", 
+                             "thread" or "process".  Devices not listed use
+                             their execution attribute.
+            thread_pool_size: number of threads shared by "thread" devices.
+            estop_timeout: how long (in seconds) to wait for each device to
+                           confirm an emergency stop.
+            inbox_limits: dictionary mapping device names to the bound on
+                          commands waiting for that device, as a size or a
+                          (size,policy) tuple (see rpyBot.queues).  Devices
+                          not listed use their inbox_limit attribute.
+            outbox_limits: same, for messages a device has produced that are
+                           waiting to be collected by the manager.
+            codecs: wire codecs to offer device processes, most preferred
+                    first (see rpyBot.codec).
+            ack_modes: dictionary mapping device names to what the device
+                       sends back after a command (one of
+                       rpyBot.messages.ACK_MODES).  Devices not listed use
+                       their ack_mode attribute.
+            trace: record the path of every client command through the robot
+                   (see rpyBot.tracing and trace_spans).
         """
     
         self.device_list = device_list
         self.poll_interval = poll_interval
         self.verbosity = verbosity
-        self.queue = [] 
-
-        self.loaded_devices = []
+        self.batch_dispatch = batch_dispatch
+        self.max_per_tick = max_per_tick
+        self.execution_modes = execution_modes
+        self.thread_pool_size = thread_pool_size
+        self.estop_timeout = estop_timeout
+        self.inbox_limits = inbox_limits
+        self.outbox_limits = outbox_limits
+        self.codecs = codecs
+        self.ack_modes = ack_modes
+        self._thread_pool = None
+
+        # Turned on before any device process is started, so they inherit it.
+        self.trace = trace
+        if self.trace:
+            tracing.enable()
+
+        # Ready messages sit in one FIFO per priority, delayed messages in a
+        # heap keyed on their minimum_time.
+        self.queue = MessageScheduler()
+
+        # Device name -> handle for every loaded device, plus the routing
+        # table used to dispatch messages: the same mapping with the
+        # ROUTE_ALIASES resolved ahead of time.
         self.loaded_devices_dict = {}
-        self.device_processes = []
+        self._routes = {}
 
         self.manager_id = int(random.random()*1e9)
 
+        # The manager blocks on every device's wakeup handle (plus its own, so
+        # stop() can wake it) at once, rather than polling.  The scheduler,
+        # the routing table and the device pipes have no locks: everything
+        # but stop() must be called from the manager's own thread.
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r,False)
+        os.set_blocking(self._wake_w,False)
+        self._selector.register(self._wake_r,selectors.EVENT_READ,None)
+
+        # Devices that have no selectable handle and so must be polled.
+        self._unselectable_devices = []
+
+        # Messages a device with a "block" inbox could not take yet (device
+        # name -> deque), the number held from each device that sent them,
+        # and the devices we stopped polling because of it.  Nothing more is
+        # read from a paused device until its held messages have gone through.
+        self._held = {}
+        self._held_from = collections.Counter()
+        self._paused = set()
+
+        # Running tallies of what the manager has been doing.  "backlog" is
+        # the number of ready messages still waiting to be routed at the end
+        # of the last tick; "delayed" is the number waiting on a deadline.
+        self.counters = {"ticks":0,
+                         "dispatched":0,
+                         "backlog":0,
+                         "max_backlog":0,
+                         "delayed":0,
+                         "estops":0,
+                         "estop_latency_ms":None,
+                         "estop_max_latency_ms":None,
+                         "estop_dropped":0,
+                         "held":0,
+                         "max_held":0,
+                         "expired":0}
+
+        # Stale messages dropped since the controller was last told, and when
+        # that was.  Warnings are sent at most once a second so a backlog of
+        # stale commands doesn't turn into a backlog of warnings.
+        self._expired_unreported = 0
+        self._expired_oldest = 0
+        self._expired_warned = 0.0
+
         self._run_loop = False
 
+    @property
+    def loaded_devices(self):
+        """
+        List of handles for the loaded devices, in the order they were loaded.
+        """
+
+        return list(self.loaded_devices_dict.values())
+
     def start(self):
         """
         Start the main loop running.
@@ -47,10 +162,13 @@ class DeviceManager:
     def stop(self):
         """
         Stop the main loop from running.  Does not automatically unload devices
-        or stop them.
+        or stop them.  The only method that is safe to call from another
+        thread: it just sets a flag and wakes the loop, which exits after its
+        current tick.
         """
         
         self._run_loop = False
+        self._wake()
 
     def shutdown(self):
         """
@@ -61,52 +179,207 @@ class DeviceManager:
         for d in self.loaded_devices:
             self.unload_device(d.name)
 
+        if self._thread_pool != None:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+
     def load_device(self,d):
         """
         Load a device into the DeviceManager.
         """
 
+        if d.name in self.loaded_devices_dict:
+            message = "device {:s} already connected!".format(d.name)
+            self._queue_message(message,destination_device="warn")
+            return
+
         try:
             d.connect(self.manager_id)
-            if d.name in list(self.loaded_devices_dict.keys()):
-                message = "device {:s} already connected!".format(d.name)
-                self._queue_message(message,destination_device="warn")
-            else:
-                self.loaded_devices.append(d)
-                self.loaded_devices_dict[d.name] = len(self.loaded_devices) - 1
-                self.device_processes.append(multiprocessing.Process(target=self.loaded_devices[-1].start))
-                self.device_processes[-1].start()
-
         except exceptions.BotConnectionError as err:
-            self._queue_message(err,destination_device="warn")
-        
+            self._queue_message(str(err),destination_device="warn")
+            return
+
+        # The manager only ever talks to the device through a handle,
+        # which knows where the device actually runs.
+        mode = self.execution_modes.get(d.name,d.execution)
+        if mode == "thread" and self._thread_pool == None:
+            self._thread_pool = concurrent.futures.ThreadPoolExecutor(
+                self.thread_pool_size,thread_name_prefix="rpyBot-device")
+
+        # Compile the device's commands now, before it might be moved into a
+        # process of its own.
+        d.compile_commands()
+        d.set_ack_mode(self.ack_modes.get(d.name,d.ack_mode))
+
+        d.set_outbox_limit(self.outbox_limits.get(d.name,d.outbox_limit))
+        inbox_limit = queues.parse_limit(self.inbox_limits.get(d.name,
+                                                               d.inbox_limit),
+                                         d.name)
+
+        handle = transport.make_handle(d,mode,self._thread_pool,inbox_limit,
+                                       self.codecs)
+        handle.start()
+
+        self._add_route(handle)
+        self._watch_device(handle)
+
     def unload_device(self,device_name):
         """
         Unload a device from the control of the DeviceManager.
         """
 
-        try:       
-            index = self.loaded_devices_dict[device_name] 
+        handle = self._remove_route(device_name)
+        if handle == None:
+            message = "device {} is not connected".format(device_name)
+            self._queue_message(message,destination_device="warn")
+            return
+
+        # Anything still held for the device goes with it.
+        for m in self._held.pop(device_name,()):
+            self.counters["held"] -= 1
+            self._unhold(m)
+
+        # Stop the device, diconnect it from this device manager instance, 
+        # and then wait for it to finish.
+        if handle in self._paused:
+            self._paused.discard(handle)
+        else:
+            self._unwatch_device(handle)
+        handle.stop(self.manager_id)
+        handle.disconnect()
+
+    def _device_died(self,handle):
+        """
+        Unload a device whose process has died (so its pipe stops waking us
+        up) and warn the controller.
+        """
+
+        if self.loaded_devices_dict.get(handle.name) != handle:
+            return
 
-            # Stop the device, diconnect it from this device manager instance, 
-            # and then kill its thread.        
-            self.loaded_devices[index].stop(self.manager_id)
-            self.loaded_devices[index].disconnect()
-            self.device_processes[index].terminate()
-  
-            # Remove it from the lists holding the devices.  
-            for k in self.loaded_devices_dict.keys():
-                self.loaded_devices_dict[k] -= 1
+        self.unload_device(handle.name)
 
-            self.loaded_devices.pop(index)
-            self.loaded_devices_dict.pop(device_name)
-            self.device_processes.pop(index)
+        err = "device {} died and was unloaded".format(handle.name)
+        self._queue_message(err,destination_device="warn")
 
-        except KeyError:
-            message = "device {} is not connected".format(device_name)
-            self._queue_message(message,destination_device="warn")
+    def _add_route(self,handle):
+        """
+        Add a loaded device's handle to the routing table.
+        """
+
+        self.loaded_devices_dict[handle.name] = handle
+        self._routes[handle.name] = handle
+        for alias, target in ROUTE_ALIASES.items():
+            if target == handle.name:
+                self._routes[alias] = handle
+
+    def _remove_route(self,device_name):
+        """
+        Remove a device (and any aliases pointing at it) from the routing
+        table.  Returns its handle, or None if it was not loaded.
+        """
+
+        handle = self.loaded_devices_dict.pop(device_name,None)
+        if handle == None:
+            return None
+
+        self._routes.pop(device_name,None)
+        for alias, target in ROUTE_ALIASES.items():
+            if target == device_name:
+                self._routes.pop(alias,None)
+
+        return handle
 
        
+    def emergency_stop(self,reason=""):
+        """
+        Bring every loaded device to a safe stop (drivetrains coast) without
+        going through the message queue.  Control commands waiting to be
+        routed, delayed ones included, are thrown away so they can't restart
+        anything.  The time until every
+        device confirmed is recorded in counters.
+        """
+
+        start = time.perf_counter()
+
+        # Tell every device first, then wait, so the stops happen in parallel.
+        handles = self.loaded_devices
+        for h in handles:
+            h.emergency_stop(self.manager_id)
+
+        failed = []
+        for h in handles:
+            if h.wait_emergency_stop(self.estop_timeout) == None:
+                failed.append(h.name)
+
+        latency = 1000*(time.perf_counter() - start)
+
+        dropped = self.queue.drop_lane(PRIORITY_CONTROL)
+        for held in self._held.values():
+            dropped += len(held)
+            for m in held:
+                self._unhold(m)
+        self._held = {}
+        self.counters["held"] = 0
+
+        self.counters["estops"] += 1
+        self.counters["estop_dropped"] += dropped
+        self.counters["estop_latency_ms"] = latency
+        if self.counters["estop_max_latency_ms"] == None or \
+           latency > self.counters["estop_max_latency_ms"]:
+            self.counters["estop_max_latency_ms"] = latency
+
+        message = "emergency stop ({}) in {:.3f} ms".format(reason,latency)
+        if failed:
+            message += "; no confirmation from {}".format(", ".join(failed))
+        self._queue_message(message,destination_device="warn")
+
+    def queue_counters(self):
+        """
+        Return the counters of every loaded device's inbox and outbox queues,
+        command dispatch and periodic tasks (see RobotDevice.dispatch_counters
+        and periodic_counters), keyed by device name.
+        """
+
+        return dict((h.name,h.queue_counters()) for h in self.loaded_devices)
+
+    def trace_spans(self):
+        """
+        Return every trace span recorded so far: the manager's own plus those
+        of each device process (see rpyBot.tracing).
+        """
+
+        spans = tracing.spans()
+        for h in self.loaded_devices:
+            spans.extend(h.trace_spans())
+
+        return spans
+
+    def export_trace(self,indent=None):
+        """
+        Return the recorded traces as json (see rpyBot.tracing.to_dict).
+        """
+
+        return tracing.export_json(self.trace_spans(),indent)
+
+    def benchmark_devices(self,num_messages=1000):
+        """
+        Measure round trip latency and messages/sec of handing work to every
+        loaded device (through the pipe and dispatch loop for process devices,
+        through the pool for thread devices).  Returns a list of dictionaries,
+        one per device.
+        """
+
+        results = []
+        for d in self.loaded_devices:
+            results.append(d.benchmark(num_messages))
+
+            # Anything the device sent while we were busy goes in the queue.
+            for m in d.get():
+                self._queue_message(m)
+
+        return results
+
     def _run(self):
 
         for d in self.device_list:
@@ -114,48 +387,261 @@ class DeviceManager:
    
         self._queue_message("starting system") 
 
+        # Poll every device once so nothing queued before the loop started is
+        # missed.
+        ready_devices = self.loaded_devices
         while self._run_loop:
 
-            # Go through the queue and pipe messages to appropriate devices
-            if len(self.queue) > 0:
+            self._tick(ready_devices)
+            ready_devices = self._wait()
 
-                # Get the next message
-                message = self._get_message()
- 
-                # If the message is past its delay, send it to a device.  If not, 
-                # stick it back into the queue 
-                if message.check_delay() == True:
-                    self._message_to_device(message)
-                else:
-                    self._queue_message(message)
-            
-            # Rotate through the loaded devices and see if any of them have  
-            # output ready.  If so, put the output into the queue for the next
-            # pass.
-            for d in self.loaded_devices:
-                msgs = d.get()
-                for m in msgs:   
-                    self._queue_message(m)
-
-            # Wait poll_interval seconds before checking queues again
-            time.sleep(self.poll_interval)
+    def _wait(self):
+        """
+        Block until a device signals it has output, the next delayed message
+        comes due, or (if set) poll_interval elapses.  Don't block at all if
+        something is already ready to send.  Returns the list of devices that
+        should be polled.
+        """
+
+        wait = self.queue.time_to_next()
+        if self.poll_interval != None:
+            if wait == None or wait > self.poll_interval:
+                wait = self.poll_interval
+        if self._unselectable_devices:
+            if wait == None or wait > 0.1:
+                wait = 0.1
+
+        # A blocked device does not say when it has room again.
+        if self._held:
+            if wait == None or wait > 0.01:
+                wait = 0.01
+
+        ready_devices = []
+        for key, events in self._selector.select(wait):
+            if key.data == None:
+                self._clear_wake()
+            else:
+                ready_devices.append(key.data)
+
+        ready_devices.extend(self._unselectable_devices)
+
+        return ready_devices
+
+    def _watch_device(self,d):
+        """
+        Register a device's wakeup handle with the selector (or, if it has
+        none, note that it must be polled).
+        """
+
+        try:
+            self._selector.register(d.fileno(),selectors.EVENT_READ,d)
+        except (AttributeError,ValueError,OSError):
+            self._unselectable_devices.append(d)
+
+    def _unwatch_device(self,d):
+        """
+        Stop watching a device.
+        """
+
+        if d in self._unselectable_devices:
+            self._unselectable_devices.remove(d)
+            return
+
+        try:
+            self._selector.unregister(d.fileno())
+        except (AttributeError,ValueError,KeyError,OSError):
+            pass
+
+    def _wake(self):
+        """
+        Wake the main loop up if it is blocked waiting on devices.
+        """
+
+        try:
+            os.write(self._wake_w,b"\0")
+        except (BlockingIOError,OSError):
+            pass
+
+    def _clear_wake(self):
+        """
+        Drain the manager's own wakeup handle.
+        """
+
+        try:
+            while os.read(self._wake_r,4096):
+                pass
+        except (BlockingIOError,OSError):
+            pass
+
+    def _tick(self,ready_devices=None):
+        """
+        Route the messages that are ready, then poll the devices that have
+        signaled they have output (all loaded devices if ready_devices is None).
+        """
+
+        # Figure out how many messages to route this tick.  Only messages that
+        # are ready when the tick starts count, so a message queued while we
+        # are dispatching (e.g. a warning) waits for the next tick rather than
+        # keeping us here forever.
+        # Messages held for blocked devices go first, in order.
+        if self._held:
+            self._release_held()
+
+        if self.batch_dispatch:
+            budget = self.queue.promote()
+            if self.max_per_tick != None and budget > self.max_per_tick:
+                budget = self.max_per_tick
+        else:
+            budget = 1
+
+        # Grab the messages whose delay has passed and pipe them to the
+        # appropriate devices.  Delayed messages stay in the scheduler's heap
+        # until they come due.
+        for i in range(budget):
+            message = self._get_message()
+            if message == None:
+                break
+            self._message_to_device(message)
+            self.counters["dispatched"] += 1
+        
+        # Rotate through the devices that have output ready and put the output
+        # into the queue for the next pass.
+        if ready_devices == None:
+            ready_devices = self.loaded_devices
+
+        for d in ready_devices:
+            if d in self._paused:
+                continue
+            msgs = d.get()
+            for m in msgs:   
+                self._queue_message(m)
+            if d.dead:
+                self._device_died(d)
+
+        self.counters["ticks"] += 1
+        self.counters["backlog"] = self.queue.promote()
+        self.counters["delayed"] = self.queue.num_delayed
+        if self.counters["backlog"] > self.counters["max_backlog"]:
+            self.counters["max_backlog"] = self.counters["backlog"]
 
     def _message_to_device(self,message):
         """ 
         Send a RobotMessage instance to appropriate devices 
         """
 
-        # if the message is sent to the virtual "warn" device, forward this to
-        # the controller
-        if message.destination_device == "warn":
-            self.loaded_devices[self.loaded_devices_dict["controller"]].put(message)
+        # A single lookup; virtual devices such as "warn" are already resolved
+        # in the routing table.
+        handle = self._routes.get(message.destination_device)
+        if handle != None:
+            if tracing.enabled and message.trace_id != None:
+                tracing.record(message.trace_id,"manager.dispatch",handle.name)
+            if handle.device.is_stale(message):
+                self._expire(message)
+                return
+            if handle.name in self._held or not handle.put(message):
+                self._hold(handle.name,message)
             return
 
-        try:
-            self.loaded_devices[self.loaded_devices_dict[message.destination_device]].put(message)
-        except KeyError:
-            err = "device \"{}\" not loaded.".format(message.destination_device)
-            self._queue_message(err,destination_device="warn")
+        # Don't warn about a missing warning destination (that would just
+        # generate another warning to nowhere).
+        if message.destination_device in ROUTE_ALIASES:
+            if self.verbosity > 0:
+                message.pretty_print()
+            return
+
+        err = "device \"{}\" not loaded.".format(message.destination_device)
+        self._queue_message(err,destination_device="warn")
+
+    def _expire(self,message):
+        """
+        Drop a message that is too old to act on, and let the controller know
+        (at most once a second).
+        """
+
+        self.counters["expired"] += 1
+        self._expired_unreported += 1
+        self._expired_oldest = max(self._expired_oldest,message.age())
+
+        if message.destination_device in ROUTE_ALIASES:
+            return
+
+        now = time.monotonic()
+        if now - self._expired_warned < 1.0:
+            return
+
+        err = "dropped {} stale command(s), the oldest {:.0f} ms old".format(
+                    self._expired_unreported,self._expired_oldest)
+        self._expired_unreported = 0
+        self._expired_oldest = 0
+        self._expired_warned = now
+        self._queue_message(err,destination_device="warn")
+
+    def _hold(self,device_name,message):
+        """
+        Hold on to a message that a device's inbox refused, and stop reading
+        from the device that sent it (backpressure).
+        """
+
+        held = self._held.setdefault(device_name,collections.deque())
+        held.append(message)
+
+        self.counters["held"] += 1
+        if self.counters["held"] > self.counters["max_held"]:
+            self.counters["max_held"] = self.counters["held"]
+
+        source = message.source_device
+        self._held_from[source] += 1
+        if self._held_from[source] == 1:
+            self._pause(source)
+
+    def _release_held(self):
+        """
+        Hand held messages to their devices until each device refuses again.
+        """
+
+        for name in list(self._held.keys()):
+            held = self._held[name]
+            handle = self.loaded_devices_dict.get(name)
+            while held and handle.put(held[0]):
+                self._unhold(held.popleft())
+                self.counters["held"] -= 1
+                self.counters["dispatched"] += 1
+
+            if not held:
+                self._held.pop(name)
+
+    def _unhold(self,message):
+        """
+        Note that a message is no longer held, resuming the device that sent it
+        if that was the last one held from it.
+        """
+
+        source = message.source_device
+        self._held_from[source] -= 1
+        if self._held_from[source] <= 0:
+            del self._held_from[source]
+            self._resume(source)
+
+    def _pause(self,device_name):
+        """
+        Stop reading from a device.  Paused devices are taken out of the
+        selector so their pending output doesn't keep waking us up.
+        """
+
+        handle = self.loaded_devices_dict.get(device_name)
+        if handle != None and handle not in self._paused:
+            self._paused.add(handle)
+            self._unwatch_device(handle)
+
+    def _resume(self,device_name):
+        """
+        Start reading from a paused device again.
+        """
+
+        handle = self.loaded_devices_dict.get(device_name)
+        if handle in self._paused:
+            self._paused.discard(handle)
+            self._watch_device(handle)
     
     def _queue_message(self,
                        message="",
@@ -187,18 +673,34 @@ class DeviceManager:
 
         if self.verbosity > 0:
             message.pretty_print()      
-                     
-        self.queue.append(message) #.put(message)
+
+        # Emergency stops skip the queue entirely.
+        if message.command == EMERGENCY_STOP:
+            self.emergency_stop("{}.{}".format(message.source,
+                                               message.source_device))
+            return
+
+        if tracing.enabled and message.trace_id != None:
+            tracing.record(message.trace_id,"manager.enqueue")
+
+        self._enqueue(message)
+
+    def _enqueue(self,message):
+        """
+        Hand a RobotMessage to the scheduler.
+        """
+
+        self.queue.push(message)
 
     def _get_message(self):
         """
-        Return the first message in the queue.
+        Return the next message that is ready to send, or None if nothing is
+        ready.
         """ 
 
-        if len(self.queue) == 0:
-            return
-
-        message = self.queue.pop(0) #.get()
+        message = self.queue.pop()
+        if message == None:
+            return None
 
         # If this is a raw message string, convert it to a RobotMessage
         # instance 
@@ -6,60 +6,260 @@ fashion.
 __author__ = "Michael J. Harms"
 __date__ = "2014-12-29"
 
-import time, json, random
+import time, json, itertools, os
 from . import exceptions
 
+# Message priorities, highest first.  The DeviceManager always routes every
+# ready message in a higher priority lane before any in a lower one.
+PRIORITY_EMERGENCY = 0
+PRIORITY_CONTROL = 1
+PRIORITY_TELEMETRY = 2
+PRIORITIES = (PRIORITY_EMERGENCY,PRIORITY_CONTROL,PRIORITY_TELEMETRY)
+
+# A message with this command skips the queue entirely: the DeviceManager
+# immediately brings every device to a safe stop.
+EMERGENCY_STOP = "estop"
+
+# What a device sends back to the controller after a command:
+#   none: nothing, not even a warning if the command is rejected
+#   error: only a warning if the command is rejected or fails
+#   aggregate: warnings, plus one ack message every so often counting the
+#              commands run since the last one
+#   echo: warnings, plus the command itself once it has run
+ACK_NONE = "none"
+ACK_ERROR = "error"
+ACK_AGGREGATE = "aggregate"
+ACK_ECHO = "echo"
+ACK_MODES = (ACK_NONE,ACK_ERROR,ACK_AGGREGATE,ACK_ECHO)
+
+def now_ms():
+    """
+    Current time (in ms) on the clock used for message time stamps.  This is a
+    monotonic clock, so delays and ttls are immune to the wall clock being
+    set.  It is shared by every process on the machine, so time stamps still
+    make sense after a message is passed to a device process.
+    """
+
+    return time.monotonic_ns()*1e-6
+
+# Fields that may appear in a message on the wire, with the types allowed for
+# each.  delay_time is accepted as another name for delay.
+_NUMBER = (int,float)
+WIRE_FIELDS = {"destination":(str,),
+               "destination_device":(str,),
+               "source":(str,),
+               "source_device":(str,),
+               "delay":_NUMBER,
+               "delay_time":_NUMBER,
+               "message_id":(int,),
+               "message":(str,list),
+               "priority":(int,type(None)),
+               "arrival_time":_NUMBER,
+               "minimum_time":_NUMBER,
+               "ttl":_NUMBER + (type(None),),
+               "ack":(str,type(None)),
+               "trace_id":(int,type(None))}
+
+# Wire fields the robot assigns itself.  A message from a client (decoded
+# without keep_times) may carry them, but they are ignored: a client can't
+# pass itself off as a device, reuse another message's id (the owner of any
+# hardware it grabs) or pick its own priority lane.
+SERVER_FIELDS = ("source_device","message_id","priority")
+
+def _check_wire_dict(message_dict):
+    """
+    Raise BotMessageError unless message_dict only holds wire fields with
+    values of the right type.  A list message must be [command] or
+    [command,kwargs].
+    """
+
+    if type(message_dict) != dict:
+        err = "Mangled message ({})".format(message_dict)
+        raise exceptions.BotMessageError(err)
+
+    for k, v in message_dict.items():
+        try:
+            allowed = WIRE_FIELDS[k]
+        except (KeyError,TypeError):
+            err = "Unknown message field ({})".format(k)
+            raise exceptions.BotMessageError(err)
+
+        if type(v) not in allowed and not (type(v) == bool and int in allowed):
+            err = "Bad value for message field {} ({})".format(k,v)
+            raise exceptions.BotMessageError(err)
+
+    if message_dict.get("ack") not in ACK_MODES + (None,):
+        err = "Bad value for message field ack ({})".format(message_dict["ack"])
+        raise exceptions.BotMessageError(err)
+
+    message = message_dict.get("message")
+    if type(message) == list:
+        if not (1 <= len(message) <= 2) or type(message[0]) != str or \
+           (len(message) == 2 and type(message[1]) != dict):
+            err = "Mangled command ({})".format(message)
+            raise exceptions.BotMessageError(err)
+
+# Shared encoder for as_string: compact separators, and no check for circular
+# references (a message is a flat dict of plain values).
+_encoder = json.JSONEncoder(check_circular=False,separators=(",",":"))
+
+# Message ids double as the owner of any hardware a command grabs, so they
+# must be unique across processes.  Each process counts up from its own pid
+# (shifted clear of the count), restarting whenever it forks.
+_ids = None
+
+def _reset_ids():
+
+    global _ids
+    _ids = itertools.count((os.getpid() << 30) + 1)
+
+_reset_ids()
+os.register_at_fork(after_in_child=_reset_ids)
+
 class RobotMessage:
     """
     Class for handling timestamped messages and converting between the string
     messages that need to be sent over the web socket.
     """
 
+    __slots__ = ("arrival_time","destination","destination_device","source",
+                 "source_device","delay_time","message_id","message",
+                 "minimum_time","priority","ttl","ack","trace_id")
+
     def __init__(self,destination="controller",
                       destination_device="",
                       source="robot",
                       source_device="",
                       delay_time=0.0,
-                      message=""):
+                      message="",
+                      priority=None,
+                      ttl=None,
+                      ack=None,
+                      trace_id=None):
+        """
+        priority is one of PRIORITIES.  If not specified, commands to the
+        robot are PRIORITY_CONTROL and everything else is PRIORITY_TELEMETRY.
+
+        ttl is how long (in ms) after it comes due the message is still worth
+        acting on.  None means it never goes stale (though the device it is
+        sent to may set a limit of its own).
+
+        ack is one of ACK_MODES, and says what the device should send back
+        once it has the command.  None means the device's own ack_mode.
+
+        trace_id, if set, ties the spans recorded for the message as it moves
+        through the robot together (see tracing).
+        """
 
-        # arrival time (in ms)
-        self.arrival_time = int(time.time()*1000)
+        # arrival time (in ms, see now_ms)
+        self.arrival_time = now_ms()
 
         self.destination = destination
         self.destination_device = destination_device
         self.source = source
         self.source_device = source_device
         self.delay_time = delay_time
-        self.message_id = int(random.random()*1e9)
+        self.message_id = next(_ids)
         self.message = message
 
         self.minimum_time = self.arrival_time + self.delay_time
+        self.ttl = ttl
+        self.ack = ack
+        self.trace_id = trace_id
 
-        self.pretty_print()
+        self.priority = priority
+        if self.priority == None:
+            self.priority = self._default_priority()
 
-    def from_string(self,message_string):
+    def from_string(self,message_string,keep_times=False):
         """
-        Parse a message string and use it to populate the message.
+        Parse a message string and use it to populate the message.  Unless
+        keep_times is True, the arrival time is reset to now (which is what we
+        want for messages coming from a client with its own clock).
         """
         
         try:
             message_dict = json.loads(message_string)
-            for k in message_dict.keys():
-                self.__dict__[k] = message_dict[k]
-        except (ValueError,KeyError):
+        except (ValueError,TypeError,RecursionError):
             err = "Mangled message string ({})".format(message_string)
             raise exceptions.BotMessageError(err)
 
+        self.from_dict(message_dict,keep_times)
+
+    def from_dict(self,message_dict,keep_times=False):
+        """
+        Populate the message from a dictionary of wire fields (see
+        WIRE_FIELDS), as produced by as_dict or a decoded string.  Raises
+        BotMessageError on unknown fields or values of the wrong type, so a
+        client can't set anything it shouldn't.  keep_times is only set for
+        messages passed between the robot's own processes; for anything else
+        (a client) the SERVER_FIELDS are ignored.
+        """
+
+        _check_wire_dict(message_dict)
+
+        get = message_dict.get
+        self.destination = get("destination",self.destination)
+        self.destination_device = get("destination_device",
+                                      self.destination_device)
+        self.source = get("source",self.source)
+        self.message = get("message",self.message)
+        self.ttl = get("ttl",self.ttl)
+        self.ack = get("ack",self.ack)
+        self.trace_id = get("trace_id",self.trace_id)
+
+        # The javascript client calls delay_time "delay"
+        self.delay_time = get("delay_time",get("delay",self.delay_time))
+
+        if keep_times:
+            self.source_device = get("source_device",self.source_device)
+            self.message_id = get("message_id",self.message_id)
+            self.priority = get("priority")
+            if self.priority not in PRIORITIES:
+                self.priority = self._default_priority()
+
+            self.arrival_time = get("arrival_time",self.arrival_time)
+            self.minimum_time = get("minimum_time",self.minimum_time)
+            return
+
+        self.priority = self._default_priority()
+
         # Wipe out arrival time from message itself
-        self.arrival_time = int(time.time()*1000)
+        self.arrival_time = now_ms()
         self.minimum_time = self.arrival_time + self.delay_time
+
+    def as_dict(self):
+        """
+        Return the message as a dictionary of wire fields.  Uses the same
+        field names as the javascript RobotMessage (delay rather than
+        delay_time).
+        """
+
+        d = {"destination":self.destination,
+             "destination_device":self.destination_device,
+             "source":self.source,
+             "source_device":self.source_device,
+             "delay":self.delay_time,
+             "message_id":self.message_id,
+             "message":self.message,
+             "priority":self.priority,
+             "arrival_time":self.arrival_time,
+             "minimum_time":self.minimum_time}
+        if self.ttl != None:
+            d["ttl"] = self.ttl
+        if self.ack != None:
+            d["ack"] = self.ack
+        if self.trace_id != None:
+            d["trace_id"] = self.trace_id
+
+        return d
         
     def as_string(self):
         """
         Convert a message instance to a string.
         """
 
-        return json.dumps(self.__dict__)
+        return _encoder.encode(self.as_dict())
 
     @property
     def pretty(self):
@@ -84,12 +284,58 @@ class RobotMessage:
 
         print(self.pretty)
 
+    @property
+    def command(self):
+        """
+        The command key of the message (the message itself, or its first
+        element if kwargs were given).
+        """
+
+        if type(self.message) == list and len(self.message) > 0:
+            return self.message[0]
+
+        return self.message
+
+    def _default_priority(self):
+        """
+        Priority for a message that did not specify one.
+        """
+
+        if self.command == EMERGENCY_STOP:
+            return PRIORITY_EMERGENCY
+
+        if self.destination == "robot":
+            return PRIORITY_CONTROL
+
+        return PRIORITY_TELEMETRY
+
+    def age(self,now=None):
+        """
+        How long (in ms) the message has been due.  Negative if it is still
+        delayed.
+        """
+
+        if now == None:
+            now = now_ms()
+
+        return now - self.minimum_time
+
+    def expired(self,now=None):
+        """
+        Whether the message has outlived its own ttl.
+        """
+
+        if self.ttl == None:
+            return False
+
+        return self.age(now) > self.ttl
+
     def check_delay(self):
         """
         See if a message is ready to send given its time stamp.
         """
 
-        if int(1000*time.time()) > self.minimum_time:
+        if now_ms() > self.minimum_time:
             return True
 
         return False
@@ -0,0 +1,380 @@
+__description__ = \
+"""
+Bounded FIFO used for the per-device message queues.  When the queue is full,
+what happens to a new message depends on the overflow policy:
+
+    block: refuse the message.  put() returns False and the caller has to hold
+           on to it (and stop taking in more) until there is room.
+    drop_oldest: throw away the oldest queued message to make room.
+    drop_newest: throw away the new message.
+    latest_wins: the new message replaces the newest queued one, so the queue
+                 always ends with the most recent message.  With a size of one
+                 this is a mailbox that only holds the latest command.
+
+Items can also be put with a coalescing key.  A queued item with the same key
+is replaced in place by the new one rather than both being kept, so a device
+works through the newest version of a command (e.g. the latest setspeed)
+instead of replaying every stale one.
+
+Every queue counts what it has done, so an overloaded robot shows where it is
+shedding messages rather than quietly growing until it runs out of memory.
+
+A device's outbox with a block or drop_newest limit is a RingBuffer instead: a
+fixed capacity ring the manager drains without taking a lock (see
+make_outbox).
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import collections, threading
+
+from rpyBot import exceptions
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+LATEST_WINS = "latest_wins"
+
+POLICIES = (BLOCK,DROP_OLDEST,DROP_NEWEST,LATEST_WINS)
+
+# Capacity of a RingBuffer when none is given.
+DEFAULT_RING_SIZE = 1024
+
+def parse_limit(limit,name=""):
+    """
+    Turn a queue limit from a configuration (None, a size, or a (size,policy)
+    tuple) into a (size,policy) tuple.  A size of None means unbounded.
+    """
+
+    if limit == None:
+        return (None,DROP_OLDEST)
+
+    if type(limit) == int:
+        return (limit,DROP_OLDEST)
+
+    try:
+        size, policy = limit
+    except (TypeError,ValueError):
+        err = "queue limit for {} must be a size or (size,policy)".format(name)
+        raise exceptions.BotConfigurationError(err)
+
+    if policy not in POLICIES:
+        err = "queue policy for {} must be one of {}, not {}".format(name,
+                                                                    POLICIES,
+                                                                    policy)
+        raise exceptions.BotConfigurationError(err)
+
+    if size != None and size < 1:
+        err = "queue size for {} must be at least 1".format(name)
+        raise exceptions.BotConfigurationError(err)
+
+    return (size,policy)
+
+def make_outbox(limit,name=""):
+    """
+    Build the queue for a device's outbox from a limit (see parse_limit).
+    Sized limits that only ever refuse new messages (block or drop_newest)
+    get a lock-free RingBuffer.  Everything else gets a BoundedQueue (used
+    under the device's lock): drop_oldest and latest_wins have to take back a
+    message the manager may be collecting, and an unbounded outbox (no limit,
+    the default) must never lose a message to a full ring.
+    """
+
+    size, policy = parse_limit(limit,name)
+    if size != None and policy in (BLOCK,DROP_NEWEST):
+        return RingBuffer(size,policy)
+
+    return BoundedQueue(size,policy)
+
+
+class BoundedQueue:
+    """
+    FIFO with an optional maximum size and an overflow policy.  Not thread-safe
+    on its own; callers that share a queue between threads hold a lock.
+    """
+
+    # Callers must hold a lock of their own around every call.
+    lock_free = False
+
+    def __init__(self,size=None,policy=DROP_OLDEST):
+        """
+        Initialize.
+            size: maximum number of queued items (None for unbounded)
+            policy: what to do when full (one of POLICIES)
+        """
+
+        self.size, self.policy = parse_limit((size,policy))
+
+        # Entries are [key,item] lists so a coalesced item can be swapped in
+        # without moving it.  _keyed maps each key to its queued entry.
+        self._items = collections.deque()
+        self._keyed = {}
+
+        self.counters = {"queued":0,
+                         "max_depth":0,
+                         "blocked":0,
+                         "dropped_oldest":0,
+                         "dropped_newest":0,
+                         "replaced":0,
+                         "coalesced":0}
+
+    def __len__(self):
+
+        return len(self._items)
+
+    def __bool__(self):
+
+        return len(self._items) > 0
+
+    def full(self):
+        """
+        Whether the next put() will hit the overflow policy.
+        """
+
+        return self.size != None and len(self._items) >= self.size
+
+    def put(self,item,key=None):
+        """
+        Add an item to the queue, applying the overflow policy if the queue is
+        full.  If key is not None and an item with the same key is queued, the
+        new item takes its place instead.  Returns False if the item was
+        refused (block policy only).  Items dropped by the other policies
+        still count as accepted.
+        """
+
+        items = self._items
+
+        if key != None:
+            entry = self._keyed.get(key)
+            if entry != None:
+                entry[1] = item
+                self.counters["coalesced"] += 1
+                return True
+
+        if self.size != None and len(items) >= self.size:
+
+            if self.policy == BLOCK:
+                self.counters["blocked"] += 1
+                return False
+
+            elif self.policy == DROP_OLDEST:
+                self._forget(items.popleft())
+                self.counters["dropped_oldest"] += 1
+
+            elif self.policy == DROP_NEWEST:
+                self.counters["dropped_newest"] += 1
+                return True
+
+            else:
+                self._forget(items.pop())
+                self.counters["replaced"] += 1
+
+        entry = [key,item]
+        items.append(entry)
+        if key != None:
+            self._keyed[key] = entry
+        self.counters["queued"] += 1
+        if len(items) > self.counters["max_depth"]:
+            self.counters["max_depth"] = len(items)
+
+        return True
+
+    def popleft(self):
+        """
+        Remove and return the oldest item.
+        """
+
+        entry = self._items.popleft()
+        self._forget(entry)
+
+        return entry[1]
+
+    def drain(self):
+        """
+        Remove and return every item, oldest first.
+        """
+
+        return self.drain_into([])
+
+    def drain_into(self,out):
+        """
+        Move every item into the list out, oldest first.  Returns out.
+        """
+
+        out.extend([entry[1] for entry in self._items])
+        self.clear()
+
+        return out
+
+    def clear(self):
+        """
+        Throw away every item (not counted as drops).
+        """
+
+        self._items.clear()
+        self._keyed.clear()
+
+    def _forget(self,entry):
+        """
+        Stop tracking the key of an entry that has left the queue.
+        """
+
+        if entry[0] != None:
+            self._keyed.pop(entry[0],None)
+
+    @property
+    def dropped(self):
+        """
+        Total number of messages lost to the overflow policy.
+        """
+
+        return self.counters["dropped_oldest"] + \
+               self.counters["dropped_newest"] + \
+               self.counters["replaced"]
+
+
+class RingBuffer:
+    """
+    Fixed capacity FIFO for a device's outbound messages.  Its single consumer
+    (whoever collects the device's messages) never takes a lock: it reads the
+    tail and moves the head up, while producers only ever write past the tail.
+    Producers do take a lock, but only among themselves, since a device can
+    queue messages from several threads (its start() loop, a timer, a tornado
+    thread).  Under the GIL each of these steps is atomic.
+
+    When the ring is full a new item is refused (counted as an overflow): for
+    the block policy put() returns False, for anything else the item is
+    dropped.  Evicting a queued item would mean touching the consumer's side
+    of the ring, so the other policies need a BoundedQueue.
+    """
+
+    lock_free = True
+
+    def __init__(self,size=DEFAULT_RING_SIZE,policy=DROP_NEWEST):
+        """
+        Initialize.
+            size: number of slots in the ring
+            policy: BLOCK or DROP_NEWEST
+        """
+
+        self.size, self.policy = parse_limit((size,policy))
+        if self.size == None or self.policy not in (BLOCK,DROP_NEWEST):
+            err = "a ring buffer needs a size and a block or drop_newest policy"
+            raise exceptions.BotConfigurationError(err)
+
+        self._slots = [None]*self.size
+
+        # Total number of items ever put (written by producers only) and ever
+        # taken (written by the consumer only).  Slot i holds item i % size.
+        self._tail = 0
+        self._head = 0
+
+        self._producer_lock = threading.Lock()
+
+        # Same counters as a BoundedQueue (plus overflow, every item refused
+        # because the ring was full).  Only producers write them.
+        self.counters = {"queued":0,
+                         "max_depth":0,
+                         "blocked":0,
+                         "dropped_oldest":0,
+                         "dropped_newest":0,
+                         "replaced":0,
+                         "coalesced":0,
+                         "overflow":0}
+
+    def __len__(self):
+
+        return self._tail - self._head
+
+    def __bool__(self):
+
+        return self._tail != self._head
+
+    def full(self):
+        """
+        Whether the next put() will be refused.
+        """
+
+        return self._tail - self._head >= self.size
+
+    def put(self,item,key=None,wake=None):
+        """
+        Add an item to the ring (producer side).  Returns False if the item was
+        refused (block policy only).  If wake is given, it is called when the
+        consumer has taken everything ahead of the item, so the consumer only
+        needs waking once per drain.  key is accepted for compatibility with
+        BoundedQueue but nothing is coalesced.
+
+        The item is published (the tail moved past it) before the head is
+        read.  The consumer moves the head up before it looks at the tail
+        again (see RobotDevice._get_all_messages), so if we read a head that
+        is out of date and don't wake it, it is bound to see the item.
+        """
+
+        counters = self.counters
+        with self._producer_lock:
+
+            tail = self._tail
+            depth = tail - self._head
+            if depth >= self.size:
+                counters["overflow"] += 1
+                if self.policy == BLOCK:
+                    counters["blocked"] += 1
+                    return False
+                counters["dropped_newest"] += 1
+                return True
+
+            self._slots[tail % self.size] = item
+            self._tail = tail + 1
+
+            counters["queued"] += 1
+            if depth >= counters["max_depth"]:
+                counters["max_depth"] = depth + 1
+
+            if wake != None and self._head == tail:
+                wake()
+
+        return True
+
+    def drain_into(self,out):
+        """
+        Move every item into the list out, oldest first (consumer side).
+        Returns out.
+        """
+
+        slots = self._slots
+        size = self.size
+        head = self._head
+        tail = self._tail
+
+        while head < tail:
+            i = head % size
+            out.append(slots[i])
+            slots[i] = None
+            head += 1
+
+        self._head = head
+
+        return out
+
+    def drain(self):
+        """
+        Remove and return every item, oldest first.
+        """
+
+        return self.drain_into([])
+
+    def clear(self):
+        """
+        Throw away every item (not counted as drops).
+        """
+
+        self.drain_into([])
+
+    @property
+    def dropped(self):
+        """
+        Total number of messages lost to overflow.
+        """
+
+        return self.counters["dropped_newest"]
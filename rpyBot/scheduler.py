@@ -0,0 +1,188 @@
+__description__ = \
+"""
+Scheduler for holding the RobotMessages that the DeviceManager has yet to route.
+Messages that are ready to send sit in one FIFO lane per priority and are
+handed out in strict priority order.  Messages that are delayed sit in a
+min-heap keyed on their minimum_time, so they are only touched when their
+deadline arrives rather than being rotated through the whole queue.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import collections, heapq, itertools
+
+from rpyBot.messages import PRIORITIES, PRIORITY_TELEMETRY, now_ms
+
+def _priority(message):
+    """
+    The lane a message goes in (telemetry for anything without a valid
+    priority, such as a raw string).
+    """
+
+    priority = getattr(message,"priority",PRIORITY_TELEMETRY)
+    if priority not in PRIORITIES:
+        return PRIORITY_TELEMETRY
+
+    return priority
+
+class MessageScheduler:
+    """
+    Holds RobotMessage instances until they are ready to be routed.  All times
+    are in ms on the messages.now_ms clock, just like RobotMessage.minimum_time.
+    """
+
+    def __init__(self):
+        """
+        Initialize.
+        """
+
+        self._lanes = [collections.deque() for p in PRIORITIES]
+        self._num_ready = 0
+        self._delayed = []
+
+        # Tie-breaker so messages with identical deadlines come out in the
+        # order they went in (and so the heap never compares messages).
+        self._counter = itertools.count()
+
+    def __len__(self):
+
+        return self._num_ready + len(self._delayed)
+
+    @property
+    def num_ready(self):
+        """
+        Number of messages that can be routed right now (not counting delayed
+        messages whose deadline has passed but have not yet been promoted).
+        """
+
+        return self._num_ready
+
+    @property
+    def num_delayed(self):
+        """
+        Number of messages waiting on a deadline.
+        """
+
+        return len(self._delayed)
+
+    def lane_depths(self):
+        """
+        Number of ready messages in each priority lane, highest priority first.
+        """
+
+        return [len(lane) for lane in self._lanes]
+
+    def drop_lane(self,priority):
+        """
+        Throw away every message of a priority: those ready in its lane and
+        those still waiting on a deadline.  Returns the number of messages
+        dropped.
+        """
+
+        lane = self._lanes[priority]
+        dropped = len(lane)
+        lane.clear()
+        self._num_ready -= dropped
+
+        kept = [entry for entry in self._delayed
+                if _priority(entry[2]) != priority]
+        if len(kept) != len(self._delayed):
+            dropped += len(self._delayed) - len(kept)
+            heapq.heapify(kept)
+            self._delayed = kept
+
+        return dropped
+
+    def push(self,message,now=None):
+        """
+        Add a message to the scheduler.  Anything that is not a RobotMessage
+        (e.g. a raw string) has no deadline, so it goes straight into a ready
+        lane.
+        """
+
+        minimum_time = getattr(message,"minimum_time",None)
+        if minimum_time == None:
+            self._push_ready(message)
+            return
+
+        if now == None:
+            now = now_ms()
+
+        if now >= minimum_time:
+            self._push_ready(message)
+        else:
+            heapq.heappush(self._delayed,
+                           (minimum_time,next(self._counter),message))
+
+    def pop(self,now=None):
+        """
+        Return the next message that is ready to be routed, highest priority
+        first, or None if nothing is ready.
+        """
+
+        if self._delayed:
+            self.promote(now)
+
+        if self._num_ready:
+            for lane in self._lanes:
+                if lane:
+                    self._num_ready -= 1
+                    return lane.popleft()
+
+        return None
+
+    def next_deadline(self):
+        """
+        Return the minimum_time (ms) of the next delayed message, or None if no
+        messages are delayed.
+        """
+
+        if self._delayed:
+            return self._delayed[0][0]
+
+        return None
+
+    def time_to_next(self,now=None):
+        """
+        Return how long (in seconds) until the scheduler will have something to
+        route.  Returns 0 if something is already ready and None if the
+        scheduler is empty.
+        """
+
+        if self._num_ready:
+            return 0.0
+
+        if not self._delayed:
+            return None
+
+        if now == None:
+            now = now_ms()
+
+        wait = (self._delayed[0][0] - now)/1000.0
+        if wait < 0:
+            return 0.0
+
+        return wait
+
+    def promote(self,now=None):
+        """
+        Move every delayed message whose deadline has passed into its ready
+        lane (in deadline order).  Returns the number of ready messages.
+        """
+
+        if now == None:
+            now = now_ms()
+
+        delayed = self._delayed
+        while delayed and now >= delayed[0][0]:
+            self._push_ready(heapq.heappop(delayed)[2])
+
+        return self._num_ready
+
+    def _push_ready(self,message):
+        """
+        Append a message to the lane for its priority.
+        """
+
+        self._lanes[_priority(message)].append(message)
+        self._num_ready += 1
@@ -0,0 +1,171 @@
+__description__ = \
+"""
+End-to-end tracing of commands.  When tracing is enabled, a command gets a
+trace id as it arrives from a client, and every stage it passes through on
+its way to the hardware records a span (trace id, stage, time) in a ring
+buffer:
+
+    ws.receive        websocket frame arrives (WebSocketHandler.on_message)
+    manager.enqueue   manager takes the message
+    manager.dispatch  manager hands it to the device
+    device.put        device starts running the command
+    gpio.* / arduino.send
+                      the command touches the hardware
+
+Code that touches hardware doesn't see the message, so RobotDevice.put makes
+the trace id current (per thread) while the command runs, and mark() records
+against it.  Times are on the shared monotonic clock (messages.now_ms), so
+spans recorded in device processes line up with the manager's.  Each process
+has its own buffer; DeviceManager.trace_spans collects them all.
+
+Tracing is off until enable() is called, and then costs one check of
+tracing.enabled at each stage for untraced messages.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import collections, threading, itertools, json, os
+
+from rpyBot.messages import now_ms
+
+DEFAULT_BUFFER_SIZE = 4096
+
+enabled = False
+
+_spans = collections.deque(maxlen=DEFAULT_BUFFER_SIZE)
+_local = threading.local()
+
+# Like message ids, trace ids count up from the pid so they are unique across
+# processes.  A forked process starts with an empty buffer (the parent's spans
+# stay with the parent).
+_ids = None
+
+def _reset():
+
+    global _ids
+    _ids = itertools.count((os.getpid() << 30) + 1)
+    _spans.clear()
+
+_reset()
+os.register_at_fork(after_in_child=_reset)
+
+def enable(buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Turn tracing on, keeping the last buffer_size spans.  Call before devices
+    are started in their own processes so they inherit it.
+    """
+
+    global enabled, _spans
+
+    if buffer_size != _spans.maxlen:
+        _spans = collections.deque(_spans,maxlen=buffer_size)
+    enabled = True
+
+def disable():
+    """
+    Turn tracing off (recorded spans are kept).
+    """
+
+    global enabled
+    enabled = False
+
+def new_trace_id():
+    """
+    Return a fresh trace id.
+    """
+
+    return next(_ids)
+
+def record(trace_id,stage,detail=None,time_ms=None):
+    """
+    Record a span for trace_id.  time_ms defaults to now.
+    """
+
+    if time_ms == None:
+        time_ms = now_ms()
+
+    _spans.append((trace_id,stage,time_ms,os.getpid(),detail))
+
+def current():
+    """
+    Trace id of the command running on this thread (None if untraced).
+    """
+
+    return getattr(_local,"trace_id",None)
+
+def set_current(trace_id):
+    """
+    Make trace_id the current trace on this thread, returning the previous
+    one (so it can be restored).
+    """
+
+    previous = getattr(_local,"trace_id",None)
+    _local.trace_id = trace_id
+
+    return previous
+
+def mark(stage,detail=None):
+    """
+    Record a span against the current trace, if there is one.  Guard calls
+    with "if tracing.enabled" in hot paths.
+    """
+
+    trace_id = getattr(_local,"trace_id",None)
+    if trace_id != None:
+        _spans.append((trace_id,stage,now_ms(),os.getpid(),detail))
+
+def spans(trace_id=None):
+    """
+    Return the buffered spans (all, or only those of trace_id) as a list of
+    (trace_id,stage,time_ms,pid,detail) tuples, oldest first.
+    """
+
+    if trace_id == None:
+        return list(_spans)
+
+    return [s for s in list(_spans) if s[0] == trace_id]
+
+def clear():
+    """
+    Throw away every buffered span.
+    """
+
+    _spans.clear()
+
+def to_dict(span_list):
+    """
+    Group spans by trace.  Each trace is a list of its spans in time order,
+    with the time since the first span and since the previous one (in ms).
+    """
+
+    traces = {}
+    for s in sorted(span_list,key=lambda s: s[2]):
+        traces.setdefault(s[0],[]).append(s)
+
+    out = {}
+    for trace_id, trace in traces.items():
+        start = trace[0][2]
+        previous = start
+        entries = []
+        for t, stage, time_ms, pid, detail in trace:
+            entries.append({"stage":stage,
+                            "time_ms":time_ms,
+                            "elapsed_ms":time_ms - start,
+                            "delta_ms":time_ms - previous,
+                            "pid":pid,
+                            "detail":detail})
+            previous = time_ms
+        out[str(trace_id)] = entries
+
+    return out
+
+def export_json(span_list=None,indent=None):
+    """
+    Export spans (default: this process's buffer) as a json string of
+    {trace_id:[span,...]} (see to_dict).
+    """
+
+    if span_list == None:
+        span_list = spans()
+
+    return json.dumps(to_dict(span_list),indent=indent)
@@ -0,0 +1,883 @@
+__description__ = \
+"""
+Transport between the DeviceManager and the devices it controls.  The manager
+never touches a device directly; instead it holds a handle that looks like a
+RobotDevice (put, get, fileno, stop).  What sits behind the handle is set by
+the device's execution mode:
+
+    inline: commands run on the manager thread (DeviceHandle)
+    thread: commands run on a thread pool shared by devices (DeviceThread)
+    process: the device runs in its own process (DeviceProcess)
+
+A DeviceProcess forwards everything over a duplex pipe.  On the far side of the
+pipe a small dispatch loop owns the real device: it hands incoming messages to
+device.put and ships whatever device.get returns back to the manager.
+
+Each frame on the pipe is a one byte kind followed by a payload:
+
+    M: an encoded RobotMessage (json or binary, see rpyBot.codec)
+    C: a control command for the dispatch loop (json list: [command, arg])
+
+Control commands are codec (answered with codec), ping (answered with pong),
+estop (answered with estopped), counters (answered with the device's outbox,
+dispatch and periodic task counters), trace (answered with the spans recorded
+in the device process, see rpyBot.tracing) and stop.  Right after starting the
+process the handle sends codec with the codecs it speaks, most preferred
+first; the dispatch loop answers with its pick (and the names to intern) and
+both sides switch to it.  Until then messages go as json.  Either side
+decodes whatever arrives, so the switch needs no coordination.  The dispatch
+loop also sends took (with the number of messages it has handed to the
+device) so the manager side knows how many are still in the pipe.  The handle
+keeps at most a window of messages in the pipe (the inbox size, or
+DEFAULT_WINDOW if the inbox is unbounded, and no more than WINDOW_BYTES), so
+the pipe never fills up with commands while the dispatch loop is blocked
+sending the device's output the other way.
+
+Inbox bounds (see rpyBot.queues) are enforced on the manager side of the
+handle, which also coalesces waiting commands using device.coalesce_key.
+Messages already in the pipe are coalesced by the dispatch loop as it reads
+them.  put() returns False if the device can't take the message yet (block
+policy); the manager holds on to it and tries again.  Inline devices run each
+command before put() returns, so never have a backlog to bound.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import multiprocessing, threading, selectors, itertools, collections, json, time, os
+
+from rpyBot import exceptions, queues, codec, tracing
+from rpyBot.messages import RobotMessage
+
+EXECUTION_MODES = ("inline","thread","process")
+
+MESSAGE_FRAME = b"M"
+CONTROL_FRAME = b"C"
+
+# Most messages in the pipe to a device process at once, if its inbox is
+# unbounded, and most bytes of them (a message is let through whatever its
+# size if the pipe holds none).  Well inside the pipe's buffer, so sending a
+# command never blocks.
+DEFAULT_WINDOW = 64
+WINDOW_BYTES = 65536
+
+def encode_message(message,wire_codec=None):
+    """
+    Encode a RobotMessage as a frame (as json if wire_codec is None).
+    """
+
+    if wire_codec == None:
+        return MESSAGE_FRAME + message.as_string().encode()
+
+    return MESSAGE_FRAME + wire_codec.encode(message)
+
+def decode_message(payload,wire_codec=None):
+    """
+    Decode the payload of a message frame back into a RobotMessage, keeping
+    the time stamps set on the other side of the pipe.  wire_codec is the
+    binary codec to use if the payload is binary.
+    """
+
+    return codec.decode(payload,wire_codec,keep_times=True)
+
+def codec_names(device):
+    """
+    Names to intern in the binary codec for a device's pipe, on top of the
+    codec's common names.
+    """
+
+    return [device.name] + sorted(device._control_dict.keys())
+
+def encode_control(command,arg=None):
+    """
+    Encode a control command as a frame.
+    """
+
+    return CONTROL_FRAME + json.dumps([command,arg]).encode()
+
+
+def _device_main(device,conn):
+    """
+    Dispatch loop run in the device process.  Waits on the pipe from the
+    manager and on the device's own wakeup handle, passing messages in both
+    directions until told to stop.  Reports how many messages were taken off
+    the pipe after each batch.
+    """
+
+    # start() may never return (e.g. a tornado server), so give it its own
+    # thread.
+    starter = threading.Thread(target=device.start,daemon=True)
+    starter.start()
+
+    selector = selectors.DefaultSelector()
+    selector.register(conn.fileno(),selectors.EVENT_READ,"manager")
+    selector.register(device.fileno(),selectors.EVENT_READ,"device")
+
+    # Messages the dispatch loop replaced with newer ones.
+    coalesced = 0
+
+    # Messages go as json until the handle asks for something else.
+    wire_codec = None
+
+    running = True
+    while running:
+
+        for key, events in selector.select():
+
+            if key.data == "device":
+                for m in device.get():
+                    conn.send_bytes(encode_message(m,wire_codec))
+                continue
+
+            # Read everything the manager has sent so an emergency stop can
+            # jump ahead of commands queued in front of it.
+            frames = []
+            while conn.poll():
+                try:
+                    frames.append(conn.recv_bytes())
+                except EOFError:
+                    running = False
+                    break
+
+            # Commands queued ahead of the emergency stop are dropped (other
+            # control frames are kept).
+            taken = 0
+            for i in range(len(frames)-1,-1,-1):
+                if frames[i][:1] == CONTROL_FRAME:
+                    command, arg = json.loads(frames[i][1:].decode())
+                    if command == "estop":
+                        _emergency_stop(device,conn,arg)
+                        kept = [f for f in frames[:i] if f[:1] == CONTROL_FRAME]
+                        taken += i - len(kept)
+                        frames = kept + frames[i+1:]
+                        break
+
+            frames, merged = _coalesce_frames(device,frames,wire_codec)
+            coalesced += merged
+            taken += merged
+
+            for frame in frames:
+
+                if type(frame) == RobotMessage:
+                    device.put(frame)
+                    taken += 1
+                    continue
+
+                command, arg = json.loads(frame[1:].decode())
+                if command == "ping":
+                    conn.send_bytes(encode_control("pong",arg))
+                elif command == "codec":
+                    name = codec.negotiate(arg)
+                    names = codec_names(device)
+                    conn.send_bytes(encode_control("codec",[name,names]))
+                    wire_codec = codec.make_codec(name,names)
+                elif command == "counters":
+                    conn.send_bytes(encode_control("counters",
+                                                   [arg,device.queue_counters(),
+                                                    coalesced,
+                                                    device.dispatch_counters(),
+                                                    device.periodic_counters()]))
+                elif command == "trace":
+                    conn.send_bytes(encode_control("trace",
+                                                   [arg,tracing.spans()]))
+                elif command == "estop":
+                    _emergency_stop(device,conn,arg)
+                elif command == "stop":
+                    device.stop(arg)
+                    running = False
+                    break
+
+            if taken:
+                conn.send_bytes(encode_control("took",taken))
+
+    # Ship anything the device said on its way down.
+    for m in device.get():
+        conn.send_bytes(encode_message(m,wire_codec))
+
+    conn.close()
+
+
+def _coalesce_frames(device,frames,wire_codec=None):
+    """
+    Decode the message frames in a batch read off the pipe, replacing any
+    message superseded by a later one in the same batch (the newer one takes
+    the older one's place).  Message frames come back as RobotMessages,
+    control frames as they were.  Returns the new list of frames and the number of messages that
+    were replaced.
+    """
+
+    out = []
+    slots = {}
+    merged = 0
+    for frame in frames:
+
+        if frame[:1] != MESSAGE_FRAME:
+            out.append(frame)
+            continue
+
+        message = decode_message(frame[1:],wire_codec)
+        key = device.coalesce_key(message)
+        if key != None and key in slots:
+            out[slots[key]] = message
+            merged += 1
+            continue
+
+        if key != None:
+            slots[key] = len(out)
+        out.append(message)
+
+    return out, merged
+
+
+def _emergency_stop(device,conn,arg):
+    """
+    Run device.emergency_stop in the device process and report back.  arg is
+    [sequence number, owner].
+    """
+
+    seq, owner = arg
+    try:
+        with device.command_lock:
+            device.emergency_stop(owner)
+        ok = True
+    except Exception:
+        ok = False
+
+    conn.send_bytes(encode_control("estopped",[seq,ok]))
+
+
+def make_handle(device,mode,thread_pool=None,inbox_limit=None,
+                codecs=codec.CODECS):
+    """
+    Build the handle for a device given its execution mode.  inbox_limit is a
+    (size,policy) tuple bounding the commands waiting for the device.  codecs
+    are the wire codecs to offer a device process, most preferred first.
+    """
+
+    if mode == "inline":
+        return DeviceHandle(device,inbox_limit)
+    elif mode == "thread":
+        return DeviceThread(device,thread_pool,inbox_limit)
+    elif mode == "process":
+        return DeviceProcess(device,inbox_limit,codecs)
+
+    err = "execution mode for {} must be one of {}, not {}".format(device.name,
+                                                                  EXECUTION_MODES,
+                                                                  mode)
+    raise exceptions.BotConfigurationError(err)
+
+
+class DeviceHandle:
+    """
+    Manager-side handle for a device.  This base class runs the device inline:
+    put() calls device.put() right on the manager thread.  Subclasses move
+    the device elsewhere but keep the same interface.
+    """
+
+    mode = "inline"
+
+    # Set once the device can no longer be reached (its process has died).
+    # The manager unloads dead devices.
+    dead = False
+
+    def __init__(self,device,inbox_limit=None):
+
+        self.device = device
+        self.name = device.name
+
+        # Commands waiting for the device.  Inline devices never have any.
+        self.inbox = queues.BoundedQueue(*queues.parse_limit(inbox_limit,
+                                                             self.name))
+
+    @property
+    def pid(self):
+        """
+        Process the device runs in.
+        """
+
+        return os.getpid()
+
+    def start(self):
+        """
+        Start the device.  start() may never return (e.g. a tornado server), so
+        it gets a thread of its own.
+        """
+
+        threading.Thread(target=self.device.start,daemon=True).start()
+
+    def stop(self,owner=None):
+
+        self.device.stop(owner)
+
+    def connect(self,manager):
+
+        self.device.connect(manager)
+
+    def disconnect(self):
+
+        self.device.disconnect()
+
+    def fileno(self):
+        """
+        Selectable handle that is readable when the device has output.
+        """
+
+        return self.device.fileno()
+
+    def put(self,message):
+        """
+        Hand a message to the device.  Returns False if the device can't take
+        it yet.
+        """
+
+        self.device.put(message)
+
+        return True
+
+    def get(self):
+
+        return self.device.get()
+
+    def queue_counters(self,timeout=1.0):
+        """
+        Return the counters of the device's inbox and outbox queues, its
+        command dispatch and its periodic tasks.
+        """
+
+        return {"inbox":dict(self.inbox.counters),
+                "outbox":self.device.queue_counters(),
+                "dispatch":self.device.dispatch_counters(),
+                "periodic":self.device.periodic_counters()}
+
+    def trace_spans(self,timeout=1.0):
+        """
+        Return the trace spans recorded where the device runs.  Inline and
+        thread devices record into the manager's own buffer, so have none.
+        """
+
+        return []
+
+    def emergency_stop(self,owner=None):
+        """
+        Bring the device to a safe stop right now, skipping anything queued
+        for it.  Inline devices stop before this returns.  A command running
+        on another thread finishes its current step first.
+        """
+
+        start = time.perf_counter()
+        try:
+            with self.device.command_lock:
+                self.device.emergency_stop(owner)
+            self._estop_result = time.perf_counter() - start
+        except Exception:
+            self._estop_result = None
+
+    def wait_emergency_stop(self,timeout=1.0):
+        """
+        Wait for the device to confirm an emergency stop.  Returns how long the
+        stop took (in seconds), or None if it failed or timed out.
+        """
+
+        return self._estop_result
+
+    def ping(self,timeout=1.0):
+        """
+        Measure the time (in seconds) to hand work to wherever the device runs
+        and hear back.  For an inline device that is just a function call.
+        """
+
+        start = time.perf_counter()
+        _noop()
+
+        return time.perf_counter() - start
+
+    def benchmark(self,num_messages=1000,timeout=5.0):
+        """
+        Measure round trip latency and throughput of handing work to the
+        device.  Latency is measured with num_messages sequential pings;
+        throughput by firing num_messages pings back-to-back and waiting for
+        all of the replies.  Returns a dictionary of results.
+        """
+
+        rtts = []
+        for i in range(num_messages):
+            rtt = self.ping(timeout)
+            if rtt == None:
+                break
+            rtts.append(rtt)
+
+        start = time.perf_counter()
+        self._burst(num_messages,timeout)
+        elapsed = time.perf_counter() - start
+
+        rtts.sort()
+        results = {"device":self.name,
+                   "mode":self.mode,
+                   "num_messages":num_messages,
+                   "rtt_mean_ms":None,
+                   "rtt_median_ms":None,
+                   "rtt_max_ms":None,
+                   "msgs_per_sec":num_messages/elapsed}
+        if rtts:
+            results["rtt_mean_ms"] = 1000*sum(rtts)/len(rtts)
+            results["rtt_median_ms"] = 1000*rtts[len(rtts)//2]
+            results["rtt_max_ms"] = 1000*rtts[-1]
+
+        return results
+
+    def _burst(self,num_messages,timeout):
+        """
+        Fire num_messages pings back-to-back.
+        """
+
+        for i in range(num_messages):
+            self.ping(timeout)
+
+
+def _noop():
+
+    pass
+
+
+class DeviceThread(DeviceHandle):
+    """
+    Manager-side handle for a device whose commands run on a thread pool
+    shared with other devices.  Commands for a single device still run one at
+    a time, in order.
+    """
+
+    mode = "thread"
+
+    def __init__(self,device,thread_pool,inbox_limit=None):
+
+        DeviceHandle.__init__(self,device,inbox_limit)
+
+        self._pool = thread_pool
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def stop(self,owner=None,timeout=1.0):
+        """
+        Let any pending commands finish (waiting up to timeout seconds), then
+        stop the device.
+        """
+
+        self._idle.wait(timeout)
+        self.device.stop(owner)
+
+    def emergency_stop(self,owner=None):
+        """
+        Throw away pending commands and stop the device from the manager
+        thread, rather than waiting for a pool thread.
+        """
+
+        with self._lock:
+            self.inbox.clear()
+
+        DeviceHandle.emergency_stop(self,owner)
+
+    def put(self,message):
+        """
+        Queue a message for the device and make sure a pool thread is working
+        through the device's queue.  Returns False if the inbox is full and
+        blocks.
+        """
+
+        with self._lock:
+            if not self.inbox.put(message,self.device.coalesce_key(message)):
+                return False
+            if self._scheduled:
+                return True
+            self._scheduled = True
+            self._idle.clear()
+
+        self._pool.submit(self._drain)
+
+        return True
+
+    def ping(self,timeout=1.0):
+        """
+        Measure the round trip time (in seconds) of a no-op through the pool.
+        Returns None on timeout.
+        """
+
+        start = time.perf_counter()
+        try:
+            self._pool.submit(_noop).result(timeout)
+        except Exception:
+            return None
+
+        return time.perf_counter() - start
+
+    def _burst(self,num_messages,timeout):
+
+        futures = [self._pool.submit(_noop) for i in range(num_messages)]
+        for f in futures:
+            f.result(timeout)
+
+    def _drain(self):
+        """
+        Run on a pool thread: hand pending messages to the device until there
+        are none left.
+        """
+
+        while True:
+            with self._lock:
+                if not self.inbox:
+                    self._scheduled = False
+                    self._idle.set()
+                    return
+                message = self.inbox.popleft()
+
+            self.device.put(message)
+
+
+class DeviceProcess(DeviceHandle):
+    """
+    Manager-side handle for a RobotDevice that runs in its own process.
+    """
+
+    mode = "process"
+
+    def __init__(self,device,inbox_limit=None,codecs=codec.CODECS):
+        """
+        Initialize.  The device should already be connected to its manager,
+        as the child process gets a copy of it as it stands when start() is
+        called.  codecs are the wire codecs to offer it.
+        """
+
+        DeviceHandle.__init__(self,device,inbox_limit)
+
+        # json until the device process has agreed on a codec.
+        self.codecs = codecs
+        self.codec = None
+
+        # At most _window messages (and WINDOW_BYTES) are in the pipe at
+        # once; the rest wait in the inbox (subject to its policy) until the
+        # device reports it has taken some.  _in_flight holds the size of
+        # each message in the pipe, oldest first (the device takes them in
+        # order).
+        self._window = self.inbox.size
+        if self._window == None:
+            self._window = DEFAULT_WINDOW
+        self._in_flight = collections.deque()
+        self._in_flight_bytes = 0
+
+        self._conn, self._device_conn = multiprocessing.Pipe(duplex=True)
+        self._process = None
+
+        # Replies to ping and estop commands, keyed by sequence number, and
+        # any messages read off the pipe while waiting for them.
+        self._seq = itertools.count()
+        self._replies = {}
+        self._held = []
+        self._estop = None
+
+    def start(self):
+        """
+        Start the device process.
+        """
+
+        self._process = multiprocessing.Process(target=_device_main,
+                                                args=(self.device,
+                                                      self._device_conn),
+                                                daemon=True)
+        self._process.start()
+
+        # The child holds its own copy of this end.
+        self._device_conn.close()
+
+        self._send(encode_control("codec",list(self.codecs)))
+
+    @property
+    def pid(self):
+
+        if self._process == None:
+            return None
+
+        return self._process.pid
+
+    def stop(self,owner=None,timeout=1.0):
+        """
+        Ask the device to stop and wait for its process to exit, terminating
+        it if it does not do so within timeout seconds.
+        """
+
+        self._send(encode_control("stop",owner))
+
+        if self._process != None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+
+    def fileno(self):
+        """
+        Selectable handle that is readable when the device has sent something.
+        """
+
+        return self._conn.fileno()
+
+    def put(self,message):
+        """
+        Send a RobotMessage to the device, or queue it in the inbox if the
+        pipe already holds a window of messages.  Returns False if the inbox
+        is full and blocks.
+        """
+
+        if self.inbox or not self._has_room():
+            return self.inbox.put(message,self.device.coalesce_key(message))
+
+        self._send_message(message)
+
+        return True
+
+    def queue_counters(self,timeout=1.0):
+        """
+        Return the counters of the device's inbox and outbox queues, its
+        command dispatch and its periodic tasks.  All but the inbox counters
+        come from the device process (None on timeout).
+        """
+
+        seq = next(self._seq)
+        self._send(encode_control("counters",seq))
+
+        inbox = dict(self.inbox.counters)
+        outbox = None
+        dispatch_counters = None
+        periodic = None
+        if self._wait_for_reply(seq,timeout):
+            outbox, coalesced, dispatch_counters, periodic = \
+                self._replies.pop(seq)[1]
+            inbox["coalesced"] += coalesced
+
+        return {"inbox":inbox,
+                "outbox":outbox,
+                "dispatch":dispatch_counters,
+                "periodic":periodic}
+
+    def trace_spans(self,timeout=1.0):
+        """
+        Return the trace spans recorded in the device process (an empty list
+        on timeout).
+        """
+
+        seq = next(self._seq)
+        self._send(encode_control("trace",seq))
+
+        if not self._wait_for_reply(seq,timeout):
+            return []
+
+        return [tuple(s) for s in self._replies.pop(seq)[1]]
+
+    def _flush_inbox(self):
+        """
+        Send waiting messages while there is room in the pipe.
+        """
+
+        while self.inbox and self._has_room():
+            self._send_message(self.inbox.popleft())
+
+    def _has_room(self):
+        """
+        Whether another message may go into the pipe.
+        """
+
+        return len(self._in_flight) < self._window and \
+               self._in_flight_bytes < WINDOW_BYTES
+
+    def _send_message(self,message):
+        """
+        Send a message down the pipe, counting it as in flight.
+        """
+
+        frame = encode_message(message,self.codec)
+        if self._send(frame):
+            self._in_flight.append(len(frame))
+            self._in_flight_bytes += len(frame)
+
+    def emergency_stop(self,owner=None):
+        """
+        Send an emergency stop down the pipe.  The device's dispatch loop runs
+        it ahead of any commands still waiting in the pipe (and drops those).
+        Use wait_emergency_stop to find out when it has happened.
+        """
+
+        self.inbox.clear()
+
+        seq = next(self._seq)
+        self._estop = (seq,time.perf_counter())
+        if not self._send(encode_control("estop",[seq,owner])):
+            self._estop = None
+
+    def wait_emergency_stop(self,timeout=1.0):
+        """
+        Wait for the device to confirm an emergency stop.  Returns how long the
+        stop took (in seconds), or None if it failed or timed out.
+        """
+
+        if self._estop == None:
+            return None
+
+        seq, start = self._estop
+        self._estop = None
+        if not self._wait_for_reply(seq,timeout):
+            return None
+
+        done, ok = self._replies.pop(seq)
+        if not ok:
+            return None
+
+        return done - start
+
+    def get(self):
+        """
+        Return every message the device has sent since the last call.
+        """
+
+        messages = []
+        while self._poll():
+            messages.extend(self._recv())
+
+        return messages
+
+    def ping(self,timeout=1.0):
+        """
+        Measure the round trip time (in seconds) of a control frame through the
+        device's dispatch loop.  Returns None on timeout.
+        """
+
+        seq = next(self._seq)
+        start = time.perf_counter()
+        self._send(encode_control("ping",seq))
+
+        if not self._wait_for_reply(seq,timeout):
+            return None
+
+        self._replies.pop(seq)
+
+        return time.perf_counter() - start
+
+    def _burst(self,num_messages,timeout):
+        """
+        Fire num_messages pings down the pipe and wait for the replies.  Keep a
+        bounded number in flight so neither side can fill the pipe and block
+        the other.
+        """
+
+        window = 256
+        seqs = [next(self._seq) for i in range(num_messages)]
+        for i in range(0,num_messages,window):
+            for s in seqs[i:i+window]:
+                self._send(encode_control("ping",s))
+            for s in seqs[i:i+window]:
+                if self._wait_for_reply(s,timeout):
+                    self._replies.pop(s)
+
+    def _wait_for_reply(self,seq,timeout):
+        """
+        Read frames until the reply to control command seq shows up.  Messages
+        that arrive in the meantime are held for the next get().  Returns
+        False on timeout, or if the device process has died.
+        """
+
+        while seq not in self._replies:
+            if self.dead:
+                return False
+            try:
+                if not self._conn.poll(timeout):
+                    return False
+            except (OSError,EOFError):
+                self._died()
+                return False
+            self._held.extend(self._recv_frame())
+
+        return True
+
+    def _poll(self):
+        """
+        Whether there is something to hand to get().
+        """
+
+        if self._held:
+            return True
+
+        if self.dead:
+            return False
+
+        try:
+            return self._conn.poll()
+        except (OSError,EOFError):
+            self._died()
+            return False
+
+    def _send(self,frame):
+        """
+        Send a frame to the device.  Returns False (and marks the handle dead)
+        if the device process has gone.
+        """
+
+        try:
+            self._conn.send_bytes(frame)
+        except (OSError,ValueError):
+            self._died()
+            return False
+
+        return True
+
+    def _died(self):
+        """
+        Note that the device process has gone.  The pipe reads as end of file
+        (and so as readable) from now on, so nothing more is read from it.
+        """
+
+        self.dead = True
+        self.inbox.clear()
+        self._in_flight.clear()
+        self._in_flight_bytes = 0
+
+    def _recv(self):
+        """
+        Return held messages if there are any, otherwise read a frame.
+        """
+
+        if self._held:
+            held = self._held
+            self._held = []
+            return held
+
+        return self._recv_frame()
+
+    def _recv_frame(self):
+        """
+        Read a single frame from the device, returning the list of messages it
+        carried (control replies are filed away, not returned).
+        """
+
+        try:
+            frame = self._conn.recv_bytes()
+        except (OSError,EOFError):
+            self._died()
+            return []
+
+        kind = frame[:1]
+        if kind == MESSAGE_FRAME:
+            return [decode_message(frame[1:],self.codec)]
+
+        command, arg = json.loads(frame[1:].decode())
+        if command == "pong":
+            self._replies[arg] = (time.perf_counter(),True)
+        elif command == "estopped":
+            self._replies[arg[0]] = (time.perf_counter(),arg[1])
+        elif command == "counters":
+            self._replies[arg[0]] = (time.perf_counter(),arg[1:])
+        elif command == "trace":
+            self._replies[arg[0]] = (time.perf_counter(),arg[1])
+        elif command == "codec":
+            self.codec = codec.make_codec(arg[0],arg[1])
+        elif command == "took":
+            for i in range(arg):
+                self._in_flight_bytes -= self._in_flight.popleft()
+            self._flush_inbox()
+
+        return []
@@ -0,0 +1,148 @@
+__description__ = \
+"""
+Tests for the wire codecs (rpyBot.codec): round trips, and bad frames, which
+must always come back as BotMessageError.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import random
+
+import pytest
+
+from rpyBot import codec, exceptions
+from rpyBot.messages import RobotMessage, PRIORITY_EMERGENCY
+
+def sample_messages():
+
+    return [RobotMessage(destination_device="drivetrain",message="forward"),
+            RobotMessage(destination_device="drivetrain",
+                         message=["setspeed",{"speed":2.5}]),
+            RobotMessage(destination_device="light_tower",
+                         message=["roll",{"roll_time":0.5,"starting_led":-3,
+                                          "names":["a","é",None,True]}],
+                         delay_time=100),
+            RobotMessage(destination="controller",message="x"*300)]
+
+@pytest.mark.parametrize("name",codec.CODECS)
+def test_round_trip(name):
+
+    c = codec.make_codec(name)
+    messages = sample_messages()
+    for m in messages:
+        out = codec.decode(c.encode(m),c,keep_times=True)
+        assert out.as_dict() == m.as_dict()
+
+    out = codec.decode_all(c.encode_batch(messages),c,keep_times=True)
+    assert [m.as_dict() for m in out] == [m.as_dict() for m in messages]
+
+def binary_message(*values):
+    """
+    A binary message whose message field is built from raw values.
+    """
+
+    out = bytearray((codec.BINARY_MAGIC,codec.FIELD_TAGS["message"]))
+    for v in values:
+        out += bytes(v)
+
+    return bytes(out)
+
+BAD_FRAMES = [
+
+    # Binary
+    b"",
+    bytes((codec.BINARY_MAGIC,)) + b"\xff",
+    binary_message((codec.STR,5),b"ab"),
+    binary_message((codec.STR,2),b"\xff\xfe"),
+    binary_message((codec.FLOAT,),b"\x00\x01"),
+    binary_message((codec.NAME,120,)),
+    binary_message((codec.INT,),b"\xff"*20,b"\x01"),
+    binary_message((codec.STR,),b"\xff"*20,b"\x01"),
+    binary_message((codec.LIST,2,codec.STR,3),b"abc",(codec.DICT,1,
+                    codec.LIST,1,codec.INT,2,codec.TRUE)),
+    binary_message((codec.LIST,2,codec.STR,3),b"abc",(codec.DICT,1,
+                    codec.DICT,0,codec.TRUE)),
+    binary_message((codec.LIST,1)*100000,(codec.NONE,)),
+    binary_message((99,)),
+    bytes((codec.BATCH_MAGIC,2,3)) + b"\xb1\x07\x00",
+    bytes((codec.BATCH_MAGIC,)) + b"\xff"*20,
+    bytes((codec.BATCH_MAGIC,1,30,codec.BINARY_MAGIC)),
+
+    # Json
+    b"\xff\xfe",
+    "{",
+    "[" * 100000 + "]" * 100000,
+    '{"message":' + "[" * 100000 + "]" * 100000 + "}",
+    '{"message":["on",{"x":1},3]}',
+    '{"bogus":1}',
+    '{"message":5}',
+    '[1,2,3]',
+    "[" + ",".join(['{"message":"on"}']*(codec.MAX_BATCH + 1)) + "]",
+]
+
+@pytest.mark.parametrize("frame",BAD_FRAMES,ids=lambda f: repr(f[:24]))
+def test_bad_frames(frame):
+
+    with pytest.raises(exceptions.BotMessageError):
+        codec.decode_all(frame)
+
+    if type(frame) == bytes and frame[:1] == bytes((codec.BATCH_MAGIC,)):
+        return
+
+    with pytest.raises(exceptions.BotMessageError):
+        codec.decode(frame)
+
+@pytest.mark.parametrize("name",codec.CODECS)
+def test_fuzz(name):
+    """
+    Mangled versions of good messages and envelopes either decode or raise
+    BotMessageError, never anything else.
+    """
+
+    c = codec.make_codec(name)
+    frames = [c.encode(m) for m in sample_messages()]
+    frames.append(c.encode_batch(sample_messages()))
+
+    rng = random.Random(2016)
+    for i in range(5000):
+        frame = bytearray(rng.choice(frames))
+        for j in range(rng.randint(1,4)):
+            action = rng.randint(0,2)
+            pos = rng.randrange(len(frame))
+            if action == 0:
+                frame[pos] = rng.randrange(256)
+            elif action == 1:
+                del frame[pos:pos + rng.randint(1,8)]
+            else:
+                frame[pos:pos] = bytes(rng.randrange(256)
+                                       for k in range(rng.randint(1,8)))
+
+        try:
+            codec.decode_all(bytes(frame))
+        except exceptions.BotMessageError:
+            pass
+
+@pytest.mark.parametrize("name",codec.CODECS)
+def test_server_fields(name):
+    """
+    A client can't set the fields the robot assigns; the robot's own
+    processes (keep_times) pass them through.
+    """
+
+    c = codec.make_codec(name)
+    m = RobotMessage(destination_device="drivetrain",message="forward",
+                     source_device="drivetrain",priority=PRIORITY_EMERGENCY)
+    m.message_id = 5
+    data = c.encode(m)
+
+    out = codec.decode(data,c,keep_times=True)
+    assert (out.source_device,out.message_id,out.priority) == \
+           ("drivetrain",5,PRIORITY_EMERGENCY)
+
+    blank = RobotMessage(source_device="controller")
+    out = codec.decode(data,c,message=blank)
+    assert out.source_device == "controller"
+    assert out.message_id == blank.message_id
+    assert out.priority == RobotMessage(destination_device="drivetrain",
+                                        message="forward").priority
+    assert out.priority != PRIORITY_EMERGENCY
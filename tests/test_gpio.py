@@ -0,0 +1,250 @@
+__description__ = \
+"""
+Tests for the gpio hardware layer (rpyBot.devices.gpio.hardware), run against
+the recording backend.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import pytest
+
+from rpyBot.devices.gpio.hardware import gpio_backend, recording_gpio
+gpio_backend.select("recording")
+
+from rpyBot.devices.gpio import hardware, TwoMotorCatSteer, LightTower
+from rpyBot.devices.gpio.hardware import OwnershipError, global_pin_owners
+from rpyBot.messages import RobotMessage, now_ms
+
+@pytest.fixture(autouse=True)
+def clear_record():
+
+    recording_gpio.clear()
+    yield
+
+def calls(function,pins=None):
+    """
+    Pins that calls to function were made on, in order.
+    """
+
+    return [args[0] for t, f, args in recording_gpio.calls
+            if f == function and (pins == None or args[0] in pins)]
+
+def test_stop_unused_motor():
+    """
+    A motor that never got a command is still cleaned up.
+    """
+
+    m = hardware.Motor(11,12)
+    m.stop(1)
+
+    assert calls("cleanup") == [11,12]
+    assert global_pin_owners[11] == -1
+    assert global_pin_owners[12] == -1
+
+def test_stop_unused_led():
+
+    led = hardware.LED(11)
+    led.stop(1)
+
+    assert calls("cleanup") == [11]
+
+def test_motor_owner():
+    """
+    A motor refuses every owner but the one that has claimed its pins.
+    """
+
+    m = hardware.Motor(11,12)
+    m.forward(1)
+    assert m._current_state == "forward"
+
+    m.pins.claim(2)
+    for command in (m.forward,m.reverse,m.brake,m.coast):
+        with pytest.raises(OwnershipError):
+            command(1)
+    with pytest.raises(OwnershipError):
+        m.set_duty_cycle(50,1)
+    with pytest.raises(OwnershipError):
+        m.stop(1)
+    assert m._current_state == "forward"
+
+    m.reverse(2)
+    assert m._current_state == "reverse"
+
+    m.pins.unclaim(2)
+    m.coast(1)
+    assert m._current_state == "coast"
+
+    m.stop(1)
+
+def test_led_owner():
+
+    led = hardware.LED(11)
+    led.pins.claim(5)
+
+    for command in (led.on,led.off,led.flip):
+        with pytest.raises(OwnershipError):
+            command(6)
+    with pytest.raises(OwnershipError):
+        led.set_duty_cycle(20,6)
+
+    led.on(5)
+    assert led.led_on
+
+    led.stop(5)
+    assert calls("cleanup") == [11]
+
+def test_joined_stop():
+    """
+    Motors joined into one group are stopped once, and stay stopped.
+    """
+
+    d = TwoMotorCatSteer(11,12,13,15)
+    d._brake(1)
+    d.stop(2)
+
+    assert sorted(calls("cleanup")) == [11,12,13,15]
+    setups = [i for i, (t, f, args) in enumerate(recording_gpio.calls)
+              if f == "setup"]
+    cleanups = [i for i, (t, f, args) in enumerate(recording_gpio.calls)
+                if f == "cleanup"]
+    assert not setups or max(setups) < min(cleanups)
+
+    for p in (11,12,13,15):
+        assert global_pin_owners[p] == -1
+    assert d._motors.state == 0
+    assert d._left_motor.pins.state == 0
+    assert d._right_motor.pins.state == 0
+
+def test_joined_member_stop():
+    """
+    Stopping one of a set of joined groups stops them all.
+    """
+
+    left = hardware.Motor(11,12)
+    right = hardware.Motor(13,15)
+    both = hardware.PinGroup.join((left.pins,right.pins))
+    both.set(hardware.Motor.FORWARD | hardware.Motor.REVERSE << 2,1)
+
+    left.stop(1)
+    assert sorted(calls("cleanup")) == [11,12,13,15]
+    assert both.state == 0
+    assert right.pins.state == 0
+
+def test_group_owner():
+    """
+    Commands that drive a joined group are checked against its claim.
+    """
+
+    d = TwoMotorCatSteer(11,12,13,15)
+    d._brake(1)
+
+    d._motors.claim(2)
+    with pytest.raises(OwnershipError):
+        d._coast(1)
+    assert d._motors.state == hardware.Motor.BRAKE | hardware.Motor.BRAKE << 2
+
+    d._coast(2)
+    assert d._motors.state == 0
+
+    d._motors.unclaim(2)
+    d.stop(1)
+
+def test_roll_owner():
+    """
+    A roll keeps the LEDs to itself until it is stopped, whoever stops it.
+    """
+
+    d = LightTower((11,12,13))
+    d._roll(roll_time=10,owner=7)
+    d._roll_step(7)
+    state = d._leds.state
+    assert state in (0b001,0b010,0b100)
+
+    with pytest.raises(OwnershipError):
+        d._leds.set(0,8)
+    with pytest.raises(OwnershipError):
+        d._led_list[1].on(8)
+    assert d._leds.state == state
+
+    d._stop_roll(owner=9)
+    assert d._leds.state == 0
+    assert d._leds._lease.holder == None
+
+    d._on(owner=8)
+    assert d._leds.state == 0b111
+
+    d.stop(1)
+    assert sorted(calls("cleanup")) == [11,12,13]
+
+@pytest.mark.parametrize("command",["on","flip",["flash",{"led_number":1}],
+                                    ["duty",{"duty_cycle":50}],"off"])
+def test_command_stops_roll(command):
+    """
+    A command sent while the startup roll is running stops the roll and runs,
+    rather than being refused.
+    """
+
+    d = LightTower((11,12,13))
+    for m in d.get():
+        d.put(m)
+    assert d._roll_task != None
+
+    d.get()
+    d.put(RobotMessage(destination_device=d.name,message=command))
+
+    assert d._roll_task == None
+    assert d._leds._lease.holder == None
+    warnings = [m.message for m in d.get() if m.destination_device == "warn"]
+    assert warnings == []
+
+    d.stop(1)
+
+def test_motion_command_ttl():
+    """
+    Drivetrains share one command age limit; stopping is never too late.
+    """
+
+    d = TwoMotorCatSteer(11,12,13,15)
+    assert d.max_command_age == 500
+    assert d.command_ttl == {"coast":None,"brake":None}
+
+    late = now_ms() + 1000
+    m = RobotMessage(destination_device=d.name,message="forward")
+    assert d.is_stale(m,late)
+    m = RobotMessage(destination_device=d.name,message="coast")
+    assert not d.is_stale(m,late)
+
+    d.stop(1)
+
+def test_put_refused(capsys):
+    """
+    A command refused by the hardware comes back as a warning saying so.
+    """
+
+    d = TwoMotorCatSteer(11,12,13,15)
+    d._motors.claim(2)
+    d.put(RobotMessage(destination_device=d.name,message="coast"))
+
+    warnings = [m.message for m in d.get() if m.destination_device == "warn"]
+    assert len(warnings) == 1
+    assert "refused coast" in warnings[0]
+    assert capsys.readouterr().out == ""
+
+    d._motors.unclaim(2)
+    d.stop(1)
+
+def test_put_bad_value():
+    """
+    An argument of the wrong type is rejected with a warning.
+    """
+
+    d = TwoMotorCatSteer(11,12,13,15)
+    d.put(RobotMessage(destination_device=d.name,
+                       message=["setspeed",{"speed":"fast"}]))
+
+    warnings = [m.message for m in d.get() if m.destination_device == "warn"]
+    assert len(warnings) == 1
+    assert "Bad command" in warnings[0]
+    assert d.dispatch_counters()["rejected_args"] == 1
+
+    d.stop(1)
@@ -0,0 +1,257 @@
+__description__ = \
+"""
+Tests that hold for both engines (rpyBot.manager.DeviceManager and
+rpyBot.async_manager.AsyncDeviceManager): messages are routed in priority
+order, whatever order they were queued in, and an emergency stop beats
+everything that is queued.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import asyncio, time
+
+from rpyBot import manager, async_manager
+from rpyBot.devices import RobotDevice
+from rpyBot.messages import RobotMessage, PRIORITY_EMERGENCY, PRIORITY_CONTROL
+
+class Recorder(RobotDevice):
+    """
+    Keeps every message sent to it, in the order it arrived.
+    """
+
+    execution = "inline"
+
+    def __init__(self,name):
+
+        RobotDevice.__init__(self,name)
+        self.got = []
+
+    def put(self,message):
+
+        self.got.append(message.message)
+
+    def emergency_stop(self,owner=None):
+
+        self.got.append("stopped")
+
+def backlog():
+    """
+    A pile of telemetry and control messages with an emergency one at the end.
+    """
+
+    messages = []
+    for i in range(50):
+        messages.append(RobotMessage(destination_device="drivetrain",
+                                     message="telemetry {}".format(i)))
+        messages.append(RobotMessage(destination_device="drivetrain",
+                                     message="control {}".format(i),
+                                     priority=PRIORITY_CONTROL))
+    messages.append(RobotMessage(destination_device="drivetrain",
+                                 message="emergency",
+                                 priority=PRIORITY_EMERGENCY))
+
+    return messages
+
+def check_order(got):
+
+    assert len(got) == 101
+    assert got[0] == "emergency"
+    assert got[1:51] == ["control {}".format(i) for i in range(50)]
+    assert got[51:] == ["telemetry {}".format(i) for i in range(50)]
+
+def check_estop(got,m,dropped=50):
+
+    assert got[0] == "stopped"
+    assert got[1:] == ["telemetry {}".format(i) for i in range(50)]
+    assert m.counters["estops"] == 1
+    assert m.counters["estop_dropped"] == dropped
+
+def delayed_setspeed():
+
+    return RobotMessage(destination_device="drivetrain",
+                        message=["setspeed",{"speed":3}],
+                        priority=PRIORITY_CONTROL,delay_time=20)
+
+def test_priority_device_manager():
+
+    d = Recorder("drivetrain")
+    m = manager.DeviceManager([Recorder("controller"),d])
+    for x in m.device_list:
+        m.load_device(x)
+
+    for message in backlog():
+        m._queue_message(message)
+    m._tick([])
+
+    check_order(d.got)
+    m.shutdown()
+
+def test_estop_device_manager():
+    """
+    An estop stops the devices before anything queued ahead of it is routed,
+    and the control commands waiting behind it are thrown away.
+    """
+
+    d = Recorder("drivetrain")
+    m = manager.DeviceManager([Recorder("controller"),d])
+    for x in m.device_list:
+        m.load_device(x)
+
+    for message in backlog()[:-1]:
+        m._queue_message(message)
+    m._queue_message("estop",destination_device="drivetrain")
+    m._tick([])
+
+    check_estop(d.got,m)
+    m.shutdown()
+
+def test_estop_delayed_device_manager():
+    """
+    A control command still waiting out its delay is thrown away by an estop
+    too, so it can't restart anything once it comes due.
+    """
+
+    d = Recorder("drivetrain")
+    m = manager.DeviceManager([Recorder("controller"),d])
+    for x in m.device_list:
+        m.load_device(x)
+
+    m._queue_message(delayed_setspeed())
+    m._queue_message("estop",destination_device="drivetrain")
+
+    time.sleep(0.05)
+    m._tick([])
+
+    assert d.got == ["stopped"]
+    assert m.counters["estop_dropped"] == 1
+    m.shutdown()
+
+def test_hold_pauses_sender():
+    """
+    Messages a device refuses are held, and the device that sent them is
+    paused until the last of them has gone through.
+    """
+
+    d = Recorder("drivetrain")
+    sensor = Recorder("sensor")
+    m = manager.DeviceManager([Recorder("controller"),d,sensor])
+    for x in m.device_list:
+        m.load_device(x)
+
+    handle = m.loaded_devices_dict["drivetrain"]
+    put = handle.put
+    refuse = [True]
+    handle.put = lambda message: not refuse[0] and put(message)
+
+    for i in range(100):
+        m._queue_message(RobotMessage(destination_device="drivetrain",
+                                      source_device="sensor",
+                                      message="reading {}".format(i)))
+    m._tick([])
+
+    assert m.counters["held"] == 100
+    assert m._held_from["sensor"] == 100
+    assert m._paused == {m.loaded_devices_dict["sensor"]}
+    assert d.got == []
+
+    refuse[0] = False
+    m._release_held()
+
+    assert d.got == ["reading {}".format(i) for i in range(100)]
+    assert m.counters["held"] == 0
+    assert len(m._held_from) == 0
+    assert m._paused == set()
+    m.shutdown()
+
+def test_priority_async_manager():
+
+    d = Recorder("drivetrain")
+    m = async_manager.AsyncDeviceManager([Recorder("controller"),d])
+
+    async def run():
+
+        task = asyncio.get_running_loop().create_task(m.run())
+        await asyncio.sleep(0.05)
+        d.got.clear()
+
+        # All queued in one go, before the loop gets a chance to route any.
+        for message in backlog():
+            m._queue_message(message)
+
+        for i in range(100):
+            if len(d.got) >= 101:
+                break
+            await asyncio.sleep(0.01)
+
+        m.stop()
+        await task
+        for name in list(m.loaded_devices_dict.keys()):
+            m.unload_device(name)
+
+    asyncio.run(run())
+    check_order(d.got)
+
+def test_delayed_async_manager():
+    """
+    A delayed message is routed once its delay has passed, after anything that
+    was ready before it.
+    """
+
+    d = Recorder("drivetrain")
+    m = async_manager.AsyncDeviceManager([Recorder("controller"),d])
+
+    async def run():
+
+        task = asyncio.get_running_loop().create_task(m.run())
+        await asyncio.sleep(0.05)
+        d.got.clear()
+
+        m._queue_message("later",destination_device="drivetrain",
+                         delay_time=50)
+        m._queue_message("sooner",destination_device="drivetrain",
+                         delay_time=10)
+        m._queue_message("now",destination_device="drivetrain")
+
+        await asyncio.sleep(0.03)
+        assert d.got == ["now","sooner"]
+        await asyncio.sleep(0.1)
+
+        m.stop()
+        await task
+        for name in list(m.loaded_devices_dict.keys()):
+            m.unload_device(name)
+
+    asyncio.run(run())
+    assert d.got == ["now","sooner","later"]
+
+def test_estop_async_manager():
+
+    d = Recorder("drivetrain")
+    m = async_manager.AsyncDeviceManager([Recorder("controller"),d])
+
+    async def run():
+
+        task = asyncio.get_running_loop().create_task(m.run())
+        await asyncio.sleep(0.05)
+        d.got.clear()
+
+        for message in backlog()[:-1]:
+            m._queue_message(message)
+        m._queue_message(delayed_setspeed())
+        m._queue_message("estop",destination_device="drivetrain")
+
+        for i in range(100):
+            if len(d.got) >= 51:
+                break
+            await asyncio.sleep(0.01)
+
+        # Past the delay of the setspeed.
+        await asyncio.sleep(0.05)
+
+        m.stop()
+        await task
+        for name in list(m.loaded_devices_dict.keys()):
+            m.unload_device(name)
+
+    asyncio.run(run())
+    check_estop(d.got,m,dropped=51)
@@ -0,0 +1,194 @@
+__description__ = \
+"""
+Tests for the device message queues (rpyBot.queues).
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import threading, time
+
+import pytest
+
+from rpyBot import queues
+from rpyBot.devices import RobotDevice
+
+class SteppedRing(queues.RingBuffer):
+    """
+    RingBuffer that runs a whole consumer pass (drain, then check for anything
+    left, like RobotDevice._get_all_messages) the step-th time a producer
+    touches the head or tail (never if step is 0).  Stepping through every
+    point shows whether a wakeup can be lost.
+    """
+
+    def __init__(self):
+
+        self._h = 0
+        self._t = 0
+        self.step = 0
+        self.accesses = 0
+        self.producing = False
+
+        # Items the consumer has taken, and whether a wakeup is pending.
+        self.got = []
+        self.woken = False
+
+        queues.RingBuffer.__init__(self,8)
+
+    @property
+    def _head(self):
+        self._access()
+        return self._h
+
+    @_head.setter
+    def _head(self,value):
+        self._access()
+        self._h = value
+
+    @property
+    def _tail(self):
+        self._access()
+        return self._t
+
+    @_tail.setter
+    def _tail(self,value):
+        self._access()
+        self._t = value
+
+    def _access(self):
+
+        if not self.producing:
+            return
+
+        self.accesses += 1
+        if self.accesses == self.step:
+            self.producing = False
+            self.consume()
+            self.producing = True
+
+    def wake(self):
+
+        self.woken = True
+
+    def consume(self):
+
+        self.woken = False
+        self.drain_into(self.got)
+        if self:
+            self.wake()
+
+    def put(self,item,key=None,wake=None):
+
+        self.producing = True
+        try:
+            return queues.RingBuffer.put(self,item,key,wake)
+        finally:
+            self.producing = False
+
+@pytest.mark.parametrize("step",range(1,8))
+def test_ring_wakeup(step):
+    """
+    Whenever the consumer runs while an item is being put, the item is either
+    taken or the consumer is woken for it.
+    """
+
+    ring = SteppedRing()
+
+    # One message waiting, and the consumer already woken for it.
+    ring.put("first",wake=ring.wake)
+    assert ring.woken
+
+    ring.step = ring.accesses + step
+    ring.put("second",wake=ring.wake)
+
+    assert "second" in ring.got or ring.woken
+
+    ring.consume()
+    assert ring.got == ["first","second"]
+
+def test_ring_threads():
+    """
+    Several producers and a consumer that only drains when woken: nothing is
+    lost and each producer's messages stay in order.
+    """
+
+    ring = queues.RingBuffer(64,queues.BLOCK)
+    wake = threading.Semaphore(0)
+    got = []
+    num = 5000
+
+    def produce(name):
+        for i in range(num):
+            while not ring.put((name,i),wake=wake.release):
+                time.sleep(0.0001)
+
+    producers = [threading.Thread(target=produce,args=(n,)) for n in range(3)]
+    for p in producers:
+        p.start()
+
+    while len(got) < 3*num:
+        assert wake.acquire(timeout=5)
+        ring.drain_into(got)
+        if ring:
+            wake.release()
+
+    for p in producers:
+        p.join()
+
+    for n in range(3):
+        assert [i for name, i in got if name == n] == list(range(num))
+
+def test_ring_overflow():
+
+    ring = queues.RingBuffer(4,queues.DROP_NEWEST)
+    for i in range(6):
+        assert ring.put(i)
+
+    assert ring.drain() == [0,1,2,3]
+    assert ring.counters["overflow"] == 2
+    assert ring.dropped == 2
+
+    ring = queues.RingBuffer(4,queues.BLOCK)
+    for i in range(4):
+        assert ring.put(i)
+    assert not ring.put(4)
+
+def test_default_outbox_unbounded():
+    """
+    With no outbox limit a device never drops a message.
+    """
+
+    assert type(queues.make_outbox(None)) == queues.BoundedQueue
+    assert type(queues.make_outbox((None,queues.DROP_NEWEST))) == queues.BoundedQueue
+    assert type(queues.make_outbox((16,queues.DROP_NEWEST))) == queues.RingBuffer
+    assert type(queues.make_outbox((16,queues.DROP_OLDEST))) == queues.BoundedQueue
+
+    d = RobotDevice("talker")
+    num = 5*queues.DEFAULT_RING_SIZE
+    for i in range(num):
+        d._queue_message(str(i))
+
+    got = [m.message for m in d.get()]
+    assert got == [str(i) for i in range(num)]
+    assert d.queue_counters()["dropped_newest"] == 0
+
+@pytest.mark.parametrize("policy,kept",[(queues.DROP_OLDEST,[2,3,4]),
+                                        (queues.DROP_NEWEST,[0,1,2]),
+                                        (queues.LATEST_WINS,[0,1,4])])
+def test_bounded_queue_policies(policy,kept):
+
+    q = queues.BoundedQueue(3,policy)
+    for i in range(5):
+        assert q.put(i)
+
+    assert q.drain() == kept
+    assert q.dropped == 2
+
+def test_bounded_queue_coalesce():
+
+    q = queues.BoundedQueue()
+    q.put("a1","a")
+    q.put("b1","b")
+    q.put("a2","a")
+
+    assert q.drain() == ["a2","b1"]
+    assert q.counters["coalesced"] == 1
@@ -0,0 +1,236 @@
+__description__ = \
+"""
+Tests for the handles between the DeviceManager and its devices
+(rpyBot.transport).
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2026-10-17"
+
+import os, signal, threading, time
+
+from rpyBot import manager
+from rpyBot.devices import RobotDevice
+
+class Motor(RobotDevice):
+    """
+    Device with one command that takes a little while.
+    """
+
+    def __init__(self,name="drivetrain"):
+
+        RobotDevice.__init__(self,name)
+        self._control_dict = {"go":self._go}
+
+    def _go(self,owner=None):
+
+        time.sleep(0.001)
+
+    def emergency_stop(self,owner=None):
+
+        self._queue_message("coasted")
+
+class Chatter(RobotDevice):
+    """
+    Device that answers every (long) command with a long message.
+    """
+
+    def __init__(self,name="chatter"):
+
+        RobotDevice.__init__(self,name)
+        self._control_dict = {"talk":self._talk}
+
+    def _talk(self,padding="",owner=None):
+
+        self._queue_message("x"*20000)
+
+class Serial(RobotDevice):
+    """
+    Device whose one command is a slow write, which an emergency stop must not
+    land in the middle of.
+    """
+
+    execution = "thread"
+
+    def __init__(self,name="drivetrain"):
+
+        RobotDevice.__init__(self,name)
+        self._control_dict = {"write":self._write}
+        self.log = []
+
+    def _write(self,owner=None):
+
+        self.log.append("start")
+        time.sleep(0.05)
+        self.log.append("end")
+
+    def emergency_stop(self,owner=None):
+
+        self.log.append("estop")
+
+class Controller(RobotDevice):
+    """
+    Stands in for the WebInterface: keeps every message sent to it.
+    """
+
+    execution = "inline"
+
+    def __init__(self):
+
+        RobotDevice.__init__(self,"controller")
+        self.got = []
+
+    def put(self,message):
+
+        self.got.append(message.message)
+
+def run_ticks(m,num_ticks,timeout=5.0):
+    """
+    Run num_ticks passes of the manager's loop on a thread of its own.
+    Returns False if they did not finish within timeout seconds.
+    """
+
+    def loop():
+        ready = m.loaded_devices
+        for i in range(num_ticks):
+            m._tick(ready)
+            ready = m._wait()
+
+    t = threading.Thread(target=loop,daemon=True)
+    t.start()
+    t.join(timeout)
+
+    return not t.is_alive()
+
+def make_manager(*devices,**kwargs):
+
+    m = manager.DeviceManager(list(devices),poll_interval=0.01,**kwargs)
+    for d in m.device_list:
+        m.load_device(d)
+
+    return m
+
+def test_process_round_trip():
+
+    c = Controller()
+    m = make_manager(c,Motor())
+
+    handle = m.loaded_devices_dict["drivetrain"]
+    assert handle.mode == "process"
+    assert handle.ping() != None
+
+    for i in range(20):
+        m._queue_message("go",destination_device="drivetrain")
+    assert run_ticks(m,50)
+    assert m.queue_counters()["drivetrain"]["dispatch"] != None
+
+    m.shutdown()
+
+def test_process_flow_control():
+    """
+    Sending a long run of commands to a device that answers each one at
+    length doesn't leave both ends of the pipe blocked on each other.
+    """
+
+    c = Controller()
+    m = make_manager(c,Chatter())
+
+    handle = m.loaded_devices_dict["chatter"]
+    for i in range(200):
+        m._queue_message(["talk",{"padding":"x"*20000}],
+                         destination_device="chatter")
+
+    assert run_ticks(m,1)
+    assert len(handle._in_flight) <= handle._window
+    assert len(handle.inbox) > 0
+
+    assert run_ticks(m,200,timeout=20)
+    assert len(handle._in_flight) == 0
+    assert len(handle.inbox) == 0
+    assert m.counters["dispatched"] >= 200
+
+    m.shutdown()
+
+def test_process_death():
+    """
+    A device process that dies is unloaded, the controller is warned, and the
+    manager (and emergency stop) carry on without it.
+    """
+
+    c = Controller()
+    lights = Motor("lights")
+    lights.execution = "thread"
+    m = make_manager(c,Motor(),lights)
+
+    handle = m.loaded_devices_dict["drivetrain"]
+    assert run_ticks(m,5)
+
+    os.kill(handle.pid,signal.SIGKILL)
+    handle._process.join(5)
+
+    for i in range(5):
+        m._queue_message("go",destination_device="drivetrain")
+
+    assert run_ticks(m,10)
+    assert handle.dead
+    assert "drivetrain" not in m.loaded_devices_dict
+    assert any("drivetrain died" in str(g) for g in c.got)
+
+    ticks = m.counters["ticks"]
+    assert run_ticks(m,5)
+    assert m.counters["ticks"] == ticks + 5
+
+    m._queue_message("estop",destination_device="drivetrain")
+    assert run_ticks(m,5)
+    assert m.counters["estops"] == 1
+    assert any("emergency stop" in str(g) and "no confirmation" not in str(g)
+               for g in c.got)
+
+    m.shutdown()
+
+def test_process_death_during_emergency_stop():
+    """
+    Waiting for a dead device to confirm an emergency stop doesn't hang.
+    """
+
+    c = Controller()
+    m = make_manager(c,Motor())
+
+    handle = m.loaded_devices_dict["drivetrain"]
+    os.kill(handle.pid,signal.SIGKILL)
+    handle._process.join(5)
+
+    done = threading.Event()
+    def estop():
+        m.emergency_stop("test")
+        done.set()
+
+    threading.Thread(target=estop,daemon=True).start()
+    assert done.wait(5)
+
+    assert run_ticks(m,5)
+    assert "drivetrain" not in m.loaded_devices_dict
+    assert any("no confirmation from drivetrain" in str(g) for g in c.got)
+
+    m.shutdown()
+
+def test_thread_emergency_stop_waits_for_write():
+    """
+    An emergency stop sent while a thread device is part way through a
+    command runs after the command, never in the middle of it.
+    """
+
+    c = Controller()
+    d = Serial()
+    m = make_manager(c,d)
+
+    m._queue_message("write",destination_device="drivetrain")
+    m._tick([])
+    for i in range(100):
+        if d.log:
+            break
+        time.sleep(0.001)
+
+    m.emergency_stop("test")
+    assert d.log == ["start","end","estop"]
+
+    m.shutdown()